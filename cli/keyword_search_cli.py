@@ -26,6 +26,9 @@ def main() -> None:
 
     # subparse: build
     build_parser = subparsers.add_parser("build", help="build the movie index")
+    build_parser.add_argument(
+        "--workers", type=int, default=1, help="processes to tokenize with"
+    )
 
     # subparse: tf (term frequency)
     tf_parser = subparsers.add_parser("tf", help="get term frequency")
@@ -62,6 +65,22 @@ def main() -> None:
     bms_parser.add_argument(
         "limit", type=int, nargs="?", default=5, help="query to search"
     )
+    bms_parser.add_argument(
+        "k1", type=float, nargs="?", default=BM25_K1, help="tuninig"
+    )
+    bms_parser.add_argument(
+        "b", type=float, nargs="?", default=BM25_B, help="b tuninig"
+    )
+
+    # subparse bm25check
+    bmcheck_parser = subparsers.add_parser("bm25check", help="check bm25 scores")
+    bmcheck_parser.add_argument("query", type=str, help="query to check")
+    bmcheck_parser.add_argument(
+        "k1", type=float, nargs="?", default=BM25_K1, help="tuninig"
+    )
+    bmcheck_parser.add_argument(
+        "b", type=float, nargs="?", default=BM25_B, help="b tuninig"
+    )
 
     args = parser.parse_args()
 
@@ -100,7 +119,7 @@ def main() -> None:
             pass
 
         case "bm25search":
-            bms = inverted_index.bm25_search(args.query, args.limit)
+            bms = inverted_index.bm25_search(args.query, args.limit, args.k1, args.b)
             didx = 0
             for bm_dict in bms:
                 didx += 1
@@ -113,6 +132,11 @@ def main() -> None:
                     break
             pass
 
+        case "bm25check":
+            max_diff = inverted_index.bm25_check(args.query, args.k1, args.b)
+            print(f"bm25check for '{args.query}': max abs diff {max_diff:.3g}")
+            pass
+
         case "bm25idf":
             bmidf = inverted_index.get_bm25_idf(args.term)
             print(f"bm25idf for '{args.term}': {bmidf:.2f}")
@@ -152,7 +176,7 @@ def main() -> None:
             pass
 
         case "build":
-            inverted_index.build()
+            inverted_index.build(args.workers)
             inverted_index.save()
             pass
 
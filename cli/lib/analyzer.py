@@ -0,0 +1,47 @@
+import string
+from functools import lru_cache
+
+from nltk.stem import PorterStemmer
+from search_utils import STEM_CACHE_SIZE
+
+# built once instead of per tokenize call
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+
+class Analyzer:
+    def __init__(self, stop_words=None, stem_cache_size=STEM_CACHE_SIZE):
+        # read stopwords once, frozenset so lookups are O(1) not a list scan
+        if stop_words is None:
+            with open("data/stopwords.txt") as sfile:
+                stop_words = sfile.read().splitlines()
+        self.stop_words = frozenset(stop_words)
+        self.stemmer = PorterStemmer()
+        # same few thousand words get stemmed over and over, memoize them
+        self.stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+    def words(self, text_input) -> list:
+        # lowercase, remove punctuation, split, drop stop words
+        text = text_input.lower().translate(PUNCTUATION_TABLE)
+        return [tok for tok in text.split() if tok not in self.stop_words]
+
+    def analyze(self, text_input) -> list:
+        stem = self.stem
+        return [stem(tok) for tok in self.words(text_input)]
+
+    def analyze_many(self, texts) -> list:
+        # batch version for builds, each distinct word is stemmed once
+        word_lists = [self.words(text) for text in texts]
+        stem = self.stem
+        stems = {tok: stem(tok) for words in word_lists for tok in words}
+        return [[stems[tok] for tok in words] for words in word_lists]
+
+
+_analyzer = None
+
+
+def get_analyzer() -> Analyzer:
+    # one analyzer per process, shared by every InvertedIndex
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = Analyzer()
+    return _analyzer
@@ -0,0 +1,275 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Iterator, Mapping
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+
+INDEX_MAGIC = b"BDIX"
+INDEX_VERSION = 1
+POSTINGS_CACHE_SIZE = 1024
+
+# header: magic, version, doc count, term count, then one offset per section
+SECTIONS = (
+    "doc_ids",
+    "doc_lengths",
+    "length_norm",
+    "doc_offsets",
+    "term_offsets",
+    "doc_freqs",
+    "idf",
+    "max_scores",
+    "postings_offsets",
+    "terms",
+    "postings",
+    "docs",
+)
+HEADER = struct.Struct("<4sIQQ" + "Q" * (len(SECTIONS) + 1))
+
+
+def encode_varints(values: np.ndarray) -> np.ndarray:
+    """LEB128-encode non-negative integers, 7 bits per byte
+
+    Args:
+        values: Integers to encode
+
+    Returns:
+        uint8 array; every byte but the last of each value has the high bit set
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    starts = np.cumsum(nbytes) - nbytes
+    for i in range(int(nbytes.max(initial=0))):
+        has_byte = nbytes > i
+        payload = (values[has_byte] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        more = (nbytes[has_byte] > i + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has_byte] + i] = payload | more
+    return out
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Inverse of encode_varints over a whole byte buffer at once"""
+    if len(data) == 0:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_of_byte = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = (np.arange(len(data)) - starts[value_of_byte]) * 7
+    payload = (data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(payload, starts)
+
+
+def write_index(
+    doc_ids: np.ndarray,
+    docs: list[dict],
+    doc_lengths: np.ndarray,
+    length_norm: np.ndarray,
+    terms: list[str],
+    postings_indptr: np.ndarray,
+    postings_rows: np.ndarray,
+    postings_tfs: np.ndarray,
+    idf: np.ndarray,
+    max_scores: np.ndarray,
+) -> bytes:
+    """Serialize an inverted index to the single-file format
+
+    Postings of each term are stored as varint row deltas followed by varint
+    term frequencies, so a lookup only decodes the lists it touches.
+
+    Args:
+        doc_ids: Document id of every row
+        docs: Document of every row, stored as JSON
+        doc_lengths: Token count of every row
+        length_norm: BM25 length normalization of every row
+        terms: Vocabulary, sorted; the position of a term is its term id
+        postings_indptr: Start of every term's postings, plus the end
+        postings_rows: Rows of every term, ascending within a term
+        postings_tfs: Term frequency of every posting
+        idf: BM25 idf of every term
+        max_scores: BM25 upper bound of every term
+
+    Returns:
+        The encoded index
+    """
+    doc_freqs = np.diff(postings_indptr)
+    term_of_posting = np.repeat(np.arange(len(terms)), doc_freqs)
+    local = np.arange(len(postings_rows)) - postings_indptr[term_of_posting]
+    deltas = postings_rows.astype(np.int64)
+    deltas[1:] -= deltas[:-1].copy()
+    first = local == 0
+    deltas[first] = postings_rows[first]
+
+    # per term: doc_freq row deltas, then doc_freq tfs
+    values = np.empty(2 * len(postings_rows), dtype=np.uint64)
+    delta_positions = 2 * postings_indptr[term_of_posting] + local
+    values[delta_positions] = deltas
+    values[delta_positions + doc_freqs[term_of_posting]] = postings_tfs
+    encoded = encode_varints(values)
+    value_starts = np.concatenate(([0], np.flatnonzero(encoded < 0x80) + 1))
+    postings_offsets = value_starts[2 * np.asarray(postings_indptr)]
+
+    term_blobs = [term.encode("utf-8") for term in terms]
+    doc_blobs = [json.dumps(doc).encode("utf-8") for doc in docs]
+
+    sections = {
+        "doc_ids": np.asarray(doc_ids, dtype="<i8").tobytes(),
+        "doc_lengths": np.asarray(doc_lengths, dtype="<u4").tobytes(),
+        "length_norm": np.asarray(length_norm, dtype="<f8").tobytes(),
+        "doc_offsets": _offsets(doc_blobs).tobytes(),
+        "term_offsets": _offsets(term_blobs).tobytes(),
+        "doc_freqs": doc_freqs.astype("<u4").tobytes(),
+        "idf": np.asarray(idf, dtype="<f8").tobytes(),
+        "max_scores": np.asarray(max_scores, dtype="<f8").tobytes(),
+        "postings_offsets": postings_offsets.astype("<u8").tobytes(),
+        "terms": b"".join(term_blobs),
+        "postings": encoded.tobytes(),
+        "docs": b"".join(doc_blobs),
+    }
+
+    offsets = []
+    body = bytearray()
+    for name in SECTIONS:
+        # keep numeric sections 8-byte aligned for the mmap views
+        body.extend(b"\0" * (-(HEADER.size + len(body)) % 8))
+        offsets.append(HEADER.size + len(body))
+        body.extend(sections[name])
+    offsets.append(HEADER.size + len(body))
+
+    header = HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(doc_ids), len(terms), *offsets)
+    return header + bytes(body)
+
+
+def _offsets(blobs: list[bytes]) -> np.ndarray:
+    offsets = np.zeros(len(blobs) + 1, dtype="<u8")
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    return offsets
+
+
+class IndexFile:
+    """Read-only view over an encoded index in memory or an mmap
+
+    Numeric sections are zero-copy NumPy views; terms, postings and
+    documents are only decoded when asked for.
+    """
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        if len(buffer) < HEADER.size:
+            raise ValueError("index file is truncated")
+        magic, version, doc_count, term_count, *offsets = HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC:
+            raise ValueError("not an inverted index file")
+        if version != INDEX_VERSION:
+            raise ValueError(
+                f"index file version {version}, expected {INDEX_VERSION}; rebuild it"
+            )
+        self.buffer = buffer
+        self.doc_count = doc_count
+        self.term_count = term_count
+        self.sections = {
+            name: (offsets[i], offsets[i + 1]) for i, name in enumerate(SECTIONS)
+        }
+
+        self.doc_ids = self.__array("doc_ids", "<i8", doc_count)
+        self.doc_lengths = self.__array("doc_lengths", "<u4", doc_count)
+        self.length_norm = self.__array("length_norm", "<f8", doc_count)
+        self.doc_offsets = self.__array("doc_offsets", "<u8", doc_count + 1)
+        self.term_offsets = self.__array("term_offsets", "<u8", term_count + 1)
+        self.doc_freqs = self.__array("doc_freqs", "<u4", term_count)
+        self.idf = self.__array("idf", "<f8", term_count)
+        self.max_scores = self.__array("max_scores", "<f8", term_count)
+        self.postings_offsets = self.__array("postings_offsets", "<u8", term_count + 1)
+        self.postings = lru_cache(maxsize=POSTINGS_CACHE_SIZE)(self.__decode_postings)
+
+    @classmethod
+    def open(cls, path: str) -> "IndexFile":
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def __array(self, name: str, dtype: str, count: int) -> np.ndarray:
+        start, _ = self.sections[name]
+        return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=start)
+
+    def __blob(self, name: str, start: int, end: int) -> bytes:
+        section_start, _ = self.sections[name]
+        return self.buffer[section_start + start : section_start + end]
+
+    def term(self, term_id: int) -> str:
+        start, end = self.term_offsets[term_id : term_id + 2].tolist()
+        return self.__blob("terms", start, end).decode("utf-8")
+
+    def term_id(self, term: str) -> int | None:
+        # utf-8 byte order matches str order, so search without decoding
+        key = term.encode("utf-8")
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = self.term_offsets[mid : mid + 2].tolist()
+            if self.__blob("terms", start, end) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.term_count:
+            start, end = self.term_offsets[lo : lo + 2].tolist()
+            if self.__blob("terms", start, end) == key:
+                return lo
+        return None
+
+    def __decode_postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.postings_offsets[term_id : term_id + 2].tolist()
+        section_start, _ = self.sections["postings"]
+        data = np.frombuffer(
+            self.buffer, dtype=np.uint8, count=end - start, offset=section_start + start
+        )
+        values = decode_varints(data)
+        doc_freq = int(self.doc_freqs[term_id])
+        rows = np.cumsum(values[:doc_freq]).astype(np.int64)
+        tfs = values[doc_freq:].astype(np.int64)
+        return rows, tfs
+
+    def document(self, row: int) -> dict:
+        start, end = self.doc_offsets[row : row + 2].tolist()
+        return json.loads(self.__blob("docs", start, end))
+
+
+class DocumentMap(Mapping):
+    """docmap-compatible mapping of doc id to document, decoded on access"""
+
+    def __init__(self, index_file: IndexFile) -> None:
+        self.index_file = index_file
+        self.__rows: dict[int, int] | None = None
+
+    def rows(self) -> dict[int, int]:
+        if self.__rows is None:
+            self.__rows = {
+                doc_id: row
+                for row, doc_id in enumerate(self.index_file.doc_ids.tolist())
+            }
+        return self.__rows
+
+    def __getitem__(self, doc_id: int) -> dict:
+        return self.index_file.document(self.rows()[doc_id])
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.index_file.doc_ids.tolist())
+
+    def __len__(self) -> int:
+        return self.index_file.doc_count
+
+
+def save_index(path: str, data: bytes) -> None:
+    # write then rename so readers with the old file mapped are unaffected
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -1,40 +1,61 @@
 import collections
 import json
 import math
-import os
-import pickle
-import string
+from concurrent.futures import ProcessPoolExecutor
 from itertools import islice
 
+import numpy as np
 import tqdm
-from nltk.stem import PorterStemmer
-from search_utils import BM25_B, BM25_K1
+from search_utils import BM25_B, BM25_K1, PRUNE_SLACK
+
+from .analyzer import get_analyzer
+from .index_file import DocumentMap, IndexFile, save_index, write_index
+
+INDEX_PATH = "cache/index.bin"
+
+
+def count_shard(movies) -> tuple:
+    # partial index for a slice of movies: token -> doc ids, plus the term
+    # counts of each movie in order. runs in the build worker processes
+    index = dict()
+    doc_counts = list()
+    # tokenize the shard in one batch so each word is stemmed once
+    movie_texts = [f"{movie['title']} {movie['description']}" for movie in movies]
+    movie_tokens = get_analyzer().analyze_many(movie_texts)
+    for movie, tokens_all in zip(movies, movie_tokens):
+        for token in set(tokens_all):
+            if token not in index:
+                index[token] = set()
+            index[token].add(movie["id"])
+        # count token frequency, goes into the matrix at the end of build
+        doc_counts.append(collections.Counter(tokens_all))
+    return index, doc_counts
 
 
 class InvertedIndex:
     def __init__(self, index: dict):
         self.index = index
+        # everything below comes from one binary file (cache/index.bin), build
+        # encodes to the same bytes so build and load go thru the same code
+        # row i -> doc_ids[i], term t -> postings of index_file.postings(t)
+        self.index_file = None
         self.docmap = dict()
-        self.term_frequencies = dict()
-        self.doc_lengths = dict()
-        # get stop words, create stop word set, read file once for perf
-        with open("data/stopwords.txt") as sfile:
-            self.stop_words = sfile.read().splitlines()
+        self.doc_ids = np.empty(0, dtype=np.int64)
+        self.doc_rows = dict()
+        self.doc_lengths = np.empty(0, dtype=np.uint32)
+        # bm25 stats, computed once in build instead of per (term, doc)
+        self.avg_length = 0.0
+        self.idf = np.empty(0, dtype=np.float64)
+        self.length_norm = np.empty(0, dtype=np.float64)
+        # max bm25 contribution of each term to any one doc (MaxScore bound)
+        self.max_scores = np.empty(0, dtype=np.float64)
+        # shared analyzer, stop words + stemmer + stem cache are loaded once
+        self.analyzer = get_analyzer()
+        self.stop_words = self.analyzer.stop_words
 
     def tokenize(self, text_input) -> list:
-        text = text_input.lower()
-        # remove punctuation
-        translation_table = str.maketrans("", "", string.punctuation)
-        text = text.translate(translation_table)
-        # split string, remove empty, and create unique set
-        tokens_init = [str_split for str_split in text.split() if str_split]
-        tokens_nostop = [tok for tok in tokens_init if tok not in self.stop_words]
-        # init stemmer, stem tokens_init, create unique set
-        stemmer = PorterStemmer()
-        tokens_all = [stemmer.stem(tok) for tok in tokens_nostop]
-        # remove the self.stop_words set from the tokens_stem set
-        # could also be written tokens_final = tokens_stem - stop_word_set
-        return tokens_all
+        # lowercase, strip punctuation, drop stop words, stem
+        return self.analyzer.analyze(text_input)
 
     def make_term(self, text_input) -> str:
         token_list = self.tokenize(text_input)
@@ -46,35 +67,130 @@ class InvertedIndex:
             term = token_list[0]
         return term
 
-    def __add_document(self, doc_id, text_input) -> None:
-        tokens_all = self.tokenize(text_input)
-        # count token frequency
-        self.term_frequencies[doc_id] = collections.Counter(tokens_all)
-        self.doc_lengths[doc_id] = len(tokens_all)
-        # make token set and then add to index
-        for token in set(tokens_all):
-            if token not in self.index:
-                self.index[token] = set()
-            self.index[token].add(doc_id)
-
-    def build(self) -> None:
+    def build(self, workers=1) -> None:
         with open("data/movies.json") as jfile:
             movies_dict = json.load(jfile)
-        # iterate thru movies
-        for movie in tqdm.tqdm(movies_dict["movies"]):
-            # get movie metadata
-            doc_id = movie["id"]
-            desc = movie["description"]
-            title = movie["title"]
-            movie_text = f"{title} {desc}"
-            self.docmap[doc_id] = movie
-            self.__add_document(doc_id, movie_text)
+        movies = movies_dict["movies"]
+        if workers > 1 and len(movies) > 1:
+            # contiguous shards, each worker tokenizes one into a partial index
+            shard_size = -(-len(movies) // workers)
+            shards = [
+                movies[i : i + shard_size] for i in range(0, len(movies), shard_size)
+            ]
+            with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+                partials = list(
+                    tqdm.tqdm(pool.map(count_shard, shards), total=len(shards))
+                )
+        else:
+            partials = [count_shard(movies)]
+        # merge in shard order so the index is the same as a serial build
+        doc_counts = list()
+        for part_index, part_counts in partials:
+            for token, doc_id_set in part_index.items():
+                if token not in self.index:
+                    self.index[token] = set()
+                self.index[token].update(doc_id_set)
+            doc_counts.extend(part_counts)
+        doc_ids = [movie["id"] for movie in movies]
+        self.__open(IndexFile(self.__encode(doc_ids, movies, doc_counts)))
+
+    def __encode(self, doc_ids, docs, doc_counts) -> bytes:
+        # doc-term matrix in CSR form first, sorted vocab so term ids are
+        # stable between builds and match the sorted terms in the file
+        terms = sorted(self.index)
+        vocab = {term: tidx for tidx, term in enumerate(terms)}
+        indptr = [0]
+        term_ids = list()
+        tfs = list()
+        for counts in doc_counts:
+            for term_id, tf in sorted((vocab[t], c) for t, c in counts.items()):
+                term_ids.append(term_id)
+                tfs.append(tf)
+            indptr.append(len(term_ids))
+        term_ids = np.array(term_ids, dtype=np.int64)
+        tfs = np.array(tfs, dtype=np.int64)
+        doc_lengths = np.array(
+            [sum(counts.values()) for counts in doc_counts], dtype=np.int64
+        )
+        # transpose to term-major postings, stable sort keeps rows in order
+        rows = np.repeat(np.arange(len(doc_ids)), np.diff(indptr))
+        order = np.argsort(term_ids, kind="stable")
+        doc_freqs = np.bincount(term_ids, minlength=len(terms))
+        post_indptr = np.concatenate(([0], np.cumsum(doc_freqs)))
+        post_rows = rows[order]
+        post_tfs = tfs[order]
+        # idf per term id, same formula as get_bm25_idf
+        doc_count = len(doc_ids)
+        idf = np.array(
+            [
+                math.log((doc_count - df + 0.5) / (df + 0.5) + 1)
+                for df in doc_freqs.tolist()
+            ]
+        )
+        if doc_count:
+            avg_length = int(doc_lengths.sum()) / doc_count
+        else:
+            avg_length = 0.0
+        length_norm = 1.0 - BM25_B + BM25_B * (doc_lengths / avg_length)
+        if len(post_rows):
+            tf_component = (post_tfs * (BM25_K1 + 1)) / (
+                post_tfs + BM25_K1 * length_norm[post_rows]
+            )
+            max_scores = idf * np.maximum.reduceat(tf_component, post_indptr[:-1])
+        else:
+            max_scores = np.zeros(len(terms))
+        return write_index(
+            np.array(doc_ids, dtype=np.int64),
+            docs,
+            doc_lengths,
+            length_norm,
+            terms,
+            post_indptr,
+            post_rows,
+            post_tfs,
+            idf,
+            max_scores,
+        )
+
+    def __open(self, index_file) -> None:
+        self.index_file = index_file
+        self.docmap = DocumentMap(index_file)
+        self.doc_ids = index_file.doc_ids
+        self.doc_rows = self.docmap.rows()
+        self.doc_lengths = index_file.doc_lengths
+        self.avg_length = self.__get_avg_doc_length()
+        self.idf = index_file.idf
+        self.length_norm = index_file.length_norm
+        self.max_scores = index_file.max_scores
+
+    def __term_id(self, term):
+        if self.index_file is None:
+            return None
+        return self.index_file.term_id(term)
+
+    def __term_ids(self, query_tokens) -> list:
+        term_ids = [self.__term_id(tok) for tok in query_tokens]
+        return [term_id for term_id in term_ids if term_id is not None]
+
+    def __max_scores(self, term_ids, k1, length_norm) -> dict:
+        # bounds for other k1/b, only for the query terms (decodes their postings)
+        max_scores = dict()
+        for term_id in term_ids:
+            rows, tf = self.index_file.postings(term_id)
+            tf_component = (tf * (k1 + 1)) / (tf + k1 * length_norm[rows])
+            max_scores[term_id] = self.idf[term_id] * tf_component.max()
+        return max_scores
+
+    def __length_norm(self, b) -> np.ndarray:
+        return 1.0 - b + b * (self.doc_lengths / self.avg_length)
 
     def get_document(self, term_input) -> set:
         print(f"get_document > finding term: {term_input} in documents")
         term = self.make_term(term_input)
-        if term in self.index:
-            doc_id_set = sorted(self.index[term])
+        term_id = self.__term_id(term)
+        if term_id is not None:
+            rows, _ = self.index_file.postings(term_id)
+            doc_id_set = sorted(self.doc_ids[rows].tolist())
             print(f"get_document > found {len(doc_id_set)} docs with term: {term}")
             return doc_id_set
         else:
@@ -90,64 +206,165 @@ class InvertedIndex:
     def get_tf(self, doc_id, term_input) -> int:
         term = self.make_term(term_input)
         term_count = 0
-        if self.term_frequencies.get(doc_id):
-            count_dict = self.term_frequencies[doc_id]
-            if count_dict:
-                term_count = self.term_frequencies[doc_id][term]
+        if doc_id in self.doc_rows:
+            term_count = self.__row_tf(self.doc_rows[doc_id], term)
             # print(f"get_tf > found {term_count} occurences of {term} in doc: {doc_id}")
         else:
             print(f"get_tf > No term: {term} in doc_id: {doc_id}")
         return term_count
 
+    def __row_tf(self, row, term) -> int:
+        term_id = self.__term_id(term)
+        if term_id is None:
+            return 0
+        # rows are sorted inside each posting list
+        rows, tfs = self.index_file.postings(term_id)
+        pos = np.searchsorted(rows, row)
+        if pos < len(rows) and rows[pos] == row:
+            return int(tfs[pos])
+        return 0
+
     def get_bms(self, doc_id, term_input: str) -> float:
         tf = self.get_bm25_tf(doc_id, term_input)
         idf = self.get_bm25_idf(term_input)
         bm25_raw = tf * idf
         return bm25_raw
 
-    def bm25_search(self, query, limit=5) -> dict:
+    def bm25_scores(self, query_tokens, k1=BM25_K1, b=BM25_B) -> np.ndarray:
+        # bm25 score for every row, all query postings in one gather + bincount
+        term_ids = self.__term_ids(query_tokens)
+        if not term_ids:
+            return np.zeros(len(self.doc_ids))
+        if b == BM25_B:
+            length_norm = self.length_norm
+        else:
+            length_norm = self.__length_norm(b)
+        postings = [self.index_file.postings(term_id) for term_id in term_ids]
+        rows = np.concatenate([post_rows for post_rows, _ in postings])
+        tf = np.concatenate([post_tfs for _, post_tfs in postings])
+        idf = np.repeat(
+            self.idf[term_ids], [len(post_rows) for post_rows, _ in postings]
+        )
+        tf_component = (tf * (k1 + 1)) / (tf + k1 * length_norm[rows])
+        return np.bincount(
+            rows, weights=idf * tf_component, minlength=len(self.doc_ids)
+        )
+
+    def bm25_top_k(self, query_tokens, k, k1=BM25_K1, b=BM25_B):
+        # MaxScore: go thru terms from highest to lowest score bound. once the
+        # bounds left can't lift an unseen doc past the current k-th score,
+        # only look up existing candidates in the remaining postings and drop
+        # candidates that can't make it. returns (rows, scores) best first
+        term_ids = self.__term_ids(query_tokens)
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if b == BM25_B:
+            length_norm = self.length_norm
+        else:
+            length_norm = self.__length_norm(b)
+        if k1 == BM25_K1 and b == BM25_B:
+            max_scores = self.max_scores
+        else:
+            max_scores = self.__max_scores(term_ids, k1, length_norm)
+        # highest bound first
+        term_ids = sorted(term_ids, key=lambda tid: max_scores[tid], reverse=True)
+        bounds = np.array([max_scores[tid] for tid in term_ids])
+        # bound_left[i] is the most a doc can still get from terms i and up
+        bound_left = np.append(np.cumsum(bounds[::-1])[::-1], 0.0)
+        cand_rows = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0)
+        threshold = 0.0
+        for tidx, term_id in enumerate(term_ids):
+            rows, tf = self.index_file.postings(term_id)
+            if bound_left[tidx] * (1 + PRUNE_SLACK) >= threshold:
+                # new docs can still get in, merge the whole posting list
+                norm = length_norm[rows]
+                scores = self.idf[term_id] * (tf * (k1 + 1)) / (tf + k1 * norm)
+                all_rows = np.concatenate((cand_rows, rows))
+                all_scores = np.concatenate((cand_scores, scores))
+                cand_rows, inverse = np.unique(all_rows, return_inverse=True)
+                cand_scores = np.bincount(inverse, weights=all_scores)
+            else:
+                # only candidates can, binary search them in the postings
+                pos = np.searchsorted(rows, cand_rows)
+                pos[pos == len(rows)] = 0
+                hits = np.flatnonzero(rows[pos] == cand_rows)
+                tf = tf[pos[hits]]
+                norm = length_norm[cand_rows[hits]]
+                cand_scores[hits] += self.idf[term_id] * (
+                    (tf * (k1 + 1)) / (tf + k1 * norm)
+                )
+            if len(cand_scores) >= k:
+                threshold = np.partition(cand_scores, len(cand_scores) - k)[-k]
+                keep = (cand_scores + bound_left[tidx + 1]) * (1 + PRUNE_SLACK)
+                keep = keep >= threshold
+                cand_rows = cand_rows[keep]
+                cand_scores = cand_scores[keep]
+        # rescore survivors in query order so the sums match bm25_scores
+        scores = self.__rescore(query_tokens, cand_rows, k1, length_norm)
+        ranked = np.lexsort((cand_rows, -scores))[:k]
+        return cand_rows[ranked], scores[ranked]
+
+    def __rescore(self, query_tokens, rows, k1, length_norm) -> np.ndarray:
+        scores = np.zeros(len(rows))
+        for term_id in self.__term_ids(query_tokens):
+            post_rows, post_tfs = self.index_file.postings(term_id)
+            pos = np.searchsorted(post_rows, rows)
+            pos[pos == len(post_rows)] = 0
+            hits = np.flatnonzero(post_rows[pos] == rows)
+            tf = post_tfs[pos[hits]]
+            tf_component = (tf * (k1 + 1)) / (tf + k1 * length_norm[rows[hits]])
+            scores[hits] += self.idf[term_id] * tf_component
+        return scores
+
+    def bm25_check(self, query, k1=BM25_K1, b=BM25_B) -> float:
+        # compare bm25_scores to scoring one (term, doc) pair at a time
+        query_tokens = list(set(self.tokenize(query)))
+        scores = self.bm25_scores(query_tokens, k1, b)
+        ref_scores = np.zeros(len(self.doc_ids))
+        for row in range(len(self.doc_ids)):
+            score = 0.0
+            for token in query_tokens:
+                if self.__term_id(token) is None:
+                    continue
+                term_freq = self.__row_tf(row, token)
+                length_norm = 1.0 - b + b * (self.doc_lengths[row] / self.avg_length)
+                tf_component = (term_freq * (k1 + 1)) / (term_freq + k1 * length_norm)
+                score += self.__token_bm25_idf(token) * tf_component
+            ref_scores[row] = score
+        if not np.array_equal(scores, ref_scores):
+            print(f"bm25_check > scores differ for '{query}'")
+        return float(np.max(np.abs(scores - ref_scores), initial=0.0))
+
+    def bm25_search(self, query, limit=5, k1=BM25_K1, b=BM25_B) -> dict:
         query_tokens = set(self.tokenize(query))
-        scores = dict()
-        for token in query_tokens:
-            if token in self.index:
-                doc_ids = self.index[token]
-                idf = self.get_bm25_idf(token)
-                for doc_id in doc_ids:
-                    tf_component = self.get_bm25_tf(doc_id, token)
-                    score = idf * tf_component
-                    scores[doc_id] = scores.get(doc_id, 0.0) + score
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        top_rows, top_scores = self.bm25_top_k(query_tokens, limit, k1, b)
         results = []
-        for doc_id, score in sorted_scores:
-            if score > 0:
-                doc = self.docmap[doc_id]
-                results.append(
-                    {
-                        "id": doc_id,
-                        "title": doc["title"],
-                        "description": doc["description"],
-                        "score": score,
-                    }
-                )
-        return results[:limit]
+        for row, score in zip(top_rows.tolist(), top_scores.tolist()):
+            doc = self.index_file.document(row)
+            results.append(
+                {
+                    "id": int(self.doc_ids[row]),
+                    "title": doc["title"],
+                    "description": doc["description"],
+                    "score": score,
+                }
+            )
+        return results
 
     def get_bm25_idf(self, term_input: str) -> float:
-        doc_count = len(self.docmap)
-        term_made = self.make_term(term_input)
-        if term_made not in self.index:
+        return self.__token_bm25_idf(self.make_term(term_input))
+
+    def __token_bm25_idf(self, term_made) -> float:
+        term_id = self.__term_id(term_made)
+        if term_id is None:
             return 0
-        term_doc_count = len(self.index[term_made])
-        # doc_freq = len(self.get_document(term_input))
-        bmidf = math.log(
-            (doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1
-        )
-        # print(f"get_bmidf > bmidf for {term_input} is {bmidf}")
-        return bmidf
+        return float(self.idf[term_id])
 
     def get_bm25_tf(self, doc_id, term_input, k1=BM25_K1, b=BM25_B) -> float:
         term_freq = self.get_tf(doc_id, term_input)
-        avg_length = self.__get_avg_doc_length()
-        length_norm = 1.0 - b + b * (self.doc_lengths[doc_id] / avg_length)
+        doc_length = self.doc_lengths[self.doc_rows[doc_id]]
+        length_norm = 1.0 - b + b * (doc_length / self.avg_length)
         tf_component = (term_freq * (k1 + 1)) / (term_freq + k1 * length_norm)
         return tf_component
 
@@ -155,54 +372,22 @@ class InvertedIndex:
         if len(self.doc_lengths) == 0:
             avg_length = 0.0
         else:
-            avg_length = sum(self.doc_lengths.values()) / len(self.doc_lengths)
+            avg_length = int(self.doc_lengths.sum()) / len(self.doc_lengths)
         return avg_length
 
-    def __load_path(self, file_name) -> None:
-        file_path = f"cache/{file_name}.pkl"
-        if os.path.exists(file_path):
-            with open(file_path, "rb") as att_file:
-                return pickle.load(att_file)
-        else:
-            raise FileNotFoundError(f"no file found for {file_path}")
-
     def load(self) -> None:
         # print("semantic_search.load > loading inverted index atts")
-        # index
-        try:
-            self.index = self.__load_path("index")
-        except FileNotFoundError as fnf:
-            print(f"error loading filename: {fnf}")
-        # docmap
-        try:
-            self.docmap = self.__load_path("docmap")
-        except FileNotFoundError as fnf:
-            print(f"error loading filename: {fnf}")
-        # term_frequencies
-        try:
-            self.term_frequencies = self.__load_path("term_frequencies")
-        except FileNotFoundError as fnf:
-            print(f"error loading filename: {fnf}")
-        # doc_lengths
+        # mmap the index file, postings and docs are decoded when used
         try:
-            self.doc_lengths = self.__load_path("doc_lengths")
+            self.__open(IndexFile.open(INDEX_PATH))
         except FileNotFoundError as fnf:
             print(f"error loading filename: {fnf}")
+        except ValueError as ve:
+            print(f"error loading {INDEX_PATH}: {ve}")
 
     def save(self) -> None:
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/index.pkl", "wb") as file_obj:
-            pickle.dump(self.index, file_obj)
-            print(f"successful save: {file_obj}")
-        with open("cache/docmap.pkl", "wb") as file_obj:
-            pickle.dump(self.docmap, file_obj)
-            print(f"successful save: {file_obj}")
-        with open("cache/term_frequencies.pkl", "wb") as file_obj:
-            pickle.dump(self.term_frequencies, file_obj)
-            print(f"successful save: {file_obj}")
-        with open("cache/doc_lengths.pkl", "wb") as file_obj:
-            pickle.dump(self.doc_lengths, file_obj)
-            print(f"successful save: {file_obj}")
+        save_index(INDEX_PATH, bytes(self.index_file.buffer))
+        print(f"successful save: {INDEX_PATH}")
 
 
 #
@@ -5,7 +5,7 @@ import re
 import string
 
 import numpy as np
-import tqdm
+from search_utils import SCORE_BLOCK_SIZE
 from sentence_transformers import SentenceTransformer
 
 
@@ -33,13 +33,33 @@ def verify_embeddings():
     return ss
 
 
-def cosine_similarity(vec1, vec2):
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return dot_product / (norm1 * norm2)
+def normalize_rows(matrix):
+    # unit length float32 rows, zero rows stay zero (cosine 0 like above)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def top_k_indices(scores, k):
+    # argpartition instead of sorting everything. keep every index tied with
+    # the k-th score so the order is the same as a stable sort (ties by index)
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+
+def score_blocks(queries, matrix):
+    # queries @ matrix.T a few queries at a time so a big batch never holds
+    # more than SCORE_BLOCK_SIZE scores
+    step = max(1, SCORE_BLOCK_SIZE // max(len(matrix), 1))
+    for start in range(0, len(queries), step):
+        yield queries[start : start + step] @ matrix.T
 
 
 def embed_query_text(query):
@@ -57,30 +77,42 @@ class SemanticSearch:
         self.embeddings = None
         self.documents = None
         self.document_map = dict()
+        # normalized copy of self.embeddings, redone only when they change
+        self.unit_embeddings = None
+        self.unit_source = None
+
+    def get_unit_embeddings(self):
+        if self.unit_source is not self.embeddings:
+            self.unit_embeddings = normalize_rows(self.embeddings)
+            self.unit_source = self.embeddings
+        return self.unit_embeddings
 
     def search(self, query, limit) -> list:
+        return self.search_batch([query], limit)[0]
+
+    def search_batch(self, queries, limit) -> list:
         if self.embeddings is None:
             raise ValueError(
                 "No embeddings loaded. Call `load_or_create_embedding` first"
             )
-        embq = self.generate_embedding(query)
-        eidx = 0
-        score_list = list()
-        for emb in tqdm.tqdm(self.embeddings):
-            similarity_score = cosine_similarity(emb, embq)
-            score_list.append((similarity_score, self.documents[eidx]))
-            eidx += 1
-        sorted_list = sorted(score_list, key=lambda x: x[0], reverse=True)
-        final_list = list()
-        for idx in range(0, limit):
-            score = sorted_list[idx][0]
-            doc = sorted_list[idx][1]
-            dict_out = dict()
-            dict_out["score"] = score
-            dict_out["title"] = doc["title"]
-            dict_out["description"] = doc["description"]
-            final_list.append(dict_out)
-        return final_list
+        if not queries:
+            return list()
+        embqs = normalize_rows(self.generate_embeddings(queries))
+        all_lists = list()
+        # cosine vs every doc in one matmul per block, rows are already unit length
+        for block in score_blocks(embqs, self.get_unit_embeddings()):
+            for scores in block:
+                final_list = list()
+                for idx in top_k_indices(scores, limit):
+                    score = scores[idx]
+                    doc = self.documents[idx]
+                    dict_out = dict()
+                    dict_out["score"] = score
+                    dict_out["title"] = doc["title"]
+                    dict_out["description"] = doc["description"]
+                    final_list.append(dict_out)
+                all_lists.append(final_list)
+        return all_lists
 
     def generate_embedding(self, text_input):
         if not text_input or not text_input.strip():
@@ -88,6 +120,13 @@ class SemanticSearch:
         embedding = self.model.encode([text_input])
         return embedding[0]
 
+    def generate_embeddings(self, text_inputs):
+        # all queries in one encode call
+        for text_input in text_inputs:
+            if not text_input or not text_input.strip():
+                raise ValueError("generate_embeddings > a text_input is empty")
+        return self.model.encode(list(text_inputs))
+
     def build_embeddings(self, documents):
         self.documents = documents
         doc_strings = list()
@@ -116,11 +155,33 @@ class ChunkedSemanticSearch(SemanticSearch):
         super().__init__(model_name)
         self.chunk_embeddings = None
         self.chunk_metadata = None
+        # normalized chunk rows + where each movie's chunks start, see
+        # get_chunk_groups
+        self.unit_chunks = None
+        self.chunk_source = None
+        self.group_starts = None
+        self.group_ids = None
+
+    def get_chunk_groups(self):
+        if self.chunk_source is not self.chunk_embeddings:
+            self.unit_chunks = normalize_rows(self.chunk_embeddings)
+            # chunks of a movie are next to each other in chunk_metadata
+            movie_idx = self.chunk_metadata["movie_idx"]
+            _, self.group_starts = np.unique(movie_idx, return_index=True)
+            self.group_ids = self.chunk_metadata["doc_id"][self.group_starts].tolist()
+            self.chunk_source = self.chunk_embeddings
+        return self.unit_chunks, self.group_starts, self.group_ids
 
     def build_chunk_embeddings(self, documents):
         self.documents = documents
         chunks = list()
-        chunks_meta = list()
+        # one array per column instead of a dict per chunk
+        chunks_meta = {
+            "movie_idx": list(),
+            "chunk_idx": list(),
+            "total_chunks": list(),
+            "doc_id": list(),
+        }
         for midx, doc in enumerate(documents):
             self.document_map[doc["id"]] = doc
             doc_desc = doc["description"]
@@ -143,15 +204,10 @@ class ChunkedSemanticSearch(SemanticSearch):
             overlap = 1
             minidx = 0
             chunk_idx = 0
-            num_chunks_init = len(chunks_meta)
+            num_chunks_init = len(chunks)
             while minidx < len(text_all):
                 # update idx
                 maxidx = min(minidx + chunk_size, len(text_all))
-                chunk_meta = dict()
-                chunk_meta["id"] = doc["id"]
-                chunk_meta["movie_idx"] = midx
-                chunk_meta["chunk_idx"] = chunk_idx
-                chunk_meta["total_chunks"] = chunk_idx
                 # if one sentence and no punctuation, only loop once.
                 if one_line:
                     maxidx = len(text_all)
@@ -168,28 +224,27 @@ class ChunkedSemanticSearch(SemanticSearch):
                     )
                     continue
                 chunks.append(chunk_text)
-                chunks_meta.append(chunk_meta)
+                chunks_meta["doc_id"].append(doc["id"])
+                chunks_meta["movie_idx"].append(midx)
+                chunks_meta["chunk_idx"].append(chunk_idx)
                 # early exit
                 if maxidx == len(text_all):
                     break
                 # update idx
                 minidx = maxidx - overlap
                 chunk_idx += 1
-            # update total chunks for all chunk_meta dicts for doc_id
-            for midx in range(num_chunks_init, len(chunks_meta)):
-                chunks_meta[midx]["total_chunks"] = chunk_idx
+            # update total chunks for all chunks of doc_id
+            chunks_meta["total_chunks"] += [chunk_idx] * (len(chunks) - num_chunks_init)
         self.chunk_embeddings = self.model.encode(chunks, show_progress_bar=True)
-        self.chunk_metadata = chunks_meta
+        self.chunk_metadata = {
+            name: np.array(values, dtype=np.int64)
+            for name, values in chunks_meta.items()
+        }
         print(f"build_embeddings > num embeddings = {len(self.chunk_embeddings)}")
-        print(f"build_embeddings > num metadata = {len(self.chunk_metadata)}")
+        print(f"build_embeddings > num metadata = {len(chunks)}")
         # save data
         np.save("cache/chunk_embeddings.npy", self.chunk_embeddings)
-        with open("cache/chunk_metadata.json", "w") as jfile:
-            json.dump(
-                {"chunks": self.chunk_metadata, "total_chunks": len(chunks)},
-                jfile,
-                indent=2,
-            )
+        np.savez("cache/chunk_metadata.npz", **self.chunk_metadata)
         return self.chunk_embeddings
 
     def search_chunks(self, query: str, limit: int = 10):
@@ -200,46 +255,31 @@ class ChunkedSemanticSearch(SemanticSearch):
         if not query:
             raise ValueError("search_chunks > text_input empty after strip")
             return list()
-        embq = self.model.encode([query])[0]
-        cidx = 0
-        chunk_scores = list()
-        movie_scores = dict()
-        # print(f"search_chunks > chunk_metadata = {len(self.chunk_metadata)}")
-        # print(f"search_chunks > chunk_embeddings = {len(self.chunk_embeddings)}")
-        for chunk_emb in self.chunk_embeddings:
-            # print(f"cidx = {cidx}")
-            cossim = round(cosine_similarity(chunk_emb, embq), 3)
-            chunk_meta = self.chunk_metadata[cidx]
-            movie_idx = chunk_meta["movie_idx"]
-            cs_dict = dict()
-            cs_dict["chunk_idx"] = chunk_meta["chunk_idx"]
-            cs_dict["movie_idx"] = chunk_meta["movie_idx"]
-            cs_dict["id"] = chunk_meta["id"]
-            cs_dict["score"] = cossim
-            chunk_scores.append(cs_dict)
-            if movie_idx not in movie_scores or movie_scores[movie_idx] < cossim:
-                movie_scores[movie_idx] = cossim
-            cidx += 1
-        scores_sorted = sorted(
-            chunk_scores, key=lambda cs_dict: cs_dict["score"], reverse=True
-        )
-        final_list = list()
-        doc_id_uni = set()
-        for cs_dict in scores_sorted:
-            fin_dict = dict()
-            doc_id = cs_dict["id"]
-            if doc_id in doc_id_uni:
-                # print(f"Duplicate entry for doc_id: {doc_id}, skipping")
-                continue
-            doc_id_uni.add(doc_id)
-            doc = self.document_map[doc_id]
-            fin_dict["id"] = doc_id
-            fin_dict["title"] = doc["title"]
-            fin_dict["description"] = doc["description"][:100]
-            fin_dict["score"] = cs_dict["score"]
-            fin_dict["metadata"] = {}
-            final_list.append(fin_dict)
-        return final_list[:limit]
+        return self.search_chunks_batch([query], limit)[0]
+
+    def search_chunks_batch(self, queries: list[str], limit: int = 10):
+        unit_chunks, group_starts, group_ids = self.get_chunk_groups()
+        if len(unit_chunks) == 0 or not queries:
+            return [list() for _ in queries]
+        embqs = normalize_rows(self.generate_embeddings(queries))
+        all_lists = list()
+        # every chunk in one matmul per block, then best chunk per movie
+        for block in score_blocks(embqs, unit_chunks):
+            chunk_scores = np.round(block, 3)
+            for movie_scores in np.maximum.reduceat(chunk_scores, group_starts, axis=1):
+                final_list = list()
+                for gidx in top_k_indices(movie_scores, limit):
+                    fin_dict = dict()
+                    doc_id = group_ids[gidx]
+                    doc = self.document_map[doc_id]
+                    fin_dict["id"] = doc_id
+                    fin_dict["title"] = doc["title"]
+                    fin_dict["description"] = doc["description"][:100]
+                    fin_dict["score"] = movie_scores[gidx]
+                    fin_dict["metadata"] = {}
+                    final_list.append(fin_dict)
+                all_lists.append(final_list)
+        return all_lists
 
     def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
         self.documents = documents
@@ -249,9 +289,21 @@ class ChunkedSemanticSearch(SemanticSearch):
             self.chunk_embeddings = np.load("cache/chunk_embeddings.npy")
         else:
             print(f"Could not load chunk_embeddings")
-        if os.path.exists("cache/chunk_metadata.json"):
+        if os.path.exists("cache/chunk_metadata.npz"):
+            with np.load("cache/chunk_metadata.npz") as meta:
+                self.chunk_metadata = {name: meta[name] for name in meta.files}
+        elif os.path.exists("cache/chunk_metadata.json"):
+            # old list-of-dicts cache, convert it once
             with open("cache/chunk_metadata.json", "r") as jfile:
-                self.chunk_metadata = json.load(jfile)["chunks"]
+                old_meta = json.load(jfile)["chunks"]
+            self.chunk_metadata = {
+                name: np.array([cm[name] for cm in old_meta], dtype=np.int64)
+                for name in ("movie_idx", "chunk_idx", "total_chunks")
+            }
+            # doc_id was called "id" in the json
+            doc_ids = [cm["id"] for cm in old_meta]
+            self.chunk_metadata["doc_id"] = np.array(doc_ids, dtype=np.int64)
+            np.savez("cache/chunk_metadata.npz", **self.chunk_metadata)
         else:
             print(f"Could not load chunk_metadata")
         if self.chunk_embeddings is None or self.chunk_metadata is None:
@@ -1,2 +1,8 @@
 BM25_K1 = 1.5
 BM25_B = 0.75
+# wiggle room on maxscore bounds so float rounding can't prune a real hit
+PRUNE_SLACK = 1e-9
+# max memoized stems in the analyzer
+STEM_CACHE_SIZE = 1 << 16
+# max query x doc scores held at once by batched semantic search
+SCORE_BLOCK_SIZE = 1 << 22
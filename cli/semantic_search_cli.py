@@ -74,7 +74,7 @@ def main():
             css = ss.ChunkedSemanticSearch()
             css.load_or_create_chunk_embeddings(movies_dict)
             # chunks = css.build_chunk_embeddings(movies_dict)
-            print(f"num chunk_metadata = {len(css.chunk_metadata)}")
+            print(f"num chunk_metadata = {len(css.chunk_metadata["movie_idx"])}")
             print(f"num chunk_embedding = {len(css.chunk_embeddings)}")
             chunks = css.search_chunks(args.query, args.limit)
             cidx = 1
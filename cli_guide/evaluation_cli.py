@@ -32,6 +32,14 @@ def main() -> None:
         print(f"  - Matched: {', '.join(sorted(res['matched']))}")
         print()
 
+    print("Models loaded:")
+    for model in result["models"]:
+        size = "?" if model["bytes"] is None else f"{model['bytes'] / 2**20:.1f} MiB"
+        print(
+            f"- {model['kind']} {model['model']} on {model['device']}: {size}, "
+            f"loaded in {model['load_seconds']:.2f}s"
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -5,6 +5,16 @@ from lib.hybrid_search import (
     rrf_search_command,
     weighted_search_command,
 )
+from lib.search_client import call_server
+
+
+def print_timings(timings: dict) -> None:
+    # the legs run concurrently, so the total is close to the slower one
+    print(
+        f"  BM25 {timings['bm25_seconds'] * 1000:.1f} ms, "
+        f"semantic {timings['semantic_seconds'] * 1000:.1f} ms, "
+        f"both {timings['total_seconds'] * 1000:.1f} ms"
+    )
 
 
 def main() -> None:
@@ -31,6 +41,11 @@ def main() -> None:
     weighted_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return (default=5)"
     )
+    weighted_parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Send the request to a running search_server_cli.py",
+    )
 
     rrf_parser = subparsers.add_parser(
         "rrf-search", help="Perform Reciprocal Rank Fusion search"
@@ -57,6 +72,11 @@ def main() -> None:
     rrf_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return (default=5)"
     )
+    rrf_parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Send the request to a running search_server_cli.py",
+    )
 
     args = parser.parse_args()
 
@@ -66,7 +86,11 @@ def main() -> None:
             for score in normalized:
                 print(f"* {score:.4f}")
         case "weighted-search":
-            result = weighted_search_command(args.query, args.alpha, args.limit)
+            params = {"query": args.query, "alpha": args.alpha, "limit": args.limit}
+            if args.server:
+                result = call_server("weighted-search", params)
+            else:
+                result = weighted_search_command(**params)
 
             print(
                 f"Weighted Hybrid Search Results for '{result['query']}' (alpha={result['alpha']}):"
@@ -74,6 +98,7 @@ def main() -> None:
             print(
                 f"  Alpha {result['alpha']}: {int(result['alpha'] * 100)}% Keyword, {int((1 - result['alpha']) * 100)}% Semantic"
             )
+            print_timings(result["timings"])
             for i, res in enumerate(result["results"], 1):
                 print(f"{i}. {res['title']}")
                 print(f"   Hybrid Score: {res.get('score', 0):.3f}")
@@ -85,9 +110,17 @@ def main() -> None:
                 print(f"   {res['document'][:100]}...")
                 print()
         case "rrf-search":
-            result = rrf_search_command(
-                args.query, args.k, args.enhance, args.rerank_method, args.limit
-            )
+            params = {
+                "query": args.query,
+                "k": args.k,
+                "enhance": args.enhance,
+                "rerank_method": args.rerank_method,
+                "limit": args.limit,
+            }
+            if args.server:
+                result = call_server("rrf-search", params)
+            else:
+                result = rrf_search_command(**params)
 
             if result["enhanced_query"]:
                 print(
@@ -102,6 +135,7 @@ def main() -> None:
             print(
                 f"Reciprocal Rank Fusion Results for '{result['query']}' (k={result['k']}):"
             )
+            print_timings(result["timings"])
 
             for i, res in enumerate(result["results"], 1):
                 print(f"{i}. {res['title']}")
@@ -0,0 +1,37 @@
+import argparse
+
+from lib.importtime import IMPORTTIME_COMMANDS, importtime_command
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure the import cost of CLI subcommands (-X importtime)"
+    )
+    parser.add_argument(
+        "command",
+        nargs=argparse.REMAINDER,
+        help="Script and arguments to measure, e.g. hybrid_search_cli.py "
+        "normalize 1 2 (default: a set of cheap subcommands)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=5,
+        help="Heaviest top-level imports to list per command (default=5)",
+    )
+
+    args = parser.parse_args()
+    commands = [args.command] if args.command else IMPORTTIME_COMMANDS
+    for report in importtime_command(commands, args.top):
+        status = "" if report["returncode"] == 0 else " (failed)"
+        print(f"{report['command']}{status}")
+        print(
+            f"  wall {report['wall_ms']:.0f} ms, imports {report['import_ms']:.0f} ms "
+            f"({report['modules']} modules)"
+        )
+        for name, ms in report["heaviest"]:
+            print(f"    {ms:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,36 @@
 import argparse
 
 from lib.keyword_search import (
+    analyzer_benchmark_command,
     bm25_idf_command,
     bm25_tf_command,
+    bm25check_command,
     bm25search_command,
     build_command,
     idf_command,
+    merge_command,
     search_command,
     tf_command,
     tfidf_command,
+    update_command,
 )
-from lib.search_utils import BM25_B, BM25_K1
+from lib.search_client import call_server
+from lib.search_utils import BM25_B, BM25_K1, DEFAULT_SEARCH_LIMIT
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Keyword Search CLI")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
-    subparsers.add_parser("build", help="Build the inverted index")
+    build_parser = subparsers.add_parser("build", help="Build the inverted index")
+    build_parser.add_argument(
+        "--workers", type=int, default=1, help="Processes to tokenize with"
+    )
+
+    subparsers.add_parser(
+        "update", help="Apply changes in movies.json to the index incrementally"
+    )
+    subparsers.add_parser("merge", help="Merge all index segments into one")
 
     search_parser = subparsers.add_parser("search", help="Search movies using BM25")
     search_parser.add_argument("query", type=str, help="Search query")
@@ -64,14 +77,59 @@ def main() -> None:
         "bm25search", help="Search movies using full BM25 scoring"
     )
     bm25search_parser.add_argument("query", type=str, help="Search query")
+    bm25search_parser.add_argument(
+        "k1", type=float, nargs="?", default=BM25_K1, help="Tunable BM25 K1 parameter"
+    )
+    bm25search_parser.add_argument(
+        "b", type=float, nargs="?", default=BM25_B, help="Tunable BM25 b parameter"
+    )
+    bm25search_parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Send the request to a running search_server_cli.py",
+    )
+
+    bm25check_parser = subparsers.add_parser(
+        "bm25check", help="Check vectorized BM25 scores against per-pair scoring"
+    )
+    bm25check_parser.add_argument("query", type=str, help="Search query")
+    bm25check_parser.add_argument(
+        "k1", type=float, nargs="?", default=BM25_K1, help="Tunable BM25 K1 parameter"
+    )
+    bm25check_parser.add_argument(
+        "b", type=float, nargs="?", default=BM25_B, help="Tunable BM25 b parameter"
+    )
+
+    analyzerbench_parser = subparsers.add_parser(
+        "analyzerbench", help="Benchmark tokenization with the shared Analyzer"
+    )
+    analyzerbench_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per timing, best is kept"
+    )
 
     args = parser.parse_args()
 
     match args.command:
         case "build":
             print("Building inverted index...")
-            build_command()
+            build_command(args.workers)
             print("Inverted index built successfully.")
+        case "update":
+            stats = update_command()
+            print(
+                f"Added {stats['added']}, updated {stats['updated']}, "
+                f"deleted {stats['deleted']} documents."
+            )
+            print(
+                f"Index has {stats['documents']} documents in "
+                f"{stats['segments']} segments (generation {stats['generation']})."
+            )
+        case "merge":
+            stats = merge_command()
+            print(
+                f"Index has {stats['documents']} documents in "
+                f"{stats['segments']} segments (generation {stats['generation']})."
+            )
         case "search":
             print("Searching for:", args.query)
             results = search_command(args.query)
@@ -98,9 +156,38 @@ def main() -> None:
             )
         case "bm25search":
             print("Searching for:", args.query)
-            results = bm25search_command(args.query)
+            params = {
+                "query": args.query,
+                "limit": DEFAULT_SEARCH_LIMIT,
+                "k1": args.k1,
+                "b": args.b,
+            }
+            if args.server:
+                results = call_server("bm25search", params)
+            else:
+                results = bm25search_command(**params)
             for i, res in enumerate(results, 1):
                 print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "bm25check":
+            check = bm25check_command(args.query, args.k1, args.b)
+            status = "equal" if check["equal"] else "MISMATCH"
+            print(
+                f"BM25 scores for '{check['query']}' over {check['documents']} documents: "
+                f"{status} (max abs diff {check['max_abs_diff']:.3g})"
+            )
+        case "analyzerbench":
+            bench = analyzer_benchmark_command(args.repeat)
+            print(
+                f"Tokenizing {bench['documents']} documents and "
+                f"{bench['queries']} queries (best of {args.repeat}):"
+            )
+            for name in ("build", "query"):
+                timing = bench[name]
+                print(
+                    f"  {name}: {timing['uncached'] * 1000:.1f}ms -> "
+                    f"{timing['analyzer'] * 1000:.1f}ms "
+                    f"({timing['speedup']:.1f}x)"
+                )
         case _:
             parser.print_help()
 
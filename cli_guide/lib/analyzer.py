@@ -0,0 +1,62 @@
+import string
+from collections.abc import Iterable
+from functools import lru_cache
+
+from .search_utils import STEM_CACHE_SIZE, load_stopwords
+
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+
+class Analyzer:
+    """Text analysis shared by indexing and querying
+
+    Lowercases, strips punctuation, drops stopwords and Porter-stems. The
+    stopword set, translation table and stemmer are built once, and stems
+    are memoized since the vocabulary is far smaller than the token stream.
+    """
+
+    def __init__(
+        self,
+        stopwords: Iterable[str] | None = None,
+        stem_cache_size: int = STEM_CACHE_SIZE,
+    ) -> None:
+        if stopwords is None:
+            stopwords = load_stopwords()
+        # nltk takes a quarter second to import; only paid once text is analyzed
+        from nltk.stem import PorterStemmer
+
+        self.stopwords = frozenset(stopwords)
+        self.stemmer = PorterStemmer()
+        self.stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+    def words(self, text: str) -> list[str]:
+        words = text.lower().translate(PUNCTUATION_TABLE).split()
+        return [word for word in words if word not in self.stopwords]
+
+    def analyze(self, text: str) -> list[str]:
+        stem = self.stem
+        return [stem(word) for word in self.words(text)]
+
+    def analyze_many(self, texts: Iterable[str]) -> list[list[str]]:
+        """Analyze a batch of texts, stemming each distinct word once
+
+        Args:
+            texts: Texts to analyze
+
+        Returns:
+            Tokens of every text, in input order
+        """
+        word_lists = [self.words(text) for text in texts]
+        stem = self.stem
+        stems = {word: stem(word) for words in word_lists for word in words}
+        return [[stems[word] for word in words] for words in word_lists]
+
+
+_analyzer: Analyzer | None = None
+
+
+def get_analyzer() -> Analyzer:
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = Analyzer()
+    return _analyzer
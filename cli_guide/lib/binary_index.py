@@ -0,0 +1,60 @@
+import numpy as np
+
+from .search_utils import DEFAULT_BINARY_CANDIDATES, EMBEDDING_BLOCK_ROWS
+from .vectors import top_k_indices
+
+
+def pack_signs(vectors: np.ndarray) -> np.ndarray:
+    """One bit per dimension (set when positive), as uint64 words per row
+
+    Rows are zero-padded to whole words; padding bits are equal in every
+    row and query, so they never add to a Hamming distance.
+    """
+    bits = np.packbits(vectors > 0, axis=-1)
+    padding = -bits.shape[-1] % 8
+    if padding:
+        widths = [(0, 0)] * (bits.ndim - 1) + [(0, padding)]
+        bits = np.pad(bits, widths)
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+class BinaryIndex:
+    """Sign-bit prefilter re-scored with the float vectors
+
+    Each unit vector is reduced to the signs of its dimensions, 48 bytes
+    for 384 dimensions. A query's Hamming distance to every row is an XOR
+    and a popcount over a few 64-bit words, and only the `candidates`
+    closest rows are scored exactly with the float vectors.
+    """
+
+    def __init__(
+        self, vectors: np.ndarray, candidates: int = DEFAULT_BINARY_CANDIDATES
+    ) -> None:
+        self.vectors = vectors
+        # packed a block at a time to keep the boolean temporaries small
+        blocks = [
+            pack_signs(vectors[start : start + EMBEDDING_BLOCK_ROWS])
+            for start in range(0, len(vectors), EMBEDDING_BLOCK_ROWS)
+        ]
+        self.bits = np.concatenate(blocks) if blocks else pack_signs(vectors)
+        self.candidates = candidates
+
+    def hamming_distances(self, query: np.ndarray) -> np.ndarray:
+        differing = np.bitwise_count(self.bits ^ pack_signs(query))
+        return differing.sum(axis=1, dtype=np.int64)
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top k rows by cosine similarity among the Hamming-nearest rows
+
+        Args:
+            query: Unit-length query vector
+            k: Number of rows to return
+
+        Returns:
+            (rows, scores), best first, ties in row order
+        """
+        distances = self.hamming_distances(query)
+        rows = np.sort(top_k_indices(-distances, max(k, self.candidates)))
+        scores = self.vectors[rows] @ query
+        top = top_k_indices(scores, k)
+        return rows[top], scores[top]
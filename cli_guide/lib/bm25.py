@@ -0,0 +1,19 @@
+import math
+
+import numpy as np
+
+
+def bm25_idf(doc_count: int, doc_freq: int) -> float:
+    return math.log((doc_count - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+
+
+def bm25_length_norm(
+    doc_lengths: np.ndarray, avg_doc_length: float, b: float
+) -> np.ndarray:
+    if avg_doc_length > 0:
+        return 1 - b + b * (doc_lengths / avg_doc_length)
+    return np.ones(len(doc_lengths))
+
+
+def bm25_tf_component(tf: np.ndarray, length_norm: np.ndarray, k1: float) -> np.ndarray:
+    return (tf * (k1 + 1)) / (tf + k1 * length_norm)
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+from collections.abc import Callable, Iterable
+
+import numpy as np
+
+from .index_file import save_index
+from .search_utils import EMBEDDING_BLOCK_ROWS, EMBEDDING_DTYPE, ENCODE_WINDOW_SIZE
+from .vectors import normalize_rows
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(manifest_path: str) -> dict | None:
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def manifest_fingerprint(manifest_path: str, rows: int | None = None) -> str | None:
+    """Identify the cached embeddings that an index was built from
+
+    Hashes the model name and the content hashes of the first rows (all by
+    default), so an index over a prefix of the rows can tell that rows were
+    only appended since it was built.
+    """
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        return None
+    hashes = manifest["hashes"] if rows is None else manifest["hashes"][:rows]
+    return content_hash("\n".join([manifest["model"], *hashes]))
+
+
+def load_embeddings(
+    embeddings_path: str,
+    manifest_path: str,
+    model_name: str,
+    hashes: list[str],
+    dtype: str | None = None,
+) -> np.ndarray | None:
+    """Load cached embeddings if they were built from exactly these texts
+
+    Args:
+        embeddings_path: .npy file with one unit-length row per text
+        manifest_path: JSON manifest with the model name, the stored dtype
+            and a content hash per row
+        model_name: Model the embeddings must come from
+        hashes: content_hash of the texts the rows must match, in order
+        dtype: Storage format the rows must have (default: any)
+
+    Returns:
+        The cached embeddings memory-mapped read-only, or None if any text,
+        the model or the dtype differs
+    """
+    manifest = load_manifest(manifest_path)
+    if manifest is None or manifest["model"] != model_name:
+        return None
+    # caches without a dtype predate unit-length rows and get rewritten
+    if manifest.get("dtype") is None or dtype not in (None, manifest["dtype"]):
+        return None
+    if manifest["hashes"] != hashes:
+        return None
+    if not os.path.exists(embeddings_path):
+        return None
+    embeddings = open_embeddings(embeddings_path)
+    # a rebuild may have replaced the file since the manifest was read
+    if len(embeddings) != len(hashes):
+        return None
+    return embeddings
+
+
+def open_embeddings(embeddings_path: str) -> np.ndarray:
+    # mapped read-only, so every process shares the page cache copy
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    if embeddings.size == 0:
+        return np.array(embeddings)
+    return embeddings
+
+
+def update_embeddings(
+    encode: Callable[[list[str]], np.ndarray],
+    model_name: str,
+    texts: Iterable[str],
+    embeddings_path: str,
+    manifest_path: str,
+    dtype: str | None = None,
+    hashes: list[str] | None = None,
+    window_size: int = ENCODE_WINDOW_SIZE,
+) -> np.ndarray:
+    """Embed texts, encoding only those without a cached vector
+
+    Rows of the previous cache are reused by content hash, so unchanged,
+    reordered and repeated texts are never encoded again, and identical
+    texts within this call are encoded once. Rows are stored unit length,
+    so cosine similarity is a plain dot product over the mapped file.
+
+    Texts are passed to encode window_size at a time and each window is
+    written straight into a preallocated memory-mapped .npy, so memory
+    stays bounded by one window however many texts there are.
+
+    Args:
+        encode: Encodes a list of texts, e.g. a BucketedEncoder
+        model_name: Stored in the manifest; a different model reuses nothing
+        texts: Texts to embed, one row each; read once, in step with hashes
+            when those are given, so it can be a generator
+        embeddings_path: .npy file to read the cache from and write to
+        manifest_path: JSON manifest kept next to embeddings_path
+        dtype: "float32" or "float16" (default: the cache's current format,
+            else EMBEDDING_DTYPE)
+        hashes: content_hash of every text, if already known
+        window_size: Texts per encode call
+
+    Returns:
+        Embeddings for every text, in order, memory-mapped read-only
+    """
+    if hashes is None:
+        texts = list(texts)
+        hashes = [content_hash(text) for text in texts]
+    cached = None
+    cached_rows: dict[str, int] = {}
+    manifest = load_manifest(manifest_path)
+    if dtype is None:
+        dtype = (manifest or {}).get("dtype") or EMBEDDING_DTYPE
+    if (
+        manifest is not None
+        and manifest["model"] == model_name
+        and os.path.exists(embeddings_path)
+    ):
+        cached = np.load(embeddings_path, mmap_mode="r")
+        if len(cached) == len(manifest["hashes"]):
+            cached_rows = {h: row for row, h in enumerate(manifest["hashes"])}
+
+    # drop the manifest first: a crash before the new one is written leaves
+    # no manifest, which forces a full re-embed instead of mismatched rows.
+    # The new file is renamed into place, so processes that still map the
+    # old one keep reading it.
+    os.makedirs(os.path.dirname(embeddings_path), exist_ok=True)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    tmp_path = f"{embeddings_path}.tmp"
+    writer = EmbeddingWriter(tmp_path, len(hashes), dtype)
+    if cached is not None and cached.ndim == 2 and len(cached):
+        writer.allocate(cached.shape[1])
+
+    # first row of every distinct text that is encoded in this call
+    encoded_rows: dict[str, int] = {}
+    reused: list[tuple[int, int]] = []
+    repeated: list[tuple[int, int]] = []
+    window: list[str] = []
+    window_rows: list[int] = []
+    for row, (text, h) in enumerate(zip(texts, hashes)):
+        if h in cached_rows:
+            reused.append((row, cached_rows[h]))
+        elif h in encoded_rows:
+            repeated.append((row, encoded_rows[h]))
+        else:
+            encoded_rows[h] = row
+            window.append(text)
+            window_rows.append(row)
+            if len(window) == window_size:
+                writer.write(window_rows, encode(window))
+                window, window_rows = [], []
+    if window:
+        writer.write(window_rows, encode(window))
+
+    # copied a block at a time; normalizing again is a no-op for these rows
+    for pairs, source in ((reused, cached), (repeated, writer.embeddings)):
+        for start in range(0, len(pairs), EMBEDDING_BLOCK_ROWS):
+            block = pairs[start : start + EMBEDDING_BLOCK_ROWS]
+            targets, sources = map(list, zip(*block))
+            writer.write(targets, source[sources])
+    del cached
+
+    writer.close()
+    os.replace(tmp_path, embeddings_path)
+    # renamed into place like the rows, so no reader sees it half-written
+    manifest = {"model": model_name, "dtype": dtype, "hashes": hashes}
+    save_index(manifest_path, json.dumps(manifest).encode("utf-8"))
+    return open_embeddings(embeddings_path)
+
+
+class EmbeddingWriter:
+    """Rows written into a preallocated .npy of unit-length embeddings
+
+    The file is created once the row width is known, from the cache being
+    replaced or from the first encoded window.
+    """
+
+    def __init__(self, path: str, n_rows: int, dtype: str) -> None:
+        self.path = path
+        self.n_rows = n_rows
+        self.dtype = dtype
+        self.embeddings: np.ndarray | None = None
+
+    def allocate(self, dim: int) -> None:
+        if self.embeddings is not None:
+            return
+        shape = (self.n_rows, dim)
+        if self.n_rows and dim:
+            self.embeddings = np.lib.format.open_memmap(
+                self.path, mode="w+", dtype=self.dtype, shape=shape
+            )
+        else:
+            # nothing to map; an empty array is saved on close
+            self.embeddings = np.empty(shape, dtype=self.dtype)
+
+    def write(self, rows: list[int], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors)
+        self.allocate(vectors.shape[1])
+        self.embeddings[rows] = normalize_rows(vectors)
+
+    def close(self) -> None:
+        self.allocate(0)
+        if isinstance(self.embeddings, np.memmap):
+            self.embeddings.flush()
+        else:
+            with open(self.path, "wb") as f:
+                np.save(f, self.embeddings)
+        self.embeddings = None
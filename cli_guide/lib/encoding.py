@@ -0,0 +1,240 @@
+import json
+import multiprocessing
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from .index_file import save_index
+from .model_registry import get_model_registry, model_lock
+from .search_utils import (
+    CALIBRATION_BATCH_SIZES,
+    CALIBRATION_SAMPLE_SIZE,
+    DEFAULT_ENCODE_BATCH_SIZE,
+    ENCODE_CALIBRATION_PATH,
+)
+
+
+def token_lengths(model, texts: list[str]) -> np.ndarray:
+    # character counts stand in for models without a tokenizer
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.array([len(text) for text in texts], dtype=np.int64)
+    with model_lock(model):
+        input_ids = tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )["input_ids"]
+    return np.array([len(ids) for ids in input_ids], dtype=np.int64)
+
+
+class BucketedEncoder:
+    """Encode texts in batches of similar token length
+
+    A batch is padded to its longest text, so encoding texts in corpus
+    order spends much of the time on padding. Each call sorts its texts by
+    token length, encodes them batch_size at a time and returns the rows in
+    the original order. Texts encoded and seconds spent are accumulated
+    for throughput reports.
+
+    The model comes from load_model, called on first use, so an encoder
+    that never encodes never loads one.
+    """
+
+    def __init__(
+        self,
+        load_model: Callable[[], Any],
+        batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+    ) -> None:
+        self.load_model = load_model
+        self.batch_size = batch_size
+        self.texts = 0
+        self.seconds = 0.0
+        self.__model = None
+
+    @property
+    def model(self):
+        if self.__model is None:
+            self.__model = self.load_model()
+        return self.__model
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.seconds if self.seconds > 0 else 0.0
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        order = np.argsort(self.token_lengths(texts), kind="stable")
+        batches = [
+            [texts[j] for j in order[i : i + self.batch_size].tolist()]
+            for i in range(0, len(order), self.batch_size)
+        ]
+        blocks = self.encode_batches(batches)
+        embeddings = np.empty((len(texts), blocks[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(blocks)
+        self.texts += len(texts)
+        self.seconds += time.perf_counter() - start
+        return embeddings
+
+    def token_lengths(self, texts: list[str]) -> np.ndarray:
+        return token_lengths(self.model, texts)
+
+    def encode_batches(self, batches: list[list[str]]) -> list[np.ndarray]:
+        return [encode_batch(self.model, batch) for batch in batches]
+
+    def close(self) -> None:
+        pass
+
+
+def encode_batch(model, texts: list[str]) -> np.ndarray:
+    # one forward pass: the texts are already a batch
+    return np.asarray(model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+
+
+# the model of a PooledEncoder worker process, loaded by init_worker
+_worker_model = None
+
+
+def init_worker(model_name: str, threads: int) -> None:
+    global _worker_model
+    import torch
+
+    # workers split the cores instead of each using all of them
+    torch.set_num_threads(threads)
+    _worker_model = get_model_registry().sentence_transformer(model_name)
+
+
+def encode_in_worker(texts: list[str]) -> np.ndarray:
+    return encode_batch(_worker_model, texts)
+
+
+def token_lengths_in_worker(texts: list[str]) -> np.ndarray:
+    return token_lengths(_worker_model, texts)
+
+
+class PooledEncoder(BucketedEncoder):
+    """BucketedEncoder that spreads its work over worker processes
+
+    Every worker loads its own copy of the model and limits torch to its
+    share of the cores. The workers also measure token lengths, a shard of
+    the texts each, so this process never loads a model: it only sorts
+    the texts into batches, and the batches come back in order. The pool
+    starts on first use; call close() to stop it.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int,
+        batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+    ) -> None:
+        super().__init__(self.__no_model, batch_size)
+        self.model_name = model_name
+        self.workers = workers
+        self.pool: ProcessPoolExecutor | None = None
+
+    def token_lengths(self, texts: list[str]) -> np.ndarray:
+        shard_size = -(-len(texts) // self.workers)
+        shards = [texts[i : i + shard_size] for i in range(0, len(texts), shard_size)]
+        return np.concatenate(list(self.__pool().map(token_lengths_in_worker, shards)))
+
+    def encode_batches(self, batches: list[list[str]]) -> list[np.ndarray]:
+        return list(self.__pool().map(encode_in_worker, batches))
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # spawned, not forked: forking a process that has already run
+            # torch can deadlock its thread pools
+            self.pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.model_name, threads),
+            )
+        return self.pool
+
+    def __no_model(self) -> Any:
+        raise RuntimeError("a PooledEncoder's model lives in its workers")
+
+
+def create_encoder(
+    load_model: Callable[[], Any], model_name: str, workers: int = 1
+) -> BucketedEncoder:
+    batch_size = calibrated_batch_size(model_name)
+    if workers > 1:
+        return PooledEncoder(model_name, workers, batch_size)
+    return BucketedEncoder(load_model, batch_size)
+
+
+def calibrate_batch_size(
+    model,
+    model_name: str,
+    texts: list[str],
+    batch_sizes: list[int] = CALIBRATION_BATCH_SIZES,
+    sample_size: int = CALIBRATION_SAMPLE_SIZE,
+) -> dict:
+    """Time bucketed encoding at each batch size and save the fastest
+
+    Args:
+        model: SentenceTransformer (or anything with the same encode)
+        model_name: Key the result is saved under
+        texts: Representative texts; a fixed sample of them is encoded
+        batch_sizes: Batch sizes to try
+        sample_size: Texts encoded per batch size
+
+    Returns:
+        {"batch_size", "cpu_count", "texts_per_second": {size: rate}}; the
+        same is saved to ENCODE_CALIBRATION_PATH and used by
+        calibrated_batch_size on this machine
+    """
+    if not texts:
+        raise ValueError("cannot calibrate without texts")
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(texts), min(sample_size, len(texts)), replace=False)
+    sample = [texts[i] for i in np.sort(picks).tolist()]
+    # the first call pays for lazy initialization; keep it out of the timings
+    BucketedEncoder(lambda: model, batch_sizes[0])(sample[: batch_sizes[0]])
+
+    rates = {}
+    for batch_size in batch_sizes:
+        encoder = BucketedEncoder(lambda: model, batch_size)
+        encoder(sample)
+        rates[batch_size] = encoder.texts_per_second
+    result = {
+        "batch_size": max(rates, key=rates.get),
+        "cpu_count": os.cpu_count(),
+        "texts_per_second": rates,
+    }
+
+    calibrations = load_calibrations()
+    calibrations[model_name] = result
+    save_index(ENCODE_CALIBRATION_PATH, json.dumps(calibrations).encode("utf-8"))
+    return result
+
+
+def load_calibrations() -> dict:
+    if not os.path.exists(ENCODE_CALIBRATION_PATH):
+        return {}
+    with open(ENCODE_CALIBRATION_PATH, "r") as f:
+        return json.load(f)
+
+
+def calibrated_batch_size(model_name: str) -> int:
+    # a calibration from a machine with a different CPU count does not apply
+    result = load_calibrations().get(model_name)
+    if result is None or result["cpu_count"] != os.cpu_count():
+        return DEFAULT_ENCODE_BATCH_SIZE
+    return result["batch_size"]
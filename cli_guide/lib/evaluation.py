@@ -1,4 +1,5 @@
 from .hybrid_search import HybridSearch
+from .model_registry import get_model_registry
 from .search_utils import load_golden_dataset, load_movies
 from .semantic_search import SemanticSearch
 
@@ -69,4 +70,6 @@ def evaluate_command(limit: int = 5) -> dict:
         "test_cases_count": len(test_cases),
         "limit": limit,
         "results": results_by_query,
+        # both searchers share one copy of the model
+        "models": get_model_registry().footprint(),
     }
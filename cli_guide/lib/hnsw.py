@@ -0,0 +1,302 @@
+import heapq
+import io
+import math
+import threading
+
+import numpy as np
+
+from .index_file import save_index
+from .search_utils import DEFAULT_HNSW_EF_SEARCH, HNSW_EF_CONSTRUCTION, HNSW_M
+
+
+class HNSWIndex:
+    """Hierarchical navigable small world graph over unit vectors
+
+    Every row of `vectors` is a node. Nodes get a random level and are
+    linked to their nearest neighbors on each layer up to it; a search
+    walks greedily down the sparse upper layers and then runs a best-first
+    search of width ef_search on layer 0. Rows are inserted in order, so
+    appending vectors and calling insert_rows again extends the graph.
+
+    `vectors` may be memory-mapped or float16; rows are read as needed and
+    scored in float32. Links live in NumPy arrays: layer 0 has a
+    (capacity, 2 * m) array, and a node with level L owns L consecutive
+    (m,) rows of upper_links, the first at upper_offsets[node]. Unused
+    slots hold -1.
+
+    Searches may run from several threads at once; inserts change the
+    graph and must not overlap anything else.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = DEFAULT_HNSW_EF_SEARCH,
+        fingerprint: str = "",
+    ) -> None:
+        self.vectors = vectors
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.fingerprint = fingerprint
+        self.level_factor = 1 / math.log(m)
+        self.rng = np.random.default_rng(0)
+
+        self.size = 0
+        self.entry_point = -1
+        self.max_level = -1
+        self.levels = np.zeros(0, dtype=np.int8)
+        self.links = np.full((0, 2 * m), -1, dtype=np.int32)
+        self.link_counts = np.zeros(0, dtype=np.int32)
+        self.upper_offsets = np.zeros(0, dtype=np.int64)
+        self.upper_links = np.full((0, m), -1, dtype=np.int32)
+        self.upper_counts = np.zeros(0, dtype=np.int32)
+        self.upper_size = 0
+        # visit marks for searches, one array per thread: a node is visited
+        # if its mark equals the thread's current tag, so nothing has to be
+        # cleared between searches and concurrent ones never share marks
+        self.marks = threading.local()
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        fingerprint: str = "",
+    ) -> "HNSWIndex":
+        index = cls(vectors, m, ef_construction, fingerprint=fingerprint)
+        index.insert_rows(len(vectors))
+        return index
+
+    def insert_rows(self, end: int) -> None:
+        """Insert rows size..end of self.vectors into the graph"""
+        self.__reserve(end)
+        for row in range(self.size, end):
+            self.__insert(row)
+            self.size = row + 1
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top k rows by cosine similarity
+
+        Args:
+            query: Unit-length query vector
+            k: Number of rows to return
+
+        Returns:
+            (rows, scores), best first, ties in row order
+        """
+        if self.entry_point < 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        entry = np.array([self.entry_point])
+        for level in range(self.max_level, 0, -1):
+            entry, _ = self.__search_layer(query, entry, 1, level)
+        rows, scores = self.__search_layer(query, entry, max(self.ef_search, k), 0)
+        return rows[:k].astype(np.int64), scores[:k]
+
+    def __insert(self, row: int) -> None:
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_factor)
+        self.levels[row] = level
+        if level:
+            self.upper_offsets[row] = self.upper_size
+            self.__reserve_upper(self.upper_size + level)
+            self.upper_size += level
+        if self.entry_point < 0:
+            self.entry_point = row
+            self.max_level = level
+            return
+
+        query = self.vectors[row].astype(np.float32)
+        entry = np.array([self.entry_point])
+        for layer in range(self.max_level, level, -1):
+            entry, _ = self.__search_layer(query, entry, 1, layer)
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates, scores = self.__search_layer(
+                query, entry, self.ef_construction, layer
+            )
+            neighbors = self.__select_neighbors(candidates, scores, self.m)
+            self.__set_links(row, layer, neighbors)
+            max_links = 2 * self.m if layer == 0 else self.m
+            for neighbor in neighbors.tolist():
+                links = self.__links(neighbor, layer)
+                if len(links) < max_links:
+                    self.__set_links(neighbor, layer, np.append(links, row))
+                    continue
+                # full: keep the most diverse of its links plus the new one
+                links = np.append(links, row)
+                base = self.vectors[neighbor].astype(np.float32)
+                link_scores = self.vectors[links] @ base
+                self.__set_links(
+                    neighbor,
+                    layer,
+                    self.__select_neighbors(links, link_scores, max_links),
+                )
+            entry = candidates
+
+        if level > self.max_level:
+            self.entry_point = row
+            self.max_level = level
+
+    def __search_layer(
+        self, query: np.ndarray, entry: np.ndarray, ef: int, layer: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # best-first search from entry; returns up to ef nodes, best first
+        visited, tag = self.__visit_marks()
+        visited[entry] = tag
+        entry_scores = self.vectors[entry] @ query
+        found = list(zip(entry_scores.tolist(), entry.tolist()))
+        candidates = [(-score, node) for score, node in found]
+        heapq.heapify(candidates)
+        heapq.heapify(found)
+        while len(found) > ef:
+            heapq.heappop(found)
+
+        while candidates:
+            negative_score, node = heapq.heappop(candidates)
+            if -negative_score < found[0][0] and len(found) >= ef:
+                break
+            links = self.__links(node, layer)
+            links = links[visited[links] != tag]
+            if not len(links):
+                continue
+            visited[links] = tag
+            scores = self.vectors[links] @ query
+            if len(found) >= ef:
+                closer = scores > found[0][0]
+                links, scores = links[closer], scores[closer]
+            for neighbor, score in zip(links.tolist(), scores.tolist()):
+                if len(found) < ef:
+                    heapq.heappush(found, (score, neighbor))
+                elif score > found[0][0]:
+                    heapq.heapreplace(found, (score, neighbor))
+                else:
+                    continue
+                heapq.heappush(candidates, (-score, neighbor))
+
+        rows = np.array([n for _, n in found], dtype=np.int64)
+        scores = np.array([s for s, _ in found], dtype=np.float32)
+        order = np.lexsort((rows, -scores))
+        return rows[order], scores[order]
+
+    def __visit_marks(self) -> tuple[np.ndarray, int]:
+        # this thread's marks, grown with the graph, and a fresh tag
+        marks = self.marks
+        if not hasattr(marks, "visited"):
+            marks.visited = np.zeros(0, dtype=np.int64)
+            marks.tag = 0
+        extra = len(self.levels) - len(marks.visited)
+        if extra > 0:
+            marks.visited = np.concatenate(
+                (marks.visited, np.zeros(extra, dtype=np.int64))
+            )
+        marks.tag += 1
+        return marks.visited, marks.tag
+
+    def __select_neighbors(
+        self, candidates: np.ndarray, scores: np.ndarray, count: int
+    ) -> np.ndarray:
+        # the HNSW heuristic: walking candidates best first, keep one only if
+        # it is closer to the base than to every neighbor kept so far, which
+        # spreads the links out instead of bunching them in one cluster
+        order = np.lexsort((candidates, -scores))
+        candidates = candidates[order]
+        if len(candidates) <= count:
+            return candidates
+        scores = scores[order]
+        vectors = self.vectors[candidates].astype(np.float32)
+        similarities = vectors @ vectors.T
+        # best similarity of each candidate to any neighbor kept so far
+        closest = np.full(len(candidates), -np.inf, dtype=np.float32)
+        selected = []
+        i = 0
+        while len(selected) < count:
+            eligible = np.flatnonzero(closest[i:] < scores[i:])
+            if not len(eligible):
+                break
+            i += int(eligible[0])
+            selected.append(i)
+            np.maximum(closest, similarities[i], out=closest)
+            i += 1
+        return candidates[selected]
+
+    def __links(self, node: int, layer: int) -> np.ndarray:
+        if layer == 0:
+            return self.links[node, : self.link_counts[node]]
+        row = self.upper_offsets[node] + layer - 1
+        return self.upper_links[row, : self.upper_counts[row]]
+
+    def __set_links(self, node: int, layer: int, links: np.ndarray) -> None:
+        if layer == 0:
+            self.links[node, : len(links)] = links
+            self.link_counts[node] = len(links)
+        else:
+            row = self.upper_offsets[node] + layer - 1
+            self.upper_links[row, : len(links)] = links
+            self.upper_counts[row] = len(links)
+
+    def __reserve(self, capacity: int) -> None:
+        if capacity <= len(self.levels):
+            return
+        capacity = max(capacity, 2 * len(self.levels))
+        extra = capacity - len(self.levels)
+        self.levels = np.concatenate((self.levels, np.zeros(extra, dtype=np.int8)))
+        self.links = np.concatenate(
+            (self.links, np.full((extra, 2 * self.m), -1, dtype=np.int32))
+        )
+        self.link_counts = np.concatenate(
+            (self.link_counts, np.zeros(extra, dtype=np.int32))
+        )
+        self.upper_offsets = np.concatenate(
+            (self.upper_offsets, np.zeros(extra, dtype=np.int64))
+        )
+
+    def __reserve_upper(self, capacity: int) -> None:
+        if capacity <= len(self.upper_links):
+            return
+        capacity = max(capacity, 2 * len(self.upper_links))
+        extra = capacity - len(self.upper_links)
+        self.upper_links = np.concatenate(
+            (self.upper_links, np.full((extra, self.m), -1, dtype=np.int32))
+        )
+        self.upper_counts = np.concatenate(
+            (self.upper_counts, np.zeros(extra, dtype=np.int32))
+        )
+
+    def save(self, path: str) -> None:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            params=np.array(
+                [self.m, self.ef_construction, self.entry_point, self.max_level]
+            ),
+            levels=self.levels[: self.size],
+            links=self.links[: self.size],
+            link_counts=self.link_counts[: self.size],
+            upper_offsets=self.upper_offsets[: self.size],
+            upper_links=self.upper_links[: self.upper_size],
+            upper_counts=self.upper_counts[: self.upper_size],
+            fingerprint=np.array(self.fingerprint),
+        )
+        save_index(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray) -> "HNSWIndex":
+        with np.load(path) as data:
+            m, ef_construction, entry_point, max_level = data["params"].tolist()
+            fingerprint = str(data["fingerprint"])
+            index = cls(vectors, m, ef_construction, fingerprint=fingerprint)
+            index.levels = data["levels"]
+            index.links = data["links"]
+            index.link_counts = data["link_counts"]
+            index.upper_offsets = data["upper_offsets"]
+            index.upper_links = data["upper_links"]
+            index.upper_counts = data["upper_counts"]
+        index.size = len(index.levels)
+        index.upper_size = len(index.upper_links)
+        index.entry_point = entry_point
+        index.max_level = max_level
+        # later inserts draw levels from a stream of their own
+        index.rng = np.random.default_rng(index.size)
+        return index
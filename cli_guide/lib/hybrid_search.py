@@ -1,6 +1,10 @@
-import os
-from typing import Optional
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
 
+from .index_manager import IndexManager
 from .keyword_search import InvertedIndex
 from .query_enhancement import enhance_query
 from .reranking import rerank
@@ -14,32 +18,120 @@ from .search_utils import (
 )
 from .semantic_search import ChunkedSemanticSearch
 
+# runs the BM25 legs of every HybridSearch in the process; idle threads
+# are reused, so searchers come and go without leaking pools
+_bm25_executor = ThreadPoolExecutor(thread_name_prefix="bm25")
+
+
+def timed(function: Callable[..., Any], *args: Any) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def record_timings(
+    timings: dict | None, bm25_seconds: float, semantic_seconds: float, start: float
+) -> None:
+    if timings is not None:
+        timings["bm25_seconds"] = bm25_seconds
+        timings["semantic_seconds"] = semantic_seconds
+        timings["total_seconds"] = time.perf_counter() - start
+
 
 class HybridSearch:
-    def __init__(self, documents: list[dict]) -> None:
-        self.documents = documents
-        self.semantic_search = ChunkedSemanticSearch()
-        self.semantic_search.load_or_create_chunk_embeddings(documents)
+    """BM25 and chunked semantic search fused by weights or by RRF
+
+    The two legs of a search share no state, and the query encode and the
+    score matrix products release the GIL, so they run concurrently: the
+    BM25 leg in a pool shared by every searcher and the semantic leg in the
+    caller's thread. The a-prefixed coroutines run both legs in asyncio's
+    default executor instead. Searches accept a timings dict, filled with
+    the seconds each leg took and the total, which approaches the slower
+    leg rather than the sum of both.
+
+    The indexes are loaded once by an IndexManager, which swaps in rebuilt
+    ones; both legs of a search read the same snapshot.
+    """
+
+    def __init__(self, documents: list[dict], device: str | None = None) -> None:
+        # builds missing indexes; the model is the registry's, shared with
+        # any other searcher
+        self.indexes = IndexManager(documents, device)
+
+    @property
+    def documents(self) -> list[dict]:
+        return self.indexes.snapshot().documents
+
+    @property
+    def idx(self) -> InvertedIndex:
+        return self.indexes.snapshot().idx
+
+    @property
+    def semantic_search(self) -> ChunkedSemanticSearch:
+        return self.indexes.snapshot().semantic_search
+
+    def _search_legs(
+        self, query: str, limit: int, timings: dict | None = None
+    ) -> tuple[list[dict], list[dict]]:
+        start = time.perf_counter()
+        snapshot = self.indexes.snapshot()
+        bm25 = _bm25_executor.submit(timed, snapshot.idx.bm25_search, query, limit)
+        semantic_results, semantic_seconds = timed(
+            snapshot.semantic_search.search_chunks, query, limit
+        )
+        bm25_results, bm25_seconds = bm25.result()
+        record_timings(timings, bm25_seconds, semantic_seconds, start)
+        return bm25_results, semantic_results
+
+    async def _asearch_legs(
+        self, query: str, limit: int, timings: dict | None = None
+    ) -> tuple[list[dict], list[dict]]:
+        start = time.perf_counter()
+        snapshot = self.indexes.snapshot()
+        (
+            (bm25_results, bm25_seconds),
+            (semantic_results, semantic_seconds),
+        ) = await asyncio.gather(
+            asyncio.to_thread(timed, snapshot.idx.bm25_search, query, limit),
+            asyncio.to_thread(
+                timed, snapshot.semantic_search.search_chunks, query, limit
+            ),
+        )
+        record_timings(timings, bm25_seconds, semantic_seconds, start)
+        return bm25_results, semantic_results
 
-        self.idx = InvertedIndex()
-        if not os.path.exists(self.idx.index_path):
-            self.idx.build()
-            self.idx.save()
+    def weighted_search(
+        self, query: str, alpha: float, limit: int = 5, timings: dict | None = None
+    ) -> list[dict]:
+        bm25_results, semantic_results = self._search_legs(query, limit * 500, timings)
 
-    def _bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-        self.idx.load()
-        return self.idx.bm25_search(query, limit)
+        combined = combine_search_results(bm25_results, semantic_results, alpha)
+        return combined[:limit]
 
-    def weighted_search(self, query: str, alpha: float, limit: int = 5) -> list[dict]:
-        bm25_results = self._bm25_search(query, limit * 500)
-        semantic_results = self.semantic_search.search_chunks(query, limit * 500)
+    async def aweighted_search(
+        self, query: str, alpha: float, limit: int = 5, timings: dict | None = None
+    ) -> list[dict]:
+        bm25_results, semantic_results = await self._asearch_legs(
+            query, limit * 500, timings
+        )
 
         combined = combine_search_results(bm25_results, semantic_results, alpha)
         return combined[:limit]
 
-    def rrf_search(self, query: str, k: int, limit: int = 10) -> list[dict]:
-        bm25_results = self._bm25_search(query, limit * 500)
-        semantic_results = self.semantic_search.search_chunks(query, limit * 500)
+    def rrf_search(
+        self, query: str, k: int, limit: int = 10, timings: dict | None = None
+    ) -> list[dict]:
+        bm25_results, semantic_results = self._search_legs(query, limit * 500, timings)
+
+        fused = reciprocal_rank_fusion(bm25_results, semantic_results, k)
+        return fused[:limit]
+
+    async def arrf_search(
+        self, query: str, k: int, limit: int = 10, timings: dict | None = None
+    ) -> list[dict]:
+        bm25_results, semantic_results = await self._asearch_legs(
+            query, limit * 500, timings
+        )
 
         fused = reciprocal_rank_fusion(bm25_results, semantic_results, k)
         return fused[:limit]
@@ -184,21 +276,26 @@ def reciprocal_rank_fusion(
 
 
 def weighted_search_command(
-    query: str, alpha: float = DEFAULT_ALPHA, limit: int = DEFAULT_SEARCH_LIMIT
+    query: str,
+    alpha: float = DEFAULT_ALPHA,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    searcher: Optional[HybridSearch] = None,
 ) -> dict:
-    movies = load_movies()
-    searcher = HybridSearch(movies)
+    if searcher is None:
+        searcher = HybridSearch(load_movies())
 
     original_query = query
 
     search_limit = limit
-    results = searcher.weighted_search(query, alpha, search_limit)
+    timings: dict = {}
+    results = searcher.weighted_search(query, alpha, search_limit, timings)
 
     return {
         "original_query": original_query,
         "query": query,
         "alpha": alpha,
         "results": results,
+        "timings": timings,
     }
 
 
@@ -208,9 +305,10 @@ def rrf_search_command(
     enhance: Optional[str] = None,
     rerank_method: Optional[str] = None,
     limit: int = DEFAULT_SEARCH_LIMIT,
+    searcher: Optional[HybridSearch] = None,
 ) -> dict:
-    movies = load_movies()
-    searcher = HybridSearch(movies)
+    if searcher is None:
+        searcher = HybridSearch(load_movies())
 
     original_query = query
     enhanced_query = None
@@ -219,7 +317,8 @@ def rrf_search_command(
         query = enhanced_query
 
     search_limit = limit * SEARCH_MULTIPLIER if rerank_method else limit
-    results = searcher.rrf_search(query, k, search_limit)
+    timings: dict = {}
+    results = searcher.rrf_search(query, k, search_limit, timings)
 
     reranked = False
     if rerank_method:
@@ -235,4 +334,5 @@ def rrf_search_command(
         "rerank_method": rerank_method,
         "reranked": reranked,
         "results": results,
+        "timings": timings,
     }
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import time
+
+from .search_utils import PROJECT_ROOT
+
+CLI_DIR = os.path.join(PROJECT_ROOT, "cli_guide")
+
+# subcommands whose cold start is measured by default; none needs a model,
+# so their time is import overhead plus a little work
+IMPORTTIME_COMMANDS = [
+    ["hybrid_search_cli.py", "normalize", "0.5", "2.0", "3.5"],
+    ["semantic_search_cli.py", "chunk", "A short text to chunk."],
+    ["semantic_search_cli.py", "semantic_chunk", "One sentence. Another one."],
+    ["keyword_search_cli.py", "bm25search", "bear"],
+    ["semantic_search_cli.py", "search_chunked", "bear", "--server"],
+]
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """Parse the report that `python -X importtime` writes to stderr
+
+    Returns:
+        (module, nesting level, self us, cumulative us) per import, in the
+        order they finished
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        # "import time: <self> | <cumulative> | <2 spaces per level><name>"
+        prefix, cumulative_us, name = line.split("|", 2)
+        self_us = prefix.removeprefix("import time:")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), level, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def importtime_command(
+    commands: list[list[str]] = IMPORTTIME_COMMANDS, top: int = 5
+) -> list[dict]:
+    """Run CLI subcommands under -X importtime and summarize their imports
+
+    Args:
+        commands: Script (relative to cli_guide/) and arguments per run
+        top: Heaviest top-level imports to list per run
+
+    Returns:
+        Per command: total import and wall time in ms, exit status, and
+        the heaviest top-level imports as (module, cumulative ms)
+    """
+    reports = []
+    for command in commands:
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", *command],
+            cwd=CLI_DIR,
+            capture_output=True,
+            text=True,
+            # a failing command is reported with its exit status
+            check=False,
+        )
+        wall = time.perf_counter() - start
+        imports = parse_importtime(completed.stderr)
+        top_level = sorted(
+            (entry for entry in imports if entry[1] == 0),
+            key=lambda entry: entry[3],
+            reverse=True,
+        )
+        reports.append(
+            {
+                "command": " ".join(command),
+                "returncode": completed.returncode,
+                "wall_ms": wall * 1000,
+                "import_ms": sum(entry[2] for entry in imports) / 1000,
+                "modules": len(imports),
+                "heaviest": [
+                    (name, cumulative / 1000)
+                    for name, _, _, cumulative in top_level[:top]
+                ],
+            }
+        )
+    return reports
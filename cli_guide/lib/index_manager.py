@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+
+from .keyword_search import InvertedIndex
+from .search_utils import (
+    CHUNK_EMBEDDINGS_MANIFEST_PATH,
+    CHUNK_EMBEDDINGS_PATH,
+    INDEX_CHECK_INTERVAL,
+    load_movies,
+)
+from .semantic_search import ChunkedSemanticSearch
+
+
+def file_signature(path: str) -> tuple[int, int, int] | None:
+    # rebuilds replace files by rename, so the inode changes along with
+    # the mtime; None while a file is missing
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class IndexSnapshot:
+    """A BM25 index, chunk embeddings and their documents loaded together
+
+    Never modified once handed out: a query that takes a snapshot reads
+    the same indexes to its end, whatever is swapped in meanwhile. Both are
+    memory-mapped, and files a rebuild replaces or removes stay readable
+    through an older snapshot's mappings.
+    """
+
+    def __init__(
+        self,
+        documents: list[dict],
+        idx: InvertedIndex,
+        semantic_search: ChunkedSemanticSearch,
+        signature: tuple,
+    ) -> None:
+        self.documents = documents
+        self.idx = idx
+        self.semantic_search = semantic_search
+        self.signature = signature
+        self.loaded_at = time.time()
+
+    @property
+    def generation(self) -> int:
+        return self.idx.generation
+
+
+class IndexManager:
+    """Owns the loaded search indexes and swaps in rebuilt ones
+
+    The BM25 index and the chunk embeddings of documents are loaded once,
+    building whichever is missing. snapshot() returns the current
+    IndexSnapshot; at most every check_interval seconds it first stats the
+    cache files (the BM25 manifest, which every save rewrites with a new
+    generation, and the chunk embeddings and their manifest). When they
+    changed, a new snapshot is loaded and replaces the current one in a
+    single assignment. Reloads read the documents again with load_movies,
+    which the caches are built from, so a refreshed movie list comes in
+    with its rebuilt indexes. A rebuild caught half-written, or one whose
+    embeddings do not match those documents yet, does not load; the
+    current snapshot stays and the files are tried again once they change.
+    Between checks nothing touches the disk.
+    """
+
+    def __init__(
+        self,
+        documents: list[dict],
+        device: str | None = None,
+        check_interval: float = INDEX_CHECK_INTERVAL,
+    ) -> None:
+        self.device = device
+        self.check_interval = check_interval
+        self.bm25_manifest_path = InvertedIndex().manifest_path
+        self.reloads = 0
+        self.lock = threading.Lock()
+        self.current = self.__load(documents)
+        self.checked_signature = self.current.signature
+        self.last_check = time.monotonic()
+
+    def snapshot(self) -> IndexSnapshot:
+        if time.monotonic() - self.last_check >= self.check_interval:
+            self.check()
+        return self.current
+
+    def check(self) -> bool:
+        """Load the indexes again if their files changed
+
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        # one thread checks and loads; the others keep the current snapshot
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self.last_check = time.monotonic()
+            signature = self.signature()
+            if signature == self.checked_signature:
+                return False
+            self.checked_signature = signature
+            snapshot = self.__reload()
+            if snapshot is None:
+                return False
+            self.current = snapshot
+            self.reloads += 1
+            return True
+        finally:
+            self.lock.release()
+
+    def signature(self) -> tuple:
+        return tuple(
+            file_signature(path)
+            for path in (
+                self.bm25_manifest_path,
+                CHUNK_EMBEDDINGS_MANIFEST_PATH,
+                CHUNK_EMBEDDINGS_PATH,
+            )
+        )
+
+    def __load(self, documents: list[dict]) -> IndexSnapshot:
+        idx = InvertedIndex()
+        if not os.path.exists(idx.manifest_path):
+            idx.build()
+            idx.save()
+        else:
+            idx.load()
+        semantic_search = ChunkedSemanticSearch(device=self.device)
+        semantic_search.load_or_create_chunk_embeddings(documents)
+        # anything just built belongs to this snapshot
+        return IndexSnapshot(documents, idx, semantic_search, self.signature())
+
+    def __reload(self) -> IndexSnapshot | None:
+        # stat first: a change landing during the load is seen next check
+        signature = self.signature()
+        idx = InvertedIndex()
+        semantic_search = ChunkedSemanticSearch(device=self.device)
+        # a rebuild caught mid-write can leave a manifest missing, truncated
+        # or listing files not there yet; JSONDecodeError is a ValueError
+        try:
+            documents = load_movies()
+            idx.load()
+            if semantic_search.load_chunk_embeddings(documents) is None:
+                return None
+        except (OSError, ValueError):
+            return None
+        return IndexSnapshot(documents, idx, semantic_search, signature)
@@ -0,0 +1,195 @@
+import io
+import math
+
+import numpy as np
+
+from .index_file import save_index
+from .search_utils import (
+    DEFAULT_IVF_NPROBE,
+    IVF_LISTS_PER_SQRT,
+    KMEANS_ITERATIONS,
+    KMEANS_SAMPLE_PER_CLUSTER,
+)
+from .vectors import normalize_rows, score_blocks, top_k_indices
+
+
+def default_list_count(vector_count: int) -> int:
+    n_lists = round(IVF_LISTS_PER_SQRT * math.sqrt(vector_count))
+    return max(1, min(vector_count, n_lists))
+
+
+def nearest_centroids(
+    vectors: np.ndarray, centroids: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Best centroid of every unit vector and its cosine similarity"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    similarities = np.empty(len(vectors), dtype=np.float32)
+    start = 0
+    for scores in score_blocks(vectors, centroids):
+        end = start + len(scores)
+        best = scores.argmax(axis=1)
+        assignments[start:end] = best
+        similarities[start:end] = scores[np.arange(len(scores)), best]
+        start = end
+    return assignments, similarities
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = KMEANS_ITERATIONS,
+    seed: int = 0,
+) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity
+
+    Centroids start at distinct random vectors and are the normalized mean
+    of their members after each pass. A cluster that ends up empty is
+    reseeded with the vector furthest from its own centroid. Stops early
+    once no assignment changes.
+
+    Args:
+        vectors: Unit-length float32 rows
+        n_clusters: Number of centroids, at most len(vectors)
+        iterations: Maximum assignment/update passes
+        seed: Seed for the initial centroids
+
+    Returns:
+        (n_clusters, dim) unit-length centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    assignments = None
+    for _ in range(iterations):
+        new_assignments, similarities = nearest_centroids(vectors, centroids)
+        if assignments is not None and np.array_equal(assignments, new_assignments):
+            break
+        assignments = new_assignments
+
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            furthest = np.argsort(similarities, kind="stable")[: len(empty)]
+            centroids[empty] = vectors[furthest]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted file index over unit vectors
+
+    k-means centroids split the vectors into lists. A query ranks the
+    centroids and scores only the vectors in its nprobe best lists, so the
+    work per query is roughly nprobe / n_lists of an exact search. With
+    nprobe equal to the number of lists the results are exact.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        list_indptr: np.ndarray,
+        list_rows: np.ndarray,
+        fingerprint: str = "",
+        nprobe: int = DEFAULT_IVF_NPROBE,
+    ) -> None:
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_indptr = list_indptr
+        self.list_rows = list_rows
+        self.fingerprint = fingerprint
+        self.nprobe = nprobe
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: int | None = None,
+        fingerprint: str = "",
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Train centroids on a sample of the vectors and file every vector
+
+        Args:
+            vectors: Unit-length float32 rows to index
+            n_lists: Number of lists (default: IVF_LISTS_PER_SQRT * sqrt(n))
+            fingerprint: Identifies the vectors, checked when loading
+            seed: Seed for sampling and centroid initialization
+
+        Returns:
+            The index, searching `vectors`
+        """
+        if len(vectors) == 0:
+            raise ValueError("cannot build an IVF index without vectors")
+        if n_lists is None:
+            n_lists = default_list_count(len(vectors))
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        sample_size = n_lists * KMEANS_SAMPLE_PER_CLUSTER
+        if len(vectors) > sample_size:
+            rows = rng.choice(len(vectors), sample_size, replace=False)
+            sample = vectors[np.sort(rows)]
+        # k-means sums in float32 even when the vectors are stored as float16
+        sample = np.asarray(sample, dtype=np.float32)
+        centroids = spherical_kmeans(sample, n_lists, seed=seed)
+
+        assignments, _ = nearest_centroids(vectors, centroids)
+        list_rows = np.argsort(assignments, kind="stable")
+        list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_indptr[1:])
+        return cls(vectors, centroids, list_indptr, list_rows, fingerprint)
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top k vectors of the probed lists
+
+        Args:
+            query: Unit-length query vector
+            k: Number of rows to return
+
+        Returns:
+            (rows, scores), best first, ties in row order
+        """
+        probed = top_k_indices(self.centroids @ query, self.nprobe)
+        starts = self.list_indptr[probed]
+        ends = self.list_indptr[probed + 1]
+        rows = np.sort(
+            np.concatenate(
+                [self.list_rows[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
+                or [np.empty(0, dtype=np.int64)]
+            )
+        )
+        scores = self.vectors[rows] @ query
+        top = top_k_indices(scores, k)
+        return rows[top], scores[top]
+
+    def save(self, path: str) -> None:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            centroids=self.centroids,
+            list_indptr=self.list_indptr,
+            list_rows=self.list_rows,
+            fingerprint=np.array(self.fingerprint),
+        )
+        save_index(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                vectors,
+                data["centroids"],
+                data["list_indptr"],
+                data["list_rows"],
+                str(data["fingerprint"]),
+            )
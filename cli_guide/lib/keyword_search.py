@@ -1,79 +1,206 @@
 import math
 import os
-import pickle
 import string
-from collections import Counter, defaultdict
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
-from nltk.stem import PorterStemmer
+import numpy as np
 
+from .analyzer import PUNCTUATION_TABLE, Analyzer, get_analyzer
+from .bm25 import bm25_idf, bm25_length_norm, bm25_tf_component
+from .index_file import DocumentMap, IndexFile, save_index
 from .search_utils import (
     BM25_B,
     BM25_K1,
     CACHE_DIR,
     DEFAULT_SEARCH_LIMIT,
+    PRUNING_SLACK,
     format_search_result,
     load_movies,
     load_stopwords,
 )
+from .segments import (
+    MANIFEST_NAME,
+    Segment,
+    SegmentedIndex,
+    encode_segment,
+    merge_segments,
+    read_manifest,
+    segment_file_name,
+    select_merge,
+    write_manifest,
+)
 
 
 class InvertedIndex:
     def __init__(self) -> None:
-        self.index = defaultdict(set)
-        self.docmap: dict[int, dict] = {}
-        self.index_path = os.path.join(CACHE_DIR, "index.pkl")
-        self.docmap_path = os.path.join(CACHE_DIR, "docmap.pkl")
-        self.tf_path = os.path.join(CACHE_DIR, "term_frequencies.pkl")
-        self.doc_lengths_path = os.path.join(CACHE_DIR, "doc_lengths.pkl")
-        self.term_frequencies = defaultdict(Counter)
-        self.doc_lengths = {}
-
-    def build(self) -> None:
+        self.index_dir = os.path.join(CACHE_DIR, "index")
+        self.manifest_path = os.path.join(self.index_dir, MANIFEST_NAME)
+        self.generation = 0
+        self.next_segment = 0
+        self.__open([])
+
+    def build(self, workers: int = 1) -> None:
+        """Tokenize every movie and encode the index as a single segment
+
+        Args:
+            workers: Processes to tokenize with; each counts terms for a
+                contiguous shard of movies and the partial matrices are
+                merged in order, so the index is identical for any value
+        """
         movies = load_movies()
-        for m in movies:
-            doc_id = m["id"]
-            doc_description = f"{m['title']} {m['description']}"
-            self.docmap[doc_id] = m
-            self.__add_document(doc_id, doc_description)
+        texts = [f"{m['title']} {m['description']}" for m in movies]
+        if workers > 1 and len(texts) > 1:
+            shard_size = -(-len(texts) // workers)
+            shards = [
+                texts[i : i + shard_size] for i in range(0, len(texts), shard_size)
+            ]
+            with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+                matrix = merge_doc_term_matrices(
+                    list(pool.map(doc_term_matrix, shards))
+                )
+        else:
+            matrix = doc_term_matrix(texts)
+        self.__resume_numbering()
+        self.__open([self.__new_segment(encode_index(movies, matrix))])
+
+    def __resume_numbering(self) -> None:
+        # never reuse the name of a segment a saved manifest may still list
+        try:
+            manifest = read_manifest(self.index_dir)
+        except (FileNotFoundError, ValueError):
+            return
+        self.generation = max(self.generation, manifest["generation"])
+        self.next_segment = max(self.next_segment, manifest["next_segment"])
+
+    def add_documents(self, movies: list[dict]) -> None:
+        """Index movies as a new segment, replacing any with the same id"""
+        self.delete_documents([m["id"] for m in movies])
+        if not movies:
+            return
+        texts = [f"{m['title']} {m['description']}" for m in movies]
+        segment = self.__new_segment(encode_index(movies, doc_term_matrix(texts)))
+        self.__commit(self.segments + [segment])
+
+    def delete_documents(self, doc_ids: list[int]) -> int:
+        """Tombstone documents; returns how many were in the index"""
+        live_rows = self.docmap.rows()
+        rows = [live_rows[doc_id] for doc_id in doc_ids if doc_id in live_rows]
+        if not rows:
+            return 0
+        rows = np.array(rows, dtype=np.int64)
+        offsets = self.index_file.row_offsets
+        segments = []
+        for i, segment in enumerate(self.segments):
+            in_segment = rows[(rows >= offsets[i]) & (rows < offsets[i + 1])]
+            if len(in_segment):
+                segment = segment.delete_rows(in_segment - offsets[i])
+            segments.append(segment)
+        self.__commit(segments)
+        return len(rows)
+
+    def merge(self) -> None:
+        """Merge every segment into one, dropping deleted documents"""
+        if len(self.segments) > 1 or any(s.deleted.any() for s in self.segments):
+            self.__open([self.__new_segment(merge_segments(self.segments))])
+
+    def __commit(self, segments: list[Segment]) -> None:
+        # let the merge policy fold small or mostly deleted segments after
+        # every update, so callers never have to schedule merges themselves
+        while (merge_range := select_merge(segments)) is not None:
+            start, end = merge_range
+            merged = self.__new_segment(merge_segments(segments[start:end]))
+            kept = [merged] if merged.index_file.doc_count else []
+            segments = segments[:start] + kept + segments[end:]
+        self.__open(segments)
+
+    def __new_segment(self, data: bytes) -> Segment:
+        self.next_segment += 1
+        return Segment(segment_file_name(self.next_segment), IndexFile(data))
+
+    def __open(self, segments: list[Segment]) -> None:
+        # every array below comes from the segment view; rows are dense ids
+        # across segments, deleted rows keep their number but never match
+        self.segments = segments
+        self.index_file = SegmentedIndex(segments)
+        self.docmap = DocumentMap(self.index_file)
+        self.doc_ids = self.index_file.doc_ids
+        self.doc_lengths = self.index_file.doc_lengths
+        self.avg_doc_length = self.index_file.avg_doc_length
+        # BM25 statistics over the live documents of all segments
+        self.idf = self.index_file.idf
+        self.length_norm = self.index_file.length_norm
+        # upper bound of any single document's BM25 contribution per term
+        self.max_scores = self.index_file.max_scores
 
     def save(self) -> None:
-        os.makedirs(CACHE_DIR, exist_ok=True)
-        with open(self.index_path, "wb") as f:
-            pickle.dump(self.index, f)
-        with open(self.docmap_path, "wb") as f:
-            pickle.dump(self.docmap, f)
-        with open(self.tf_path, "wb") as f:
-            pickle.dump(self.term_frequencies, f)
-        with open(self.doc_lengths_path, "wb") as f:
-            pickle.dump(self.doc_lengths, f)
+        for segment in self.segments:
+            if not segment.saved:
+                path = os.path.join(self.index_dir, segment.name)
+                save_index(path, bytes(segment.index_file.buffer))
+                segment.saved = True
+        self.generation += 1
+        write_manifest(
+            self.index_dir,
+            {
+                "generation": self.generation,
+                "next_segment": self.next_segment,
+                "segments": [
+                    {
+                        "name": segment.name,
+                        "deleted": np.flatnonzero(segment.deleted).tolist(),
+                    }
+                    for segment in self.segments
+                ],
+            },
+        )
 
     def load(self) -> None:
-        with open(self.index_path, "rb") as f:
-            self.index = pickle.load(f)
-        with open(self.docmap_path, "rb") as f:
-            self.docmap = pickle.load(f)
-        with open(self.tf_path, "rb") as f:
-            self.term_frequencies = pickle.load(f)
-        with open(self.doc_lengths_path, "rb") as f:
-            self.doc_lengths = pickle.load(f)
+        manifest = read_manifest(self.index_dir)
+        self.generation = manifest["generation"]
+        self.next_segment = manifest["next_segment"]
+        segments = []
+        for entry in manifest["segments"]:
+            index_file = IndexFile.open(os.path.join(self.index_dir, entry["name"]))
+            deleted = np.zeros(index_file.doc_count, dtype=bool)
+            deleted[entry["deleted"]] = True
+            segments.append(Segment(entry["name"], index_file, deleted, saved=True))
+        self.__open(segments)
+
+    def __term_ids(self, tokens: list[str]) -> list[int]:
+        term_ids = [self.index_file.term_id(token) for token in tokens]
+        return [term_id for term_id in term_ids if term_id is not None]
 
     def get_documents(self, term: str) -> list[int]:
-        doc_ids = self.index.get(term, set())
-        return sorted(list(doc_ids))
-
-    def __add_document(self, doc_id: int, text: str) -> None:
-        tokens = tokenize_text(text)
-        for token in set(tokens):
-            self.index[token].add(doc_id)
-        self.term_frequencies[doc_id].update(tokens)
-        self.doc_lengths[doc_id] = len(tokens)
+        term_id = self.index_file.term_id(term)
+        if term_id is None:
+            return []
+        rows, _ = self.index_file.postings(term_id)
+        return sorted(self.doc_ids[rows].tolist())
 
     def get_tf(self, doc_id: int, term: str) -> int:
         tokens = tokenize_text(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
         token = tokens[0]
-        return self.term_frequencies[doc_id][token]
+        row = self.__row(doc_id)
+        if row is None:
+            return 0
+        return self.__row_tf(row, token)
+
+    def __row(self, doc_id: int) -> int | None:
+        return self.docmap.rows().get(doc_id)
+
+    def __row_tf(self, row: int, token: str) -> int:
+        term_id = self.index_file.term_id(token)
+        if term_id is None:
+            return 0
+        rows, tfs = self.index_file.postings(term_id)
+        pos = np.searchsorted(rows, row)
+        if pos < len(rows) and rows[pos] == row:
+            return int(tfs[pos])
+        return 0
 
     def get_idf(self, term: str) -> float:
         tokens = tokenize_text(term)
@@ -81,26 +208,34 @@ class InvertedIndex:
             raise ValueError("term must be a single token")
         token = tokens[0]
         doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
+        term_doc_count = len(self.get_documents(token))
         return math.log((doc_count + 1) / (term_doc_count + 1))
 
     def get_bm25_idf(self, term: str) -> float:
         tokens = tokenize_text(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
-        token = tokens[0]
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
-        return math.log((doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
+        return self.__token_bm25_idf(tokens[0])
+
+    def __token_bm25_idf(self, token: str) -> float:
+        term_id = self.index_file.term_id(token)
+        if term_id is not None:
+            return float(self.idf[term_id])
+        return bm25_idf(len(self.docmap), 0)
 
     def get_bm25_tf(
         self, doc_id: int, term: str, k1: float = BM25_K1, b: float = BM25_B
     ) -> float:
         tf = self.get_tf(doc_id, term)
-        doc_length = self.doc_lengths.get(doc_id, 0)
-        avg_doc_length = self.__get_avg_doc_length()
-        if avg_doc_length > 0:
-            length_norm = 1 - b + b * (doc_length / avg_doc_length)
+        row = self.__row(doc_id)
+        doc_length = int(self.doc_lengths[row]) if row is not None else 0
+        return self.__bm25_tf_component(tf, doc_length, k1, b)
+
+    def __bm25_tf_component(
+        self, tf: int, doc_length: int, k1: float, b: float
+    ) -> float:
+        if self.avg_doc_length > 0:
+            length_norm = 1 - b + b * (doc_length / self.avg_doc_length)
         else:
             length_norm = 1
         return (tf * (k1 + 1)) / (tf + k1 * length_norm)
@@ -110,34 +245,184 @@ class InvertedIndex:
         idf = self.get_idf(term)
         return tf * idf
 
-    def __get_avg_doc_length(self) -> float:
-        if not self.doc_lengths or len(self.doc_lengths) == 0:
-            return 0.0
-        total_length = 0
-        for length in self.doc_lengths.values():
-            total_length += length
-        return total_length / len(self.doc_lengths)
+    def __length_norm(self, b: float) -> np.ndarray:
+        if b == BM25_B:
+            return self.length_norm
+        return bm25_length_norm(self.doc_lengths, self.avg_doc_length, b)
 
     def bm25(self, doc_id: int, term: str) -> float:
         tf_component = self.get_bm25_tf(doc_id, term)
         idf_component = self.get_bm25_idf(term)
         return tf_component * idf_component
 
-    def bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-        query_tokens = tokenize_text(query)
-
-        scores = {}
-        for doc_id in self.docmap:
+    def bm25_scores(
+        self, query_tokens: list[str], k1: float = BM25_K1, b: float = BM25_B
+    ) -> np.ndarray:
+        """Score every document for already tokenized query terms
+
+        Gathers the postings of all query terms and accumulates them with a
+        single bincount; repeated query tokens are counted once per occurrence.
+
+        Args:
+            query_tokens: Output of tokenize_text
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+
+        Returns:
+            Array of BM25 scores indexed by document row
+        """
+        term_ids = self.__term_ids(query_tokens)
+        length_norm = self.__length_norm(b)
+        if not term_ids:
+            return np.zeros(len(self.doc_ids))
+
+        postings = [self.index_file.postings(term_id) for term_id in term_ids]
+        rows = np.concatenate([term_rows for term_rows, _ in postings])
+        tf = np.concatenate([term_tfs for _, term_tfs in postings])
+        idf = np.repeat(
+            self.idf[term_ids], [len(term_rows) for term_rows, _ in postings]
+        )
+
+        tf_component = bm25_tf_component(tf, length_norm[rows], k1)
+        return np.bincount(
+            rows, weights=tf_component * idf, minlength=len(self.doc_ids)
+        )
+
+    def bm25_top_k(
+        self,
+        query_tokens: list[str],
+        k: int,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k BM25 documents with MaxScore dynamic pruning
+
+        Terms are visited in decreasing order of their score upper bound.
+        Once the bounds of the remaining terms cannot lift an unseen document
+        above the current k-th best partial score, the remaining posting
+        lists are only probed for existing candidates, and candidates that
+        can no longer reach the top k are dropped. Survivors are rescored in
+        query order so scores match bm25_scores exactly.
+
+        Args:
+            query_tokens: Output of tokenize_text
+            k: Number of documents to return
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+
+        Returns:
+            (rows, scores) of documents with a positive score, best first;
+            equal scores keep row order
+        """
+        term_ids = self.__term_ids(query_tokens)
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        length_norm = self.__length_norm(b)
+
+        unique_ids, counts = np.unique(term_ids, return_counts=True)
+        if k1 == BM25_K1 and b == BM25_B:
+            bounds = self.max_scores[unique_ids] * counts
+        else:
+            bounds = self.__query_max_scores(unique_ids, k1, length_norm) * counts
+        order = np.argsort(-bounds, kind="stable")
+        unique_ids, counts, bounds = unique_ids[order], counts[order], bounds[order]
+        # remaining[i]: best score a document can still gain from terms i..end
+        remaining = np.concatenate((np.cumsum(bounds[::-1])[::-1], [0.0]))
+
+        cand_rows = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+        threshold = 0.0
+        for i, term_id in enumerate(unique_ids.tolist()):
+            rows, tfs = self.index_file.postings(term_id)
+            if remaining[i] * (1 + PRUNING_SLACK) >= threshold:
+                # unseen documents can still make the top k: merge the list
+                contrib = bm25_tf_component(tfs, length_norm[rows], k1)
+                contrib *= self.idf[term_id] * counts[i]
+                merged_rows = np.concatenate((cand_rows, rows))
+                merged_scores = np.concatenate((cand_scores, contrib))
+                cand_rows, inverse = np.unique(merged_rows, return_inverse=True)
+                cand_scores = np.bincount(inverse, weights=merged_scores)
+            else:
+                # only existing candidates can; probe the list for them
+                pos = np.searchsorted(rows, cand_rows)
+                pos[pos == len(rows)] = 0
+                hits = np.flatnonzero(rows[pos] == cand_rows)
+                tf = tfs[pos[hits]]
+                contrib = bm25_tf_component(tf, length_norm[cand_rows[hits]], k1)
+                cand_scores[hits] += contrib * self.idf[term_id] * counts[i]
+
+            if len(cand_scores) >= k:
+                threshold = np.partition(cand_scores, len(cand_scores) - k)[-k]
+                alive = (cand_scores + remaining[i + 1]) * (
+                    1 + PRUNING_SLACK
+                ) >= threshold
+                cand_rows, cand_scores = cand_rows[alive], cand_scores[alive]
+
+        scores = self.__score_rows(term_ids, cand_rows, k1, length_norm)
+        ranked = np.lexsort((cand_rows, -scores))[:k]
+        return cand_rows[ranked], scores[ranked]
+
+    def __query_max_scores(
+        self, term_ids: np.ndarray, k1: float, length_norm: np.ndarray
+    ) -> np.ndarray:
+        bounds = np.empty(len(term_ids))
+        for i, term_id in enumerate(term_ids.tolist()):
+            rows, tfs = self.index_file.postings(term_id)
+            bounds[i] = np.max(bm25_tf_component(tfs, length_norm[rows], k1))
+        return bounds * self.idf[term_ids]
+
+    def __score_rows(
+        self,
+        term_ids: list[int],
+        rows: np.ndarray,
+        k1: float,
+        length_norm: np.ndarray,
+    ) -> np.ndarray:
+        # exact scores for sorted rows, accumulated in query order
+        scores = np.zeros(len(rows))
+        for term_id in term_ids:
+            term_rows, term_tfs = self.index_file.postings(term_id)
+            pos = np.searchsorted(term_rows, rows)
+            pos[pos == len(term_rows)] = 0
+            hits = np.flatnonzero(term_rows[pos] == rows)
+            tf = term_tfs[pos[hits]]
+            tf_component = bm25_tf_component(tf, length_norm[rows[hits]], k1)
+            scores[hits] += tf_component * self.idf[term_id]
+        return scores
+
+    def bm25_reference_scores(
+        self, query_tokens: list[str], k1: float = BM25_K1, b: float = BM25_B
+    ) -> np.ndarray:
+        # scalar, one (term, doc) pair at a time; used to check bm25_scores
+        scores = np.zeros(len(self.doc_ids))
+        for row in range(len(self.doc_ids)):
             score = 0.0
             for token in query_tokens:
-                score += self.bm25(doc_id, token)
-            scores[doc_id] = score
-
-        sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+                tf = self.__row_tf(row, token)
+                doc_length = int(self.doc_lengths[row])
+                tf_component = self.__bm25_tf_component(tf, doc_length, k1, b)
+                score += tf_component * self.__token_bm25_idf(token)
+            scores[row] = score
+        return scores
+
+    def bm25_search(
+        self,
+        query: str,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ) -> list[dict]:
+        top_rows, top_scores = self.bm25_top_k(tokenize_text(query), limit, k1, b)
+        # documents without a match fill the remaining slots in docmap order
+        padding = np.setdiff1d(
+            self.index_file.live_rows()[: limit + len(top_rows)], top_rows
+        )[: max(limit - len(top_rows), 0)]
+        sorted_rows = np.concatenate((top_rows, padding)).astype(np.int64)
+        scores = np.concatenate((top_scores, np.zeros(len(padding))))
 
         results = []
-        for doc_id, score in sorted_docs[:limit]:
-            doc = self.docmap[doc_id]
+        for row, score in zip(sorted_rows.tolist(), scores.tolist()):
+            doc = self.index_file.document(row)
             formatted_result = format_search_result(
                 doc_id=doc["id"],
                 title=doc["title"],
@@ -149,12 +434,134 @@ class InvertedIndex:
         return results
 
 
-def build_command() -> None:
+DocTermMatrix = tuple[list[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def doc_term_matrix(texts: list[str]) -> DocTermMatrix:
+    """Count the terms of each text into a CSR doc-term matrix
+
+    Args:
+        texts: Documents, one row each
+
+    Returns:
+        (terms, indptr, term_ids, tfs, doc_lengths): sorted vocabulary of
+        these texts; row i holds term_ids[indptr[i]:indptr[i + 1]], ascending,
+        with counts in tfs
+    """
+    term_counts = [Counter(tokens) for tokens in get_analyzer().analyze_many(texts)]
+    terms = sorted(set().union(*term_counts))
+    vocab = {term: i for i, term in enumerate(terms)}
+
+    indptr = [0]
+    term_ids = []
+    tfs = []
+    for counts in term_counts:
+        for term_id, tf in sorted((vocab[t], n) for t, n in counts.items()):
+            term_ids.append(term_id)
+            tfs.append(tf)
+        indptr.append(len(term_ids))
+    doc_lengths = [sum(counts.values()) for counts in term_counts]
+    return (
+        terms,
+        np.array(indptr, dtype=np.int64),
+        np.array(term_ids, dtype=np.int64),
+        np.array(tfs, dtype=np.int64),
+        np.array(doc_lengths, dtype=np.int64),
+    )
+
+
+def merge_doc_term_matrices(parts: list[DocTermMatrix]) -> DocTermMatrix:
+    """Stack partial matrices of consecutive shards into one
+
+    Every part is remapped onto the merged sorted vocabulary. The mapping is
+    monotonic, so term ids stay ascending within each row and the result
+    equals doc_term_matrix over all texts at once.
+    """
+    terms = sorted(set().union(*(part_terms for part_terms, *_ in parts)))
+    vocab = {term: i for i, term in enumerate(terms)}
+    indptrs, term_ids, tfs, doc_lengths = [np.zeros(1, dtype=np.int64)], [], [], []
+    offset = 0
+    for part_terms, part_indptr, part_term_ids, part_tfs, part_lengths in parts:
+        remap = np.array([vocab[term] for term in part_terms], dtype=np.int64)
+        indptrs.append(part_indptr[1:] + offset)
+        offset += part_indptr[-1]
+        term_ids.append(remap[part_term_ids])
+        tfs.append(part_tfs)
+        doc_lengths.append(part_lengths)
+    return (
+        terms,
+        np.concatenate(indptrs),
+        np.concatenate(term_ids or [np.empty(0, dtype=np.int64)]),
+        np.concatenate(tfs or [np.empty(0, dtype=np.int64)]),
+        np.concatenate(doc_lengths or [np.empty(0, dtype=np.int64)]),
+    )
+
+
+def encode_index(movies: list[dict], matrix: DocTermMatrix) -> bytes:
+    terms, indptr, term_ids, tfs, doc_lengths = matrix
+
+    # transpose to term-major postings; stable sort keeps rows ascending
+    rows = np.repeat(np.arange(len(doc_lengths)), np.diff(indptr))
+    order = np.argsort(term_ids, kind="stable")
+    doc_freqs = np.bincount(term_ids, minlength=len(terms))
+    postings_indptr = np.concatenate(([0], np.cumsum(doc_freqs))).astype(np.int64)
+    return encode_segment(
+        movies, doc_lengths, terms, postings_indptr, rows[order], tfs[order]
+    )
+
+
+def build_command(workers: int = 1) -> None:
     idx = InvertedIndex()
-    idx.build()
+    idx.build(workers)
     idx.save()
 
 
+def update_command() -> dict:
+    """Bring the index in line with movies.json without a full rebuild
+
+    New and changed movies are indexed as a new segment and removed ones are
+    tombstoned; the merge policy then folds segments as needed.
+    """
+    idx = InvertedIndex()
+    if not os.path.exists(idx.manifest_path):
+        idx.build()
+        idx.save()
+        stats = _segment_stats(idx)
+        return {"added": stats["documents"], "updated": 0, "deleted": 0, **stats}
+    idx.load()
+    movies = load_movies()
+    indexed = dict(idx.docmap.items())
+    changed = [m for m in movies if indexed.get(m["id"]) != m]
+    removed = indexed.keys() - {m["id"] for m in movies}
+    updated = sum(1 for m in changed if m["id"] in indexed)
+    idx.delete_documents(sorted(removed))
+    idx.add_documents(changed)
+    if changed or removed:
+        idx.save()
+    return {
+        "added": len(changed) - updated,
+        "updated": updated,
+        "deleted": len(removed),
+        **_segment_stats(idx),
+    }
+
+
+def merge_command() -> dict:
+    idx = InvertedIndex()
+    idx.load()
+    idx.merge()
+    idx.save()
+    return _segment_stats(idx)
+
+
+def _segment_stats(idx: InvertedIndex) -> dict:
+    return {
+        "documents": len(idx.docmap),
+        "segments": len(idx.segments),
+        "generation": idx.generation,
+    }
+
+
 def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
     idx = InvertedIndex()
     idx.load()
@@ -175,28 +582,21 @@ def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
 
 
 def preprocess_text(text: str) -> str:
-    text = text.lower()
-    text = text.translate(str.maketrans("", "", string.punctuation))
-    return text
+    return text.lower().translate(PUNCTUATION_TABLE)
 
 
 def tokenize_text(text: str) -> list[str]:
-    text = preprocess_text(text)
-    tokens = text.split()
-    valid_tokens = []
-    for token in tokens:
-        if token:
-            valid_tokens.append(token)
+    return get_analyzer().analyze(text)
+
+
+def _uncached_tokenize_text(text: str) -> list[str]:
+    # tokenization as it was before Analyzer, kept as the benchmark baseline
+    from nltk.stem import PorterStemmer
+
+    text = text.lower().translate(str.maketrans("", "", string.punctuation))
     stop_words = load_stopwords()
-    filtered_words = []
-    for word in valid_tokens:
-        if word not in stop_words:
-            filtered_words.append(word)
     stemmer = PorterStemmer()
-    stemmed_words = []
-    for word in filtered_words:
-        stemmed_words.append(stemmer.stem(word))
-    return stemmed_words
+    return [stemmer.stem(word) for word in text.split() if word not in stop_words]
 
 
 def tf_command(doc_id: int, term: str) -> int:
@@ -231,7 +631,75 @@ def tfidf_command(doc_id: int, term: str) -> float:
     return idx.get_tf_idf(doc_id, term)
 
 
-def bm25search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+def bm25check_command(query: str, k1: float = BM25_K1, b: float = BM25_B) -> dict:
     idx = InvertedIndex()
     idx.load()
-    return idx.bm25_search(query, limit)
+    query_tokens = tokenize_text(query)
+    scores = idx.bm25_scores(query_tokens, k1, b)
+    reference = idx.bm25_reference_scores(query_tokens, k1, b)
+    return {
+        "query": query,
+        "documents": len(scores),
+        "equal": bool(np.array_equal(scores, reference)),
+        "max_abs_diff": float(np.max(np.abs(scores - reference), initial=0.0)),
+    }
+
+
+def bm25search_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    k1: float = BM25_K1,
+    b: float = BM25_B,
+    idx: InvertedIndex | None = None,
+) -> list[dict]:
+    if idx is None:
+        idx = InvertedIndex()
+        idx.load()
+    return idx.bm25_search(query, limit, k1, b)
+
+
+def analyzer_benchmark_command(repeat: int = 3) -> dict:
+    """Time per-call tokenization against the shared Analyzer
+
+    Build tokenizes every movie; query tokenizes every title. Each timing
+    is the best of `repeat` runs, with a fresh Analyzer per run so the stem
+    cache starts cold.
+    """
+    movies = load_movies()
+    texts = [f"{m['title']} {m['description']}" for m in movies]
+    queries = [m["title"] for m in movies]
+
+    def best_of(run) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def analyzer_build() -> None:
+        Analyzer().analyze_many(texts)
+
+    def analyzer_query() -> None:
+        analyzer = Analyzer()
+        for query in queries:
+            analyzer.analyze(query)
+
+    timings = {
+        "build": (
+            best_of(lambda: [_uncached_tokenize_text(text) for text in texts]),
+            best_of(analyzer_build),
+        ),
+        "query": (
+            best_of(lambda: [_uncached_tokenize_text(query) for query in queries]),
+            best_of(analyzer_query),
+        ),
+    }
+    return {
+        "documents": len(texts),
+        "queries": len(queries),
+        **{
+            name: {"uncached": before, "analyzer": after, "speedup": before / after}
+            for name, (before, after) in timings.items()
+        },
+    }
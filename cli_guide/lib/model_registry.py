@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import nullcontext
+from functools import cache
+from itertools import chain
+from typing import Any
+
+
+class SharedModel:
+    """A registry model that any number of threads may use
+
+    encode and predict hold the model's lock, as does any code that calls
+    the tokenizer directly (see encoding.token_lengths): Hugging Face fast
+    tokenizers fail when called from two threads at once. Other attributes
+    are read from the wrapped model.
+    """
+
+    def __init__(self, model: Any, kind: str, model_name: str, device: str) -> None:
+        self.model = model
+        self.kind = kind
+        self.model_name = model_name
+        self.device = device
+        self.lock = threading.RLock()
+
+    def encode(self, *args: Any, **kwargs: Any) -> Any:
+        with self.lock:
+            return self.model.encode(*args, **kwargs)
+
+    def predict(self, *args: Any, **kwargs: Any) -> Any:
+        with self.lock:
+            return self.model.predict(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+def model_lock(model: Any):
+    # the lock of a SharedModel; nothing for a model used by one thread
+    return getattr(model, "lock", None) or nullcontext()
+
+
+def model_nbytes(model: Any) -> int | None:
+    # parameters plus buffers of a torch module, None for anything else
+    if not hasattr(model, "parameters"):
+        return None
+    tensors = chain(model.parameters(), getattr(model, "buffers", list)())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+@cache
+def resolve_device(device: str | None) -> str:
+    # the device the library would choose itself: cuda, mps, ... or cpu
+    if device is not None:
+        return device
+    from sentence_transformers.util import get_device_name
+
+    return get_device_name()
+
+
+class ModelRegistry:
+    """SentenceTransformer and CrossEncoder instances shared process-wide
+
+    Models are keyed by (kind, model name, device) and loaded once, on the
+    first request for them; every later request gets the same SharedModel.
+    Loads of different models can run concurrently, while concurrent
+    requests for one model wait for its single load.
+    """
+
+    def __init__(self) -> None:
+        self.models: dict[tuple[str, str, str], SharedModel] = {}
+        self.load_seconds: dict[tuple[str, str, str], float] = {}
+        self.load_locks: dict[tuple[str, str, str], threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def sentence_transformer(
+        self, model_name: str, device: str | None = None
+    ) -> SharedModel:
+        return self.__get("SentenceTransformer", model_name, device)
+
+    def cross_encoder(self, model_name: str, device: str | None = None) -> SharedModel:
+        return self.__get("CrossEncoder", model_name, device)
+
+    def footprint(self) -> list[dict]:
+        """Every loaded model with its load time and size
+
+        Returns:
+            One entry per model: kind, model name, device, seconds to load
+            and bytes of parameters and buffers (None if not a torch module)
+        """
+        with self.lock:
+            loaded = list(self.models.items())
+        footprint = []
+        for key, shared in loaded:
+            kind, model_name, device = key
+            footprint.append(
+                {
+                    "kind": kind,
+                    "model": model_name,
+                    "device": device,
+                    "load_seconds": self.load_seconds[key],
+                    "bytes": model_nbytes(shared.model),
+                }
+            )
+        return footprint
+
+    def clear(self) -> None:
+        with self.lock:
+            self.models.clear()
+            self.load_seconds.clear()
+            self.load_locks.clear()
+
+    def __get(self, kind: str, model_name: str, device: str | None) -> SharedModel:
+        key = (kind, model_name, resolve_device(device))
+        with self.lock:
+            shared = self.models.get(key)
+            if shared is not None:
+                return shared
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self.lock:
+                shared = self.models.get(key)
+            if shared is None:
+                start = time.perf_counter()
+                shared = SharedModel(self.__load(*key), *key)
+                with self.lock:
+                    self.models[key] = shared
+                    self.load_seconds[key] = time.perf_counter() - start
+        return shared
+
+    def __load(self, kind: str, model_name: str, device: str) -> Any:
+        import sentence_transformers
+
+        return getattr(sentence_transformers, kind)(model_name, device=device)
+
+
+_model_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return _model_registry
@@ -0,0 +1,184 @@
+import io
+
+import numpy as np
+
+from .index_file import save_index
+from .search_utils import (
+    DEFAULT_PQ_RESCORE,
+    KMEANS_ITERATIONS,
+    KMEANS_SAMPLE_PER_CLUSTER,
+    PQ_CENTROIDS,
+    PQ_SUBSPACES,
+)
+from .vectors import normalize_rows, score_blocks, top_k_indices
+
+
+def nearest_codes(vectors: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    # argmin |x - c|^2 is argmax x.c - |c|^2 / 2, one matmul per block
+    half_norms = 0.5 * np.einsum("ij,ij->i", codebook, codebook)
+    codes = np.empty(len(vectors), dtype=np.int64)
+    start = 0
+    for scores in score_blocks(vectors, codebook):
+        codes[start : start + len(scores)] = (scores - half_norms).argmax(axis=1)
+        start += len(scores)
+    return codes
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = KMEANS_ITERATIONS,
+    seed: int = 0,
+) -> np.ndarray:
+    """Euclidean k-means; empty clusters are reseeded with random vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    assignments = None
+    for _ in range(iterations):
+        new_assignments = nearest_codes(vectors, centroids)
+        if assignments is not None and np.array_equal(assignments, new_assignments):
+            break
+        assignments = new_assignments
+
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty))]
+    return centroids
+
+
+class PQIndex:
+    """Product-quantized vectors scored by asymmetric distance
+
+    Each vector is split into n_subspaces slices and every slice is stored
+    as the uint8 id of its nearest centroid in that subspace's codebook, so
+    a 384-d float32 vector takes 48 bytes with 48 subspaces (32x smaller).
+    A query is kept in full precision: one table of its dot products with
+    every centroid per subspace turns a vector's approximate score into a
+    sum of n_subspaces table lookups. The best `rescore` candidates can
+    then be scored exactly from the float vectors, which are only read for
+    those rows (e.g. from a memory-mapped .npy).
+
+    Codes are stored subspace-major, (n_subspaces, n_vectors), so scoring
+    is one contiguous table gather per subspace.
+    """
+
+    def __init__(
+        self,
+        codebooks: np.ndarray,
+        codes: np.ndarray,
+        vectors: np.ndarray | None = None,
+        fingerprint: str = "",
+        rescore: int = DEFAULT_PQ_RESCORE,
+    ) -> None:
+        self.codebooks = codebooks
+        self.codes = codes
+        self.vectors = vectors
+        self.fingerprint = fingerprint
+        self.rescore = rescore
+
+    @property
+    def n_subspaces(self) -> int:
+        return len(self.codebooks)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_subspaces: int = PQ_SUBSPACES,
+        fingerprint: str = "",
+        seed: int = 0,
+    ) -> "PQIndex":
+        """Train one codebook per subspace and encode every vector
+
+        Args:
+            vectors: Unit-length float32 rows to encode
+            n_subspaces: Slices per vector; must divide the dimension
+            fingerprint: Identifies the vectors, checked when loading
+            seed: Seed for sampling and centroid initialization
+
+        Returns:
+            The index, without float vectors for re-scoring
+        """
+        if len(vectors) == 0:
+            raise ValueError("cannot build a PQ index without vectors")
+        dim = vectors.shape[1]
+        if dim % n_subspaces:
+            raise ValueError(f"{n_subspaces} subspaces do not divide dimension {dim}")
+        n_centroids = min(PQ_CENTROIDS, len(vectors))
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        sample_size = n_centroids * KMEANS_SAMPLE_PER_CLUSTER
+        if len(vectors) > sample_size:
+            rows = rng.choice(len(vectors), sample_size, replace=False)
+            sample = vectors[np.sort(rows)]
+        # k-means sums in float32 even when the vectors are stored as float16
+        sample = np.asarray(sample, dtype=np.float32)
+
+        sub_dim = dim // n_subspaces
+        codebooks = np.empty((n_subspaces, n_centroids, sub_dim), dtype=np.float32)
+        codes = np.empty((n_subspaces, len(vectors)), dtype=np.uint8)
+        for s in range(n_subspaces):
+            columns = slice(s * sub_dim, (s + 1) * sub_dim)
+            codebooks[s] = kmeans(
+                np.ascontiguousarray(sample[:, columns]), n_centroids, seed=seed
+            )
+            codes[s] = nearest_codes(vectors[:, columns], codebooks[s])
+        return cls(codebooks, codes, fingerprint=fingerprint)
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        # tables[s, c] = query slice s . centroid c of subspace s
+        tables = np.einsum(
+            "scd,sd->sc", self.codebooks, query.reshape(self.n_subspaces, -1)
+        )
+        scores = np.zeros(self.codes.shape[1], dtype=np.float32)
+        for table, codes in zip(tables, self.codes):
+            scores += table.take(codes)
+        return scores
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top k rows by asymmetric distance, optionally re-scored exactly
+
+        Args:
+            query: Unit-length query vector
+            k: Number of rows to return
+
+        Returns:
+            (rows, scores), best first, ties in row order; scores are exact
+            cosine similarities when re-scoring, estimates otherwise
+        """
+        scores = self.approximate_scores(query)
+        if not self.rescore or self.vectors is None:
+            top = top_k_indices(scores, k)
+            return top, scores[top]
+        candidates = np.sort(top_k_indices(scores, max(k, self.rescore)))
+        exact = normalize_rows(self.vectors[candidates]) @ query
+        top = top_k_indices(exact, k)
+        return candidates[top], exact[top]
+
+    def save(self, path: str) -> None:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            codebooks=self.codebooks,
+            codes=self.codes,
+            fingerprint=np.array(self.fingerprint),
+        )
+        save_index(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray | None = None) -> "PQIndex":
+        with np.load(path) as data:
+            return cls(
+                data["codebooks"], data["codes"], vectors, str(data["fingerprint"])
+            )
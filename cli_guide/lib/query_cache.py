@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Callable
+
+import numpy as np
+
+from .search_utils import (
+    QUERY_CACHE_DISK_SIZE,
+    QUERY_CACHE_MEMORY_SIZE,
+    QUERY_CACHE_PATH,
+)
+
+
+def normalize_query(text: str) -> str:
+    # NFKC, single-spaced and trimmed; this is also the text that gets
+    # encoded, so equal keys always mean equal embeddings. Case is kept,
+    # since only some models ignore it
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache of query embeddings keyed by (model name, query)
+
+    An in-process LRU of memory_size entries sits in front of a SQLite
+    table of up to disk_size entries shared by every process using the same
+    file. Disk entries remember when they were last used and the least
+    recently used ones are evicted past the limit. Counters of memory hits,
+    disk hits and misses are kept per instance.
+    """
+
+    def __init__(
+        self,
+        path: str | None = QUERY_CACHE_PATH,
+        memory_size: int = QUERY_CACHE_MEMORY_SIZE,
+        disk_size: int = QUERY_CACHE_DISK_SIZE,
+    ) -> None:
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+
+    def embed(
+        self,
+        model_name: str,
+        texts: list[str],
+        encode: Callable[[list[str]], np.ndarray],
+    ) -> np.ndarray:
+        """Embeddings of texts, encoding only the ones not cached
+
+        Args:
+            model_name: Part of the cache key
+            texts: Queries; normalized with normalize_query
+            encode: Encodes a list of texts in one call, e.g. model.encode
+
+        Returns:
+            One float32 row per text, in order
+        """
+        queries = [normalize_query(text) for text in texts]
+        found: dict[str, np.ndarray] = {}
+        missing = []
+        with self.lock:
+            # repeats within one call are looked up and encoded once
+            for query in dict.fromkeys(queries):
+                embedding = self.__get(model_name, query)
+                if embedding is None:
+                    missing.append(query)
+                else:
+                    found[query] = embedding
+            self.misses += len(missing)
+
+        if missing:
+            encoded = np.asarray(encode(missing), dtype=np.float32)
+            with self.lock:
+                for query, embedding in zip(missing, encoded):
+                    self.__remember(model_name, query, embedding)
+                    found[query] = embedding
+                self.__store(model_name, missing, encoded)
+
+        return np.stack([found[query] for query in queries])
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": self.__disk_count(),
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+            connection = self.__connect()
+            if connection is not None:
+                with connection:
+                    connection.execute("DELETE FROM query_embeddings")
+
+    def __get(self, model_name: str, query: str) -> np.ndarray | None:
+        key = (model_name, query)
+        embedding = self.memory.get(key)
+        if embedding is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return embedding
+
+        connection = self.__connect()
+        if connection is None:
+            return None
+        row = connection.execute(
+            "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        with connection:
+            connection.execute(
+                "UPDATE query_embeddings SET last_used = ? "
+                "WHERE model = ? AND query = ?",
+                (time.time(), *key),
+            )
+        embedding = np.frombuffer(row[0], dtype=np.float32)
+        self.__remember(model_name, query, embedding)
+        self.disk_hits += 1
+        return embedding
+
+    def __remember(self, model_name: str, query: str, embedding: np.ndarray) -> None:
+        if self.memory_size <= 0:
+            return
+        self.memory[(model_name, query)] = embedding
+        self.memory.move_to_end((model_name, query))
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def __store(
+        self, model_name: str, queries: list[str], embeddings: np.ndarray
+    ) -> None:
+        connection = self.__connect()
+        if connection is None:
+            return
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                [
+                    (model_name, query, embedding.tobytes(), now)
+                    for query, embedding in zip(queries, embeddings)
+                ],
+            )
+            excess = self.__disk_count() - self.disk_size
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN ("
+                    "SELECT rowid FROM query_embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def __disk_count(self) -> int:
+        connection = self.__connect()
+        if connection is None:
+            return 0
+        (count,) = connection.execute(
+            "SELECT COUNT(*) FROM query_embeddings"
+        ).fetchone()
+        return count
+
+    def __connect(self) -> sqlite3.Connection | None:
+        # opened on first use; no path or a zero disk_size means memory only
+        if self.connection is None and self.path and self.disk_size > 0:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT, query TEXT, embedding BLOB, last_used REAL, "
+                "PRIMARY KEY (model, query))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_last_used "
+                "ON query_embeddings (last_used)"
+            )
+            self.connection = connection
+        return self.connection
+
+
+_query_cache: QueryEmbeddingCache | None = None
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache()
+    return _query_cache
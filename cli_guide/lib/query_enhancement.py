@@ -1,15 +1,20 @@
 import os
+from functools import cache
 from typing import Optional
 
-from dotenv import load_dotenv
-from google import genai
-
-load_dotenv()
-api_key = os.getenv("gemini_api_key")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.5-flash"
 
 
+@cache
+def get_client():
+    # imported and connected on first use; most searches never enhance
+    from dotenv import load_dotenv
+    from google import genai
+
+    load_dotenv()
+    return genai.Client(api_key=os.getenv("gemini_api_key"))
+
+
 def spell_correct(query: str) -> str:
     prompt = f"""Fix any spelling errors in this movie search query.
 
@@ -20,7 +25,7 @@ Query: "{query}"
 If no errors, return the original query.
 Corrected:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = get_client().models.generate_content(model=model, contents=prompt)
     corrected = (response.text or "").strip().strip('"')
     return corrected if corrected else query
 
@@ -45,7 +50,7 @@ Examples:
 
 Rewritten query:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = get_client().models.generate_content(model=model, contents=prompt)
     rewritten = (response.text or "").strip().strip('"')
     return rewritten if rewritten else query
 
@@ -66,7 +71,7 @@ Examples:
 Query: "{query}"
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = get_client().models.generate_content(model=model, contents=prompt)
     expanded_terms = (response.text or "").strip().strip('"')
 
     return f"{query} {expanded_terms}"
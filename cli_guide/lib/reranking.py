@@ -1,16 +1,28 @@
 import json
 import os
+from functools import cache
 from time import sleep
 
-from dotenv import load_dotenv
-from google import genai
-from sentence_transformers import CrossEncoder
+from .model_registry import get_model_registry
 
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.5-flash"
-cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
+cross_encoder_model = "cross-encoder/ms-marco-TinyBERT-L2-v2"
+
+
+# the client and the cross-encoder are built on first use, so importing
+# this module (e.g. through hybrid_search) stays cheap; the cross-encoder
+# is the process-wide registry instance
+@cache
+def get_client():
+    from dotenv import load_dotenv
+    from google import genai
+
+    load_dotenv()
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+def get_cross_encoder(device: str | None = None):
+    return get_model_registry().cross_encoder(cross_encoder_model, device)
 
 
 def llm_rerank_individual(
@@ -34,7 +46,7 @@ Give me ONLY the number in your response, no other text or explanation.
 
 Score:"""
 
-        response = client.models.generate_content(model=model, contents=prompt)
+        response = get_client().models.generate_content(model=model, contents=prompt)
         score_text = (response.text or "").strip()
         score = int(score_text)
         scored_docs.append({**doc, "individual_score": score})
@@ -71,7 +83,7 @@ Return ONLY the IDs in order of relevance (best match first). Return a valid JSO
 [75, 12, 34, 2, 1]
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = get_client().models.generate_content(model=model, contents=prompt)
     ranking_text = (response.text or "").strip()
 
     parsed_ids = json.loads(ranking_text)
@@ -91,7 +103,7 @@ def cross_encoder_rerank(
     for doc in documents:
         pairs.append([query, f"{doc.get('title', '')} - {doc.get('document', '')}"])
 
-    scores = cross_encoder.predict(pairs)
+    scores = get_cross_encoder().predict(pairs)
 
     for doc, score in zip(documents, scores):
         doc["crossencoder_score"] = float(score)
@@ -0,0 +1,40 @@
+import json
+import urllib.error
+import urllib.request
+from typing import Any
+
+from .search_utils import SEARCH_SERVER_HOST, SEARCH_SERVER_PORT
+
+
+def call_server(
+    command: str,
+    params: dict,
+    host: str = SEARCH_SERVER_HOST,
+    port: int = SEARCH_SERVER_PORT,
+) -> Any:
+    """Run a command on the search server and return its result
+
+    Args:
+        command: CLI command name, e.g. "rrf-search"
+        params: Keyword arguments of the command's *_command function
+        host: Server address
+        port: Server port
+
+    Returns:
+        The command's result, decoded from JSON
+    """
+    url = f"http://{host}:{port}/{command}"
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(params).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)["result"]
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.load(e)["error"]) from None
+    except urllib.error.URLError as e:
+        raise ConnectionError(
+            f"No search server at {url} ({e.reason}); start search_server_cli.py"
+        ) from None
@@ -0,0 +1,193 @@
+import inspect
+import json
+import threading
+import time
+import traceback
+import typing
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import numpy as np
+
+from .hybrid_search import HybridSearch, rrf_search_command, weighted_search_command
+from .keyword_search import bm25search_command
+from .model_registry import get_model_registry
+from .reranking import get_cross_encoder
+from .search_utils import (
+    CHUNK_SEARCH_BACKENDS,
+    SEARCH_SERVER_HOST,
+    SEARCH_SERVER_PORT,
+    load_movies,
+)
+from .semantic_search import search_chunked_command
+
+# index attributes a search_chunked request may set, per backend
+INDEX_SETTINGS = {
+    "exact": set(),
+    "ivf": {"nprobe"},
+    "hnsw": {"ef_search"},
+    "pq": {"rescore"},
+    "binary": {"candidates"},
+}
+
+
+class RequestError(Exception):
+    """A request for an unknown command or with invalid parameters"""
+
+
+def accepts(annotation: Any, value: Any) -> bool:
+    # JSON values against the simple annotations of the *_command functions;
+    # anything else is left to the command
+    if annotation is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if annotation is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if annotation in (str, bool):
+        return isinstance(value, annotation)
+    args = typing.get_args(annotation)
+    if type(None) in args:
+        return value is None or any(
+            accepts(arg, value) for arg in args if arg is not type(None)
+        )
+    return True
+
+
+def check_params(
+    function: Callable, params: Any, server_params: tuple[str, ...] = ()
+) -> None:
+    """Raise RequestError unless params are valid keyword arguments of function
+
+    Args:
+        function: The command to run
+        params: The decoded request body
+        server_params: Arguments the server passes itself
+    """
+    if not isinstance(params, dict):
+        raise RequestError("parameters must be a JSON object")
+    for name in server_params:
+        if name in params:
+            raise RequestError(f"unexpected parameter: {name}")
+    try:
+        inspect.signature(function).bind(**params)
+    except TypeError as e:
+        raise RequestError(str(e)) from None
+    hints = typing.get_type_hints(function)
+    for name, value in params.items():
+        if not accepts(hints.get(name), value):
+            raise RequestError(f"invalid value for {name}: {value!r}")
+
+
+class SearchService:
+    """Searchers loaded once and shared by every request
+
+    Holds a HybridSearch, and with it the InvertedIndex and the
+    ChunkedSemanticSearch (model and chunk embeddings), which are loaded
+    once and replaced when a rebuild lands in the cache, plus the reranking
+    cross-encoder. Models come from the process-wide registry and are
+    loaded at startup rather than on the first request; the "models"
+    command reports their footprint. Requests run concurrently: every
+    search reads one index snapshot and the models lock themselves. Only
+    search_chunked requests on an approximate backend take a lock, since
+    they load and tune an index that the other such requests share.
+    """
+
+    def __init__(self, documents: list[dict] | None = None) -> None:
+        start = time.perf_counter()
+        self.hybrid = HybridSearch(
+            documents if documents is not None else load_movies()
+        )
+        # both models are otherwise built by the first request needing them
+        semantic_search = self.hybrid.semantic_search
+        get_model_registry().sentence_transformer(
+            semantic_search.model_name, semantic_search.device
+        )
+        get_cross_encoder()
+        self.ann_lock = threading.Lock()
+        self.startup_seconds = time.perf_counter() - start
+
+    @property
+    def documents(self) -> list[dict]:
+        return self.hybrid.documents
+
+    def handle(self, command: str, params: Any) -> Any:
+        match command:
+            case "rrf-search":
+                check_params(rrf_search_command, params, ("searcher",))
+                return rrf_search_command(**params, searcher=self.hybrid)
+            case "weighted-search":
+                check_params(weighted_search_command, params, ("searcher",))
+                return weighted_search_command(**params, searcher=self.hybrid)
+            case "search_chunked":
+                return self.__search_chunked(params)
+            case "bm25search":
+                check_params(bm25search_command, params, ("idx",))
+                return bm25search_command(**params, idx=self.hybrid.idx)
+            case "models":
+                check_params(get_model_registry().footprint, params)
+                return get_model_registry().footprint()
+            case _:
+                raise RequestError(f"Unknown command: {command}")
+
+    def __search_chunked(self, params: Any) -> dict:
+        check_params(search_chunked_command, params, ("searcher",))
+        backend = params.get("backend", "exact")
+        if backend not in CHUNK_SEARCH_BACKENDS:
+            raise RequestError(f"Unknown search backend: {backend}")
+        for name in params.keys() - {"query", "limit", "backend"}:
+            if name not in INDEX_SETTINGS[backend] or not accepts(int, params[name]):
+                raise RequestError(
+                    f"invalid {backend} setting {name}: {params[name]!r}"
+                )
+        searcher = self.hybrid.semantic_search
+        if backend == "exact":
+            return search_chunked_command(**params, searcher=searcher)
+        with self.ann_lock:
+            return search_chunked_command(**params, searcher=searcher)
+
+
+def to_json(value: Any) -> Any:
+    # json.dumps fallback for NumPy scalars and arrays in results
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    # POST /<command> with the command's keyword arguments as a JSON object;
+    # answers {"result": ...} or {"error": message}
+    service: SearchService
+
+    def do_POST(self) -> None:
+        command = self.path.strip("/")
+        try:
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                params = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                raise RequestError(f"invalid request body: {e}") from None
+            response = {"result": self.service.handle(command, params)}
+            status = 200
+        except RequestError as e:
+            response, status = {"error": str(e)}, 400
+        except Exception as e:  # noqa: BLE001 - a failed command still gets an answer
+            traceback.print_exc()
+            response, status = {"error": f"{type(e).__name__}: {e}"}, 500
+        body = json.dumps(response, default=to_json).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def create_server(
+    service: SearchService,
+    host: str = SEARCH_SERVER_HOST,
+    port: int = SEARCH_SERVER_PORT,
+) -> ThreadingHTTPServer:
+    handler = type("Handler", (SearchRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
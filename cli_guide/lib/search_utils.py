@@ -12,6 +12,13 @@ SCORE_PRECISION = 6
 
 BM25_K1 = 1.5
 BM25_B = 0.75
+# relative margin on MaxScore bounds so float rounding never prunes a hit
+PRUNING_SLACK = 1e-9
+STEM_CACHE_SIZE = 1 << 16
+# segments of the same size tier merged at once by the index merge policy
+SEGMENT_MERGE_FACTOR = 4
+# a segment with more deleted documents than this is rewritten
+MAX_DELETED_RATIO = 0.5
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 DATA_PATH = os.path.join(PROJECT_ROOT, "data", "movies.json")
@@ -20,13 +27,70 @@ GOLDEN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "golden_dataset.json")
 
 CACHE_DIR = os.path.join(PROJECT_ROOT, "cache", "guide")
 
+# max query x document scores held at once by batched semantic search
+SCORE_BLOCK_SIZE = 1 << 22
+# embedding rows read (and up-cast to float32) at a time while scoring
+EMBEDDING_BLOCK_ROWS = 1 << 14
+# storage format of new embedding caches: "float32", or "float16" for half
+# the size at ~3 significant digits
+EMBEDDING_DTYPE = "float32"
+EMBEDDING_DTYPES = ["float32", "float16"]
+# texts sorted by token length and encoded together while building an
+# embedding cache; bounds memory however many texts there are
+ENCODE_WINDOW_SIZE = 4096
+# texts per forward pass unless calibrate_batch_size picked one for this CPU
+DEFAULT_ENCODE_BATCH_SIZE = 32
+CALIBRATION_BATCH_SIZES = [8, 16, 32, 64, 128, 256]
+CALIBRATION_SAMPLE_SIZE = 512
+
+# IVF lists per square root of the vector count, and lists probed per query
+IVF_LISTS_PER_SQRT = 4
+DEFAULT_IVF_NPROBE = 8
+KMEANS_ITERATIONS = 20
+# k-means trains on at most this many sampled vectors per cluster
+KMEANS_SAMPLE_PER_CLUSTER = 256
+# HNSW links per node (twice that on layer 0) and search widths
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+DEFAULT_HNSW_EF_SEARCH = 64
+# PQ slices per vector (48 bytes per 384-d vector), centroids per slice,
+# and candidates re-scored from the float vectors (0 disables re-scoring)
+PQ_SUBSPACES = 48
+PQ_CENTROIDS = 256
+DEFAULT_PQ_RESCORE = 200
+# Hamming-nearest chunks re-scored by the sign-bit prefilter
+DEFAULT_BINARY_CANDIDATES = 200
+# ways to search chunk embeddings: every row, or an approximate index
+CHUNK_SEARCH_BACKENDS = ["exact", "ivf", "hnsw", "pq", "binary"]
+# chunk candidates an approximate index returns per requested movie
+ANN_CANDIDATES_PER_RESULT = 5
+# queries used by the approximate search recall report
+RECALL_QUERY_COUNT = 100
+
+# query embeddings kept in process and on disk
+QUERY_CACHE_MEMORY_SIZE = 1024
+QUERY_CACHE_DISK_SIZE = 100_000
+
+# address of the resident search server (search_server_cli.py)
+SEARCH_SERVER_HOST = "127.0.0.1"
+SEARCH_SERVER_PORT = 8765
+# seconds between checks of the cache files for rebuilt indexes
+INDEX_CHECK_INTERVAL = 1.0
+
 DEFAULT_CHUNK_SIZE = 200
 DEFAULT_CHUNK_OVERLAP = 1
 DEFAULT_SEMANTIC_CHUNK_SIZE = 4
 
 MOVIE_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "movie_embeddings.npy")
+MOVIE_EMBEDDINGS_MANIFEST_PATH = os.path.join(CACHE_DIR, "movie_embeddings.json")
 CHUNK_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "chunk_embeddings.npy")
-CHUNK_METADATA_PATH = os.path.join(CACHE_DIR, "chunk_metadata.json")
+CHUNK_EMBEDDINGS_MANIFEST_PATH = os.path.join(CACHE_DIR, "chunk_embeddings.json")
+CHUNK_METADATA_PATH = os.path.join(CACHE_DIR, "chunk_metadata.npz")
+ENCODE_CALIBRATION_PATH = os.path.join(CACHE_DIR, "encode_calibration.json")
+QUERY_CACHE_PATH = os.path.join(CACHE_DIR, "query_embeddings.sqlite")
+CHUNK_IVF_PATH = os.path.join(CACHE_DIR, "chunk_ivf.npz")
+CHUNK_HNSW_PATH = os.path.join(CACHE_DIR, "chunk_hnsw.npz")
+CHUNK_PQ_PATH = os.path.join(CACHE_DIR, "chunk_pq.npz")
 
 
 def load_movies() -> list[dict]:
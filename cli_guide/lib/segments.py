@@ -0,0 +1,320 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .bm25 import bm25_idf, bm25_length_norm, bm25_tf_component
+from .index_file import POSTINGS_CACHE_SIZE, IndexFile, save_index, write_index
+from .search_utils import BM25_B, BM25_K1, MAX_DELETED_RATIO, SEGMENT_MERGE_FACTOR
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def encode_segment(
+    docs: list[dict],
+    doc_lengths: np.ndarray,
+    terms: list[str],
+    postings_indptr: np.ndarray,
+    postings_rows: np.ndarray,
+    postings_tfs: np.ndarray,
+) -> bytes:
+    """Encode documents and their term-major postings as one segment
+
+    The stored idf, length normalization and MaxScore bounds are local to
+    the segment; SegmentedIndex derives corpus-wide ones when it has to.
+    """
+    doc_freqs = np.diff(postings_indptr)
+    doc_count = len(docs)
+    idf = np.array([bm25_idf(doc_count, df) for df in doc_freqs.tolist()])
+    avg_doc_length = int(doc_lengths.sum()) / doc_count if doc_count else 0.0
+    length_norm = bm25_length_norm(doc_lengths, avg_doc_length, BM25_B)
+    max_scores = np.zeros(len(terms))
+    if len(postings_rows):
+        tf_component = bm25_tf_component(
+            postings_tfs, length_norm[postings_rows], BM25_K1
+        )
+        max_scores = np.maximum.reduceat(tf_component, postings_indptr[:-1]) * idf
+
+    return write_index(
+        doc_ids=np.array([doc["id"] for doc in docs], dtype=np.int64),
+        docs=docs,
+        doc_lengths=doc_lengths,
+        length_norm=length_norm,
+        terms=terms,
+        postings_indptr=postings_indptr,
+        postings_rows=postings_rows,
+        postings_tfs=postings_tfs,
+        idf=idf,
+        max_scores=max_scores,
+    )
+
+
+class Segment:
+    """An immutable index file plus a mask of its deleted rows"""
+
+    def __init__(
+        self,
+        name: str,
+        index_file: IndexFile,
+        deleted: np.ndarray | None = None,
+        saved: bool = False,
+    ) -> None:
+        self.name = name
+        self.index_file = index_file
+        if deleted is None:
+            deleted = np.zeros(index_file.doc_count, dtype=bool)
+        self.deleted = deleted
+        self.saved = saved
+
+    @property
+    def live_count(self) -> int:
+        return self.index_file.doc_count - int(self.deleted.sum())
+
+    def delete_rows(self, rows: np.ndarray) -> "Segment":
+        deleted = self.deleted.copy()
+        deleted[rows] = True
+        return Segment(self.name, self.index_file, deleted, self.saved)
+
+
+class SegmentedIndex:
+    """Read-only view over segments with corpus-wide BM25 statistics
+
+    Exposes the same attributes as IndexFile. Rows are numbered across
+    segments in order; deleted rows keep their number but are left out of
+    postings, statistics and live_rows(). A single segment without deletions
+    is served straight from its file. Otherwise document frequencies are
+    recounted over live rows, and each segment's stored MaxScore bound is
+    rescaled into an upper bound under the global idf and average length.
+    """
+
+    def __init__(self, segments: list[Segment]) -> None:
+        self.segments = segments
+        files = [segment.index_file for segment in segments]
+        self.row_offsets = np.zeros(len(files) + 1, dtype=np.int64)
+        np.cumsum([f.doc_count for f in files], out=self.row_offsets[1:])
+        if len(files) == 1:
+            self.doc_ids = files[0].doc_ids
+            self.doc_lengths = files[0].doc_lengths
+        else:
+            self.doc_ids = np.concatenate(
+                [f.doc_ids for f in files] or [np.empty(0, dtype=np.int64)]
+            )
+            self.doc_lengths = np.concatenate(
+                [f.doc_lengths for f in files] or [np.empty(0, dtype=np.uint32)]
+            )
+        self.live = np.concatenate(
+            [~segment.deleted for segment in segments] or [np.empty(0, dtype=bool)]
+        )
+        self.doc_count = int(self.live.sum())
+        live_length = int(self.doc_lengths[self.live].sum())
+        self.avg_doc_length = live_length / self.doc_count if self.doc_count else 0.0
+
+        self.terms: list[str] | None = None
+        if len(segments) == 1 and not segments[0].deleted.any():
+            self.term_count = files[0].term_count
+            self.idf = files[0].idf
+            self.length_norm = files[0].length_norm
+            self.max_scores = files[0].max_scores
+        else:
+            self.__merge_statistics()
+        self.postings = lru_cache(maxsize=POSTINGS_CACHE_SIZE)(self.__merge_postings)
+
+    def __merge_statistics(self) -> None:
+        segment_terms = [segment.index_file.terms() for segment in self.segments]
+        all_terms = sorted(set().union(*segment_terms))
+        all_vocab = {term: i for i, term in enumerate(all_terms)}
+        self.length_norm = bm25_length_norm(
+            self.doc_lengths, self.avg_doc_length, BM25_B
+        )
+
+        segment_term_ids = []
+        doc_freqs = np.zeros(len(all_terms), dtype=np.int64)
+        for segment, terms in zip(self.segments, segment_terms):
+            f = segment.index_file
+            term_ids = np.array([all_vocab[t] for t in terms], dtype=np.int64)
+            segment_term_ids.append(term_ids)
+            if segment.deleted.any():
+                indptr, rows, _ = f.all_postings()
+                term_of_posting = np.repeat(np.arange(f.term_count), np.diff(indptr))
+                live_postings = term_of_posting[~segment.deleted[rows]]
+                np.add.at(doc_freqs, term_ids[live_postings], 1)
+            else:
+                np.add.at(doc_freqs, term_ids, f.doc_freqs)
+
+        # terms left without live postings are dropped, as merge_segments
+        # does, so the vocabulary matches a fresh build
+        used = doc_freqs > 0
+        new_ids = np.cumsum(used) - 1
+        self.terms = [term for term, keep in zip(all_terms, used.tolist()) if keep]
+        self.__vocab = {term: i for i, term in enumerate(self.terms)}
+        self.term_count = len(self.terms)
+        self.idf = np.array(
+            [bm25_idf(self.doc_count, df) for df in doc_freqs[used].tolist()]
+        )
+
+        # A stored bound is idf_s * max tf_component under the segment's own
+        # average length avg_s. Under the global average the length norm can
+        # shrink by at most min(1, avg_s / avg), which grows tf_component by at
+        # most its inverse, so rescaling idf and dividing by that is an upper
+        # bound for the live postings of the segment.
+        self.max_scores = np.zeros(self.term_count)
+        for segment, term_ids in zip(self.segments, segment_term_ids):
+            f = segment.index_file
+            if f.term_count == 0:
+                continue
+            segment_avg = int(f.doc_lengths.sum()) / f.doc_count
+            shrink = 1.0
+            if segment_avg > 0 and self.avg_doc_length > 0:
+                shrink = min(1.0, segment_avg / self.avg_doc_length)
+            keep = used[term_ids]
+            term_ids = new_ids[term_ids[keep]]
+            bounds = f.max_scores[keep] * (self.idf[term_ids] / f.idf[keep]) / shrink
+            np.maximum.at(self.max_scores, term_ids, bounds)
+
+    def term_id(self, term: str) -> int | None:
+        if self.terms is None:
+            return self.segments[0].index_file.term_id(term)
+        return self.__vocab.get(term)
+
+    def __merge_postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.terms is None:
+            return self.segments[0].index_file.postings(term_id)
+        term = self.terms[term_id]
+        rows_parts = [np.empty(0, dtype=np.int64)]
+        tfs_parts = [np.empty(0, dtype=np.int64)]
+        for segment, offset in zip(self.segments, self.row_offsets.tolist()):
+            local_id = segment.index_file.term_id(term)
+            if local_id is None:
+                continue
+            rows, tfs = segment.index_file.postings(local_id)
+            live = ~segment.deleted[rows]
+            rows_parts.append(rows[live] + offset)
+            tfs_parts.append(tfs[live])
+        return np.concatenate(rows_parts), np.concatenate(tfs_parts)
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.live)
+
+    def document(self, row: int) -> dict:
+        i = int(np.searchsorted(self.row_offsets, row, side="right")) - 1
+        return self.segments[i].index_file.document(row - int(self.row_offsets[i]))
+
+
+def merge_segments(segments: list[Segment]) -> bytes:
+    """Rewrite the live rows of consecutive segments as one segment
+
+    Postings are copied without re-tokenizing. Rows keep their relative
+    order and terms left without live postings are dropped, so merging the
+    segments of an index equals building it from the same documents.
+    """
+    all_terms = sorted(set().union(*(s.index_file.terms() for s in segments)))
+    vocab = {term: i for i, term in enumerate(all_terms)}
+    docs = []
+    doc_lengths = [np.empty(0, dtype=np.int64)]
+    term_parts = [np.empty(0, dtype=np.int64)]
+    row_parts = [np.empty(0, dtype=np.int64)]
+    tf_parts = [np.empty(0, dtype=np.int64)]
+    row_offset = 0
+    for segment in segments:
+        f = segment.index_file
+        live_rows = np.flatnonzero(~segment.deleted)
+        new_rows = np.full(f.doc_count, -1, dtype=np.int64)
+        new_rows[live_rows] = row_offset + np.arange(len(live_rows))
+        row_offset += len(live_rows)
+
+        indptr, rows, tfs = f.all_postings()
+        term_ids = np.array([vocab[t] for t in f.terms()], dtype=np.int64)
+        term_of_posting = np.repeat(term_ids, np.diff(indptr))
+        keep = ~segment.deleted[rows]
+        term_parts.append(term_of_posting[keep])
+        row_parts.append(new_rows[rows[keep]])
+        tf_parts.append(tfs[keep])
+        docs.extend(f.document(row) for row in live_rows.tolist())
+        doc_lengths.append(f.doc_lengths[live_rows].astype(np.int64))
+
+    term_of_posting = np.concatenate(term_parts)
+    rows = np.concatenate(row_parts)
+    tfs = np.concatenate(tf_parts)
+    used_ids, term_of_posting = np.unique(term_of_posting, return_inverse=True)
+    order = np.lexsort((rows, term_of_posting))
+    doc_freqs = np.bincount(term_of_posting, minlength=len(used_ids))
+    postings_indptr = np.concatenate(([0], np.cumsum(doc_freqs))).astype(np.int64)
+    return encode_segment(
+        docs,
+        np.concatenate(doc_lengths),
+        [all_terms[i] for i in used_ids.tolist()],
+        postings_indptr,
+        rows[order],
+        tfs[order],
+    )
+
+
+def size_tier(doc_count: int) -> int:
+    tier = 0
+    while doc_count >= SEGMENT_MERGE_FACTOR:
+        doc_count //= SEGMENT_MERGE_FACTOR
+        tier += 1
+    return tier
+
+
+def select_merge(segments: list[Segment]) -> tuple[int, int] | None:
+    """Pick the next range of segments to merge, if any
+
+    A segment whose deleted fraction exceeds MAX_DELETED_RATIO is rewritten
+    on its own. Otherwise the first run of SEGMENT_MERGE_FACTOR adjacent
+    segments in the same size tier is merged, so small segments from
+    frequent updates collapse into larger ones and the segment count stays
+    logarithmic in the corpus size. Only adjacent segments are merged, which
+    keeps the row order of the documents.
+
+    Returns:
+        (start, end) slice of segments to merge, or None
+    """
+    for i, segment in enumerate(segments):
+        doc_count = segment.index_file.doc_count
+        if (
+            doc_count
+            and (doc_count - segment.live_count) / doc_count > MAX_DELETED_RATIO
+        ):
+            return i, i + 1
+    tiers = [size_tier(segment.live_count) for segment in segments]
+    for start in range(len(segments) - SEGMENT_MERGE_FACTOR + 1):
+        end = start + SEGMENT_MERGE_FACTOR
+        if len(set(tiers[start:end])) == 1:
+            return start, end
+    return None
+
+
+def segment_file_name(number: int) -> str:
+    return f"segment-{number:06d}.bin"
+
+
+def read_manifest(index_dir: str) -> dict:
+    with open(os.path.join(index_dir, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            f"index manifest version {manifest.get('version')}, "
+            f"expected {MANIFEST_VERSION}; rebuild it"
+        )
+    return manifest
+
+
+def write_manifest(index_dir: str, manifest: dict) -> None:
+    # the manifest is the commit point: segments are written before it.
+    # Files are removed one commit late: the previous manifest's segments
+    # are kept, so a reader that has just read it can still open them
+    try:
+        previous = read_manifest(index_dir)["segments"]
+    except (FileNotFoundError, ValueError):
+        previous = []
+    save_index(
+        os.path.join(index_dir, MANIFEST_NAME),
+        json.dumps({"version": MANIFEST_VERSION, **manifest}).encode("utf-8"),
+    )
+    kept = {segment["name"] for segment in previous + manifest["segments"]}
+    for name in os.listdir(index_dir):
+        if name.startswith("segment-") and name not in kept:
+            os.remove(os.path.join(index_dir, name))
@@ -1,47 +1,116 @@
-import json
+import io
 import os
 import re
+import time
+from collections.abc import Callable, Iterator
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
+from .binary_index import BinaryIndex
+from .embedding_cache import (
+    content_hash,
+    load_embeddings,
+    manifest_fingerprint,
+    update_embeddings,
+)
+from .encoding import calibrate_batch_size, create_encoder
+from .hnsw import HNSWIndex
+from .index_file import save_index
+from .ivf import IVFIndex
+from .model_registry import get_model_registry
+from .pq import PQIndex
+from .query_cache import QueryEmbeddingCache, get_query_cache
 from .search_utils import (
+    ANN_CANDIDATES_PER_RESULT,
+    CALIBRATION_BATCH_SIZES,
+    CHUNK_EMBEDDINGS_MANIFEST_PATH,
     CHUNK_EMBEDDINGS_PATH,
+    CHUNK_HNSW_PATH,
+    CHUNK_IVF_PATH,
     CHUNK_METADATA_PATH,
+    CHUNK_PQ_PATH,
+    DEFAULT_BINARY_CANDIDATES,
     DEFAULT_CHUNK_OVERLAP,
     DEFAULT_CHUNK_SIZE,
+    DEFAULT_HNSW_EF_SEARCH,
+    DEFAULT_IVF_NPROBE,
+    DEFAULT_PQ_RESCORE,
     DEFAULT_SEARCH_LIMIT,
     DEFAULT_SEMANTIC_CHUNK_SIZE,
     DOCUMENT_PREVIEW_LENGTH,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_M,
+    MOVIE_EMBEDDINGS_MANIFEST_PATH,
     MOVIE_EMBEDDINGS_PATH,
+    PQ_SUBSPACES,
+    RECALL_QUERY_COUNT,
     format_search_result,
+    load_golden_dataset,
     load_movies,
 )
+from .vectors import normalize_rows, score_blocks, top_k_indices
 
 
 class SemanticSearch:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        embedding_dtype=None,
+        query_cache: QueryEmbeddingCache | None = None,
+        workers: int = 1,
+        device: str | None = None,
+    ):
+        self.model_name = model_name
+        # None lets the library pick (cuda, mps, ... or cpu)
+        self.device = device
+        # builds encode in length-sorted batches of the calibrated size, in
+        # a pool of worker processes when workers > 1
+        self.encoder = create_encoder(lambda: self.model, model_name, workers)
+        # repeated queries skip the model; shared by every searcher by default
+        self.query_cache = query_cache or get_query_cache()
+        # "float32"/"float16" storage for the caches; None keeps what is there
+        self.embedding_dtype = embedding_dtype
         self.embeddings = None
+        # unit-length rows that search scores against; the cache stores
+        # them that way, so this is the memory-mapped embeddings array
+        self.normalized_embeddings = None
         self.documents = None
         self.document_map = {}
 
+    @property
+    def model(self):
+        # loaded on first use: searches whose query embeddings are cached
+        # and loads of cached document embeddings never need it. Every
+        # searcher of the process shares one instance per model and device
+        return get_model_registry().sentence_transformer(self.model_name, self.device)
+
     def generate_embedding(self, text):
-        if not text or not text.strip():
-            raise ValueError("cannot generate embedding for empty text")
-        return self.model.encode([text])[0]
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: list[str]) -> np.ndarray:
+        # cached queries are looked up; the rest go to the model in one call
+        for text in texts:
+            if not text or not text.strip():
+                raise ValueError("cannot generate embedding for empty text")
+        return self.query_cache.embed(
+            self.model_name, list(texts), lambda missing: self.model.encode(missing)
+        )
 
     def build_embeddings(self, documents):
+        # only new or changed movies are encoded; the rest come from the cache
         self.documents = documents
         self.document_map = {}
-        movie_strings = []
         for doc in documents:
             self.document_map[doc["id"]] = doc
-            movie_strings.append(f"{doc['title']}: {doc['description']}")
-        self.embeddings = self.model.encode(movie_strings, show_progress_bar=True)
-
-        os.makedirs(os.path.dirname(MOVIE_EMBEDDINGS_PATH), exist_ok=True)
-        np.save(MOVIE_EMBEDDINGS_PATH, self.embeddings)
+        self.embeddings = update_embeddings(
+            self.encoder,
+            self.model_name,
+            movie_texts(documents),
+            MOVIE_EMBEDDINGS_PATH,
+            MOVIE_EMBEDDINGS_MANIFEST_PATH,
+            self.embedding_dtype,
+        )
+        self.normalized_embeddings = self.embeddings
         return self.embeddings
 
     def load_or_create_embeddings(self, documents):
@@ -50,14 +119,35 @@ class SemanticSearch:
         for doc in documents:
             self.document_map[doc["id"]] = doc
 
-        if os.path.exists(MOVIE_EMBEDDINGS_PATH):
-            self.embeddings = np.load(MOVIE_EMBEDDINGS_PATH)
-            if len(self.embeddings) == len(documents):
-                return self.embeddings
+        embeddings = load_embeddings(
+            MOVIE_EMBEDDINGS_PATH,
+            MOVIE_EMBEDDINGS_MANIFEST_PATH,
+            self.model_name,
+            [content_hash(text) for text in movie_texts(documents)],
+            self.embedding_dtype,
+        )
+        if embeddings is not None:
+            self.embeddings = embeddings
+            self.normalized_embeddings = embeddings
+            return self.embeddings
 
         return self.build_embeddings(documents)
 
     def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        return self.search_batch([query], limit)[0]
+
+    def search_batch(
+        self, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT
+    ) -> list[list[dict]]:
+        """Search for several queries with one encode and blocked matmuls
+
+        Args:
+            queries: Search queries
+            limit: Results per query
+
+        Returns:
+            Results for every query, in query order
+        """
         if self.embeddings is None or self.embeddings.size == 0:
             raise ValueError(
                 "No embeddings loaded. Call `load_or_create_embeddings` first."
@@ -68,37 +158,29 @@ class SemanticSearch:
                 "No documents loaded. Call `load_or_create_embeddings` first."
             )
 
-        query_embedding = self.generate_embedding(query)
-
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((similarity, self.documents[i]))
-
-        similarities.sort(key=lambda x: x[0], reverse=True)
-
+        if not queries:
+            return []
+        query_embeddings = normalize_rows(self.generate_embeddings(queries))
         results = []
-        for score, doc in similarities[:limit]:
-            results.append(
-                {
-                    "score": score,
-                    "title": doc["title"],
-                    "description": doc["description"],
-                }
-            )
+        for similarities in score_blocks(query_embeddings, self.normalized_embeddings):
+            for row in similarities:
+                query_results = []
+                for i in top_k_indices(row, limit).tolist():
+                    doc = self.documents[i]
+                    query_results.append(
+                        {
+                            "score": float(row[i]),
+                            "title": doc["title"],
+                            "description": doc["description"],
+                        }
+                    )
+                results.append(query_results)
 
         return results
 
 
-def cosine_similarity(vec1, vec2):
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-
-    return dot_product / (norm1 * norm2)
+def movie_texts(documents):
+    return [f"{doc['title']}: {doc['description']}" for doc in documents]
 
 
 def verify_model():
@@ -115,14 +197,24 @@ def embed_text(text):
     print(f"Dimensions: {embedding.shape[0]}")
 
 
-def verify_embeddings():
-    search_instance = SemanticSearch()
+def verify_embeddings(embedding_dtype=None, workers=1):
+    search_instance = SemanticSearch(embedding_dtype=embedding_dtype, workers=workers)
     documents = load_movies()
-    embeddings = search_instance.load_or_create_embeddings(documents)
+    try:
+        embeddings = search_instance.load_or_create_embeddings(documents)
+    finally:
+        search_instance.encoder.close()
     print(f"Number of docs:   {len(documents)}")
     print(
         f"Embeddings shape: {embeddings.shape[0]} vectors in {embeddings.shape[1]} dimensions"
     )
+    print(f"Stored as:        {embeddings.dtype} ({embeddings.nbytes / 1024:.1f} KiB)")
+    encoder = search_instance.encoder
+    if encoder.texts:
+        print(
+            f"Encoded:          {encoder.texts} movies at "
+            f"{encoder.texts_per_second:.1f} texts/s (batch size {encoder.batch_size})"
+        )
 
 
 def embed_query_text(query):
@@ -229,11 +321,97 @@ def semantic_chunk_text(
         print(f"{i + 1}. {chunk}")
 
 
+def iter_chunks(documents: list[dict]) -> Iterator[tuple[int, int, int, str]]:
+    """Yield (movie_idx, chunk_idx, total_chunks, text) for every chunk
+
+    Movie descriptions are split with semantic_chunk one at a time, so
+    only one movie's chunks are held in memory.
+    """
+    for idx, doc in enumerate(documents):
+        text = doc.get("description", "")
+        if not text.strip():
+            continue
+
+        chunks = semantic_chunk(
+            text,
+            max_chunk_size=DEFAULT_SEMANTIC_CHUNK_SIZE,
+            overlap=DEFAULT_CHUNK_OVERLAP,
+        )
+        for i, chunk in enumerate(chunks):
+            yield idx, i, len(chunks), chunk
+
+
+def collect_chunks(
+    documents: list[dict], key: Callable[[str], str]
+) -> tuple[list[str], dict[str, np.ndarray]]:
+    """Split every movie description into semantic chunks
+
+    Args:
+        documents: Movies, in the order their chunks are emitted
+        key: Applied to each chunk text to get the value kept for it
+
+    Returns:
+        (keys, metadata): metadata holds one int64 column per field
+        (movie_idx, chunk_idx, total_chunks, doc_id), one row per chunk;
+        each movie's chunks are contiguous
+    """
+    keys = []
+    columns = ([], [], [])
+    for *fields, text in iter_chunks(documents):
+        keys.append(key(text))
+        for column, value in zip(columns, fields):
+            column.append(value)
+
+    movie_idx, chunk_idx, total_chunks = (
+        np.array(column, dtype=np.int64) for column in columns
+    )
+    doc_ids = np.array([doc["id"] for doc in documents], dtype=np.int64)
+    metadata = {
+        "movie_idx": movie_idx,
+        "chunk_idx": chunk_idx,
+        "total_chunks": total_chunks,
+        "doc_id": doc_ids[movie_idx],
+    }
+    return keys, metadata
+
+
+def chunk_documents(
+    documents: list[dict],
+) -> tuple[list[str], dict[str, np.ndarray]]:
+    # texts kept in memory, for callers that need them all at once
+    return collect_chunks(documents, str)
+
+
+def hash_chunks(documents: list[dict]) -> tuple[list[str], dict[str, np.ndarray]]:
+    # content hashes instead of texts, so no chunk text outlives its movie
+    return collect_chunks(documents, content_hash)
+
+
+def save_chunk_metadata(path: str, metadata: dict[str, np.ndarray]) -> None:
+    buffer = io.BytesIO()
+    np.savez(buffer, **metadata)
+    save_index(path, buffer.getvalue())
+
+
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        embedding_dtype: str | None = None,
+        query_cache: QueryEmbeddingCache | None = None,
+        workers: int = 1,
+        device: str | None = None,
+    ) -> None:
+        super().__init__(model_name, embedding_dtype, query_cache, workers, device)
         self.chunk_embeddings = None
+        self.normalized_chunk_embeddings = None
         self.chunk_metadata = None
+        # movies that have chunks, and where each one's chunk rows start
+        self.chunk_movies = None
+        self.chunk_starts = None
+        # approximate indexes over normalized_chunk_embeddings by backend
+        # name; each has search(query, k) -> (rows, scores)
+        self.ann_indexes = {}
 
     def build_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
         self.documents = documents
@@ -242,90 +420,326 @@ class ChunkedSemanticSearch(SemanticSearch):
         for doc in documents:
             self.document_map[doc["id"]] = doc
 
-        all_chunks = []
-        chunk_metadata = []
-
-        for idx, doc in enumerate(documents):
-            text = doc.get("description", "")
-            if not text.strip():
-                continue
-
-            chunks = semantic_chunk(
-                text,
-                max_chunk_size=DEFAULT_SEMANTIC_CHUNK_SIZE,
-                overlap=DEFAULT_CHUNK_OVERLAP,
-            )
-
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
-                chunk_metadata.append(
-                    {"movie_idx": idx, "chunk_idx": i, "total_chunks": len(chunks)}
-                )
-
-        self.chunk_embeddings = self.model.encode(all_chunks, show_progress_bar=True)
-        self.chunk_metadata = chunk_metadata
-
-        os.makedirs(os.path.dirname(CHUNK_EMBEDDINGS_PATH), exist_ok=True)
-        np.save(CHUNK_EMBEDDINGS_PATH, self.chunk_embeddings)
-        with open(CHUNK_METADATA_PATH, "w") as f:
-            json.dump(
-                {"chunks": chunk_metadata, "total_chunks": len(all_chunks)}, f, indent=2
-            )
+        # two passes over the chunks: hashes and metadata first, which size
+        # the output file, then the texts, streamed into the model in
+        # batches. Identical chunk texts are encoded once, unchanged ones
+        # not at all
+        hashes, chunk_metadata = hash_chunks(documents)
+        self.chunk_embeddings = update_embeddings(
+            self.encoder,
+            self.model_name,
+            (text for *_, text in iter_chunks(documents)),
+            CHUNK_EMBEDDINGS_PATH,
+            CHUNK_EMBEDDINGS_MANIFEST_PATH,
+            self.embedding_dtype,
+            hashes=hashes,
+        )
+        self.__set_chunk_metadata(chunk_metadata)
+        save_chunk_metadata(CHUNK_METADATA_PATH, chunk_metadata)
 
         return self.chunk_embeddings
 
-    def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
+    def load_chunk_embeddings(self, documents: list[dict]) -> np.ndarray | None:
+        """Load the cached chunk embeddings of documents, never encoding
+
+        Returns:
+            The embeddings, or None (and nothing loaded) if the cache is
+            missing or was built from other texts, model or dtype
+        """
+        # chunking is cheap and deterministic, so the metadata is recomputed
+        # and the manifest decides whether the cached vectors still match
+        hashes, chunk_metadata = hash_chunks(documents)
+        chunk_embeddings = load_embeddings(
+            CHUNK_EMBEDDINGS_PATH,
+            CHUNK_EMBEDDINGS_MANIFEST_PATH,
+            self.model_name,
+            hashes,
+            self.embedding_dtype,
+        )
+        if chunk_embeddings is None:
+            return None
+
         self.documents = documents
         self.document_map = {}
         for doc in documents:
             self.document_map[doc["id"]] = doc
+        self.chunk_embeddings = chunk_embeddings
+        self.__set_chunk_metadata(chunk_metadata)
+        return self.chunk_embeddings
 
-        if os.path.exists(CHUNK_EMBEDDINGS_PATH) and os.path.exists(
-            CHUNK_METADATA_PATH
-        ):
-            self.chunk_embeddings = np.load(CHUNK_EMBEDDINGS_PATH)
-            with open(CHUNK_METADATA_PATH, "r") as f:
-                data = json.load(f)
-                self.chunk_metadata = data["chunks"]
-            return self.chunk_embeddings
+    def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
+        chunk_embeddings = self.load_chunk_embeddings(documents)
+        if chunk_embeddings is not None:
+            return chunk_embeddings
 
         return self.build_chunk_embeddings(documents)
 
-    def search_chunks(self, query: str, limit: int = 10) -> list[dict]:
-        if self.chunk_embeddings is None or self.chunk_metadata is None:
+    def __set_chunk_metadata(self, chunk_metadata: dict[str, np.ndarray]) -> None:
+        self.chunk_metadata = chunk_metadata
+        # chunk_documents emits each movie's chunks contiguously
+        self.chunk_movies, self.chunk_starts = np.unique(
+            chunk_metadata["movie_idx"], return_index=True
+        )
+        # cached rows are unit length already
+        self.normalized_chunk_embeddings = self.chunk_embeddings
+        self.ann_indexes = {}
+
+    def load_or_create_ivf_index(
+        self, n_lists: int | None = None, nprobe: int = DEFAULT_IVF_NPROBE
+    ) -> IVFIndex:
+        """Load the IVF index of the chunk embeddings, rebuilding it if stale
+
+        The index is rebuilt when the chunk embeddings changed since it was
+        saved, or when n_lists is given and differs from the saved one.
+
+        Args:
+            n_lists: Number of k-means lists (default: from the chunk count)
+            nprobe: Lists scanned per query
+
+        Returns:
+            The index, also used by the "ivf" search backend
+        """
+        if self.normalized_chunk_embeddings is None:
             raise ValueError(
                 "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
             )
-
-        query_embedding = self.generate_embedding(query)
-
-        chunk_scores = []
-        for i, chunk_embedding in enumerate(self.chunk_embeddings):
-            similarity = cosine_similarity(query_embedding, chunk_embedding)
-            chunk_scores.append(
-                {
-                    "chunk_idx": i,
-                    "movie_idx": self.chunk_metadata[i]["movie_idx"],
-                    "score": similarity,
-                }
+        fingerprint = manifest_fingerprint(CHUNK_EMBEDDINGS_MANIFEST_PATH) or ""
+        index = None
+        if os.path.exists(CHUNK_IVF_PATH):
+            index = IVFIndex.load(CHUNK_IVF_PATH, self.normalized_chunk_embeddings)
+            if index.fingerprint != fingerprint or (
+                n_lists is not None and index.n_lists != n_lists
+            ):
+                index = None
+        if index is None:
+            index = IVFIndex.build(
+                self.normalized_chunk_embeddings, n_lists, fingerprint
             )
-
-        movie_scores = {}
-        for chunk_score in chunk_scores:
-            movie_idx = chunk_score["movie_idx"]
+            index.save(CHUNK_IVF_PATH)
+        index.nprobe = nprobe
+        self.ann_indexes["ivf"] = index
+        return index
+
+    def load_or_create_hnsw_index(
+        self,
+        m: int | None = None,
+        ef_construction: int | None = None,
+        ef_search: int = DEFAULT_HNSW_EF_SEARCH,
+    ) -> HNSWIndex:
+        """Load the HNSW graph of the chunk embeddings, extending it if needed
+
+        Chunks appended since the graph was saved (e.g. new movies at the
+        end of the dataset) are inserted into it. Any other change to the
+        embeddings, or an m/ef_construction different from the saved
+        graph's, rebuilds it from scratch.
+
+        Args:
+            m: Links per node (default: the saved graph's, else HNSW_M)
+            ef_construction: Search width while inserting (default: the
+                saved graph's, else HNSW_EF_CONSTRUCTION)
+            ef_search: Search width for queries
+
+        Returns:
+            The graph, also used by the "hnsw" search backend
+        """
+        vectors = self.normalized_chunk_embeddings
+        if vectors is None:
+            raise ValueError(
+                "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
+            )
+        index = None
+        if os.path.exists(CHUNK_HNSW_PATH):
+            index = HNSWIndex.load(CHUNK_HNSW_PATH, vectors)
+            prefix = manifest_fingerprint(CHUNK_EMBEDDINGS_MANIFEST_PATH, index.size)
             if (
-                movie_idx not in movie_scores
-                or chunk_score["score"] > movie_scores[movie_idx]
+                index.size > len(vectors)
+                or index.fingerprint != prefix
+                or m not in (None, index.m)
+                or ef_construction not in (None, index.ef_construction)
+            ):
+                index = None
+        if index is None:
+            index = HNSWIndex(
+                vectors, m or HNSW_M, ef_construction or HNSW_EF_CONSTRUCTION
+            )
+        if index.size < len(vectors):
+            index.insert_rows(len(vectors))
+            index.fingerprint = manifest_fingerprint(CHUNK_EMBEDDINGS_MANIFEST_PATH)
+            index.save(CHUNK_HNSW_PATH)
+        index.ef_search = ef_search
+        self.ann_indexes["hnsw"] = index
+        return index
+
+    def load_or_create_pq_index(
+        self, n_subspaces: int | None = None, rescore: int = DEFAULT_PQ_RESCORE
+    ) -> PQIndex:
+        """Load the PQ codes of the chunk embeddings, rebuilding them if stale
+
+        Candidates are re-scored from the memory-mapped chunk embeddings,
+        so only their rows are read.
+
+        Args:
+            n_subspaces: Slices per vector (default: the saved index's, else
+                PQ_SUBSPACES)
+            rescore: Candidates re-scored exactly; 0 ranks by the estimates
+
+        Returns:
+            The index, also used by the "pq" search backend
+        """
+        if self.normalized_chunk_embeddings is None:
+            raise ValueError(
+                "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
+            )
+        fingerprint = manifest_fingerprint(CHUNK_EMBEDDINGS_MANIFEST_PATH) or ""
+        index = None
+        if os.path.exists(CHUNK_PQ_PATH):
+            index = PQIndex.load(CHUNK_PQ_PATH)
+            if index.fingerprint != fingerprint or n_subspaces not in (
+                None,
+                index.n_subspaces,
             ):
-                movie_scores[movie_idx] = chunk_score["score"]
+                index = None
+        if index is None:
+            index = PQIndex.build(
+                self.normalized_chunk_embeddings,
+                n_subspaces or PQ_SUBSPACES,
+                fingerprint,
+            )
+            index.save(CHUNK_PQ_PATH)
+        index.vectors = self.chunk_embeddings
+        index.rescore = rescore
+        self.ann_indexes["pq"] = index
+        return index
+
+    def create_binary_index(
+        self, candidates: int = DEFAULT_BINARY_CANDIDATES
+    ) -> BinaryIndex:
+        """Pack the signs of the chunk embeddings for the "binary" backend
+
+        Packing takes one pass over the embeddings, so it is not cached.
+
+        Args:
+            candidates: Hamming-nearest chunks re-scored per query
+
+        Returns:
+            The index, also used by the "binary" search backend
+        """
+        if self.normalized_chunk_embeddings is None:
+            raise ValueError(
+                "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
+            )
+        index = BinaryIndex(self.normalized_chunk_embeddings, candidates)
+        self.ann_indexes["binary"] = index
+        return index
+
+    def load_or_create_ann_index(self, backend: str, **settings):
+        """Load the index of an approximate backend and tune it
+
+        An index this searcher has already loaded is reused, so a resident
+        searcher only reads it once.
+
+        Args:
+            backend: "ivf", "hnsw", "pq" or "binary"
+            **settings: Index attributes to set, e.g. nprobe or ef_search
+
+        Returns:
+            The index
+        """
+        index = self.ann_indexes.get(backend)
+        if index is None:
+            match backend:
+                case "ivf":
+                    index = self.load_or_create_ivf_index()
+                case "hnsw":
+                    index = self.load_or_create_hnsw_index()
+                case "pq":
+                    index = self.load_or_create_pq_index()
+                case "binary":
+                    index = self.create_binary_index()
+                case _:
+                    raise ValueError(f"Unknown search backend: {backend}")
+        for name, value in settings.items():
+            setattr(index, name, value)
+        return index
+
+    def search_chunks(
+        self, query: str, limit: int = 10, backend: str = "exact"
+    ) -> list[dict]:
+        return self.search_chunks_batch([query], limit, backend)[0]
+
+    def search_chunks_batch(
+        self, queries: list[str], limit: int = 10, backend: str = "exact"
+    ) -> list[list[dict]]:
+        """Chunked search for several queries with one encode
+
+        Args:
+            queries: Search queries
+            limit: Movies per query
+            backend: "exact" scores every chunk; any other name searches the
+                approximate index loaded for it
+
+        Returns:
+            Results for every query, in query order
+        """
+        if self.chunk_embeddings is None or self.chunk_metadata is None:
+            raise ValueError(
+                "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
+            )
+        if not queries or len(self.chunk_starts) == 0:
+            return [[] for _ in queries]
+        query_embeddings = self.generate_embeddings(queries)
+        return self.search_chunk_embeddings(query_embeddings, limit, backend)
+
+    def search_chunk_embeddings(
+        self, query_embeddings: np.ndarray, limit: int = 10, backend: str = "exact"
+    ) -> list[list[dict]]:
+        """search_chunks_batch for queries that are already encoded"""
+        if backend != "exact" and backend not in self.ann_indexes:
+            raise ValueError(
+                f"No {backend} index loaded. Call load_or_create_{backend}_index first."
+            )
+        if len(query_embeddings) == 0 or len(self.chunk_starts) == 0:
+            return [[] for _ in query_embeddings]
+        query_embeddings = normalize_rows(query_embeddings)
 
-        sorted_movies = sorted(movie_scores.items(), key=lambda x: x[1], reverse=True)
+        results = []
+        if backend != "exact":
+            index = self.ann_indexes[backend]
+            for query_embedding in query_embeddings:
+                rows, scores = index.search(
+                    query_embedding, limit * ANN_CANDIDATES_PER_RESULT
+                )
+                movies, movie_scores = self.__best_movies(rows, scores, limit)
+                results.append(self.__movie_results(movies, movie_scores))
+            return results
+
+        for chunk_scores in score_blocks(
+            query_embeddings, self.normalized_chunk_embeddings
+        ):
+            # best chunk per movie; movies without chunks never make the list
+            movie_scores = np.maximum.reduceat(chunk_scores, self.chunk_starts, axis=1)
+            for row in movie_scores:
+                top = top_k_indices(row, limit)
+                results.append(self.__movie_results(top, row[top]))
+
+        return results
 
+    def __best_movies(
+        self, rows: np.ndarray, scores: np.ndarray, limit: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # best candidate chunk per movie, ranked like the exact search
+        movies = np.searchsorted(self.chunk_starts, rows, side="right") - 1
+        candidates, inverse = np.unique(movies, return_inverse=True)
+        best = np.full(len(candidates), -np.inf, dtype=np.float32)
+        np.maximum.at(best, inverse, scores)
+        top = top_k_indices(best, limit)
+        return candidates[top], best[top]
+
+    def __movie_results(self, movies: np.ndarray, scores: np.ndarray) -> list[dict]:
+        # movies index chunk_movies, i.e. the movies that have chunks
         results = []
-        for movie_idx, score in sorted_movies[:limit]:
-            if movie_idx is None:
-                continue
-            doc = self.documents[movie_idx]
+        for i, score in zip(movies.tolist(), scores.tolist()):
+            doc = self.documents[int(self.chunk_movies[i])]
             results.append(
                 format_search_result(
                     doc_id=doc["id"],
@@ -334,19 +748,170 @@ class ChunkedSemanticSearch(SemanticSearch):
                     score=score,
                 )
             )
-
         return results
 
 
-def embed_chunks_command() -> np.ndarray:
+def recall_queries(documents: list[dict], count: int = RECALL_QUERY_COUNT) -> list[str]:
+    # golden dataset queries topped up with a fixed sample of movie titles
+    queries = [case["query"] for case in load_golden_dataset()["test_cases"]]
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(documents), min(count, len(documents)), replace=False)
+    queries.extend(documents[i]["title"] for i in picks.tolist())
+    return queries[:count]
+
+
+def ann_recall(
+    searcher: ChunkedSemanticSearch,
+    backend: str,
+    queries: list[str],
+    limit: int,
+    settings: list[dict],
+) -> dict:
+    """Recall@limit and latency of an approximate backend against exact search
+
+    Args:
+        searcher: Searcher with chunk embeddings and the backend's index loaded
+        backend: Name of the approximate backend
+        queries: Queries to evaluate
+        limit: Movies per query, the k of recall@k
+        settings: Attribute values to set on the index for each run, e.g.
+            [{"nprobe": 1}, {"nprobe": 8}]
+
+    Returns:
+        Exact search latency and one entry per settings with recall and
+        latency
+    """
+    # encode once so only the search itself is timed
+    embeddings = searcher.generate_embeddings(queries)
+
+    start = time.perf_counter()
+    exact = searcher.search_chunk_embeddings(embeddings, limit)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    index = searcher.ann_indexes[backend]
+    runs = []
+    for setting in settings:
+        for name, value in setting.items():
+            setattr(index, name, value)
+        start = time.perf_counter()
+        approx = searcher.search_chunk_embeddings(embeddings, limit, backend)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recalls = []
+        for exact_results, approx_results in zip(exact, approx):
+            expected = {r["id"] for r in exact_results}
+            found = {r["id"] for r in approx_results}
+            if expected:
+                recalls.append(len(expected & found) / len(expected))
+        runs.append(
+            {
+                "settings": setting,
+                "recall": float(np.mean(recalls)) if recalls else 1.0,
+                "ms_per_query": ms,
+            }
+        )
+    return {"queries": len(queries), "exact_ms_per_query": exact_ms, "runs": runs}
+
+
+def embed_chunks_command(embedding_dtype: str | None = None, workers: int = 1) -> dict:
+    movies = load_movies()
+    searcher = ChunkedSemanticSearch(embedding_dtype=embedding_dtype, workers=workers)
+    try:
+        embeddings = searcher.load_or_create_chunk_embeddings(movies)
+    finally:
+        searcher.encoder.close()
+    return {
+        "embeddings": embeddings,
+        "encoded": searcher.encoder.texts,
+        "batch_size": searcher.encoder.batch_size,
+        "chunks_per_second": searcher.encoder.texts_per_second,
+    }
+
+
+def calibrate_command(batch_sizes: list[int] = CALIBRATION_BATCH_SIZES) -> dict:
+    searcher = SemanticSearch()
+    chunks, _ = chunk_documents(load_movies())
+    return calibrate_batch_size(
+        searcher.model, searcher.model_name, chunks, batch_sizes
+    )
+
+
+def search_chunked_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    backend: str = "exact",
+    searcher: ChunkedSemanticSearch | None = None,
+    **index_settings,
+) -> dict:
+    if searcher is None:
+        searcher = ChunkedSemanticSearch()
+        searcher.load_or_create_chunk_embeddings(load_movies())
+    if backend != "exact":
+        searcher.load_or_create_ann_index(backend, **index_settings)
+    results = searcher.search_chunks(query, limit, backend)
+    return {"query": query, "results": results}
+
+
+def build_ivf_command(n_lists: int | None = None) -> IVFIndex:
     movies = load_movies()
     searcher = ChunkedSemanticSearch()
-    return searcher.load_or_create_chunk_embeddings(movies)
+    searcher.load_or_create_chunk_embeddings(movies)
+    return searcher.load_or_create_ivf_index(n_lists)
 
 
-def search_chunked_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
+def build_hnsw_command(
+    m: int | None = None, ef_construction: int | None = None
+) -> HNSWIndex:
     movies = load_movies()
     searcher = ChunkedSemanticSearch()
     searcher.load_or_create_chunk_embeddings(movies)
-    results = searcher.search_chunks(query, limit)
-    return {"query": query, "results": results}
+    return searcher.load_or_create_hnsw_index(m, ef_construction)
+
+
+def build_pq_command(n_subspaces: int | None = None) -> dict:
+    movies = load_movies()
+    searcher = ChunkedSemanticSearch()
+    searcher.load_or_create_chunk_embeddings(movies)
+    index = searcher.load_or_create_pq_index(n_subspaces)
+    return {
+        "chunks": index.codes.shape[1],
+        "subspaces": index.n_subspaces,
+        "pq_bytes": index.nbytes,
+        "embedding_bytes": searcher.chunk_embeddings.nbytes,
+    }
+
+
+def ann_recall_command(
+    backend: str, settings: list[dict], limit: int = DEFAULT_SEARCH_LIMIT
+) -> dict:
+    movies = load_movies()
+    searcher = ChunkedSemanticSearch()
+    searcher.load_or_create_chunk_embeddings(movies)
+    searcher.load_or_create_ann_index(backend)
+    return ann_recall(searcher, backend, recall_queries(movies), limit, settings)
+
+
+def search_chunked_batch_command(
+    queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT
+) -> dict:
+    movies = load_movies()
+    searcher = ChunkedSemanticSearch()
+    searcher.load_or_create_chunk_embeddings(movies)
+    if not queries:
+        queries = [case["query"] for case in load_golden_dataset()["test_cases"]]
+    start = time.perf_counter()
+    results = searcher.search_chunks_batch(queries, limit)
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": queries,
+        "results": results,
+        "seconds": elapsed,
+        "queries_per_second": len(queries) / elapsed if elapsed > 0 else 0.0,
+        "query_cache": searcher.query_cache.stats(),
+    }
+
+
+def query_cache_command(clear: bool = False) -> dict:
+    cache = get_query_cache()
+    if clear:
+        cache.clear()
+    return cache.stats()
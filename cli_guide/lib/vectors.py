@@ -0,0 +1,49 @@
+import numpy as np
+
+from .search_utils import EMBEDDING_BLOCK_ROWS, SCORE_BLOCK_SIZE
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale vectors (or a single vector) to unit length as float32
+
+    Zero vectors stay zero, so their cosine similarity with anything is 0.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def score_blocks(queries: np.ndarray, matrix: np.ndarray):
+    """Yield queries @ matrix.T as float32, a block of queries at a time
+
+    Blocks hold at most SCORE_BLOCK_SIZE scores so memory stays bounded
+    however many queries are searched at once. Both arrays are read
+    EMBEDDING_BLOCK_ROWS rows at a time and up-cast per block, so either
+    can be a memory-mapped or float16 array without being copied whole.
+    """
+    rows_per_block = max(1, SCORE_BLOCK_SIZE // max(len(matrix), 1))
+    for start in range(0, len(queries), rows_per_block):
+        block = np.asarray(queries[start : start + rows_per_block], dtype=np.float32)
+        scores = np.empty((len(block), len(matrix)), dtype=np.float32)
+        for row in range(0, len(matrix), EMBEDDING_BLOCK_ROWS):
+            rows = matrix[row : row + EMBEDDING_BLOCK_ROWS]
+            scores[:, row : row + len(rows)] = block @ rows.astype(np.float32).T
+        yield scores
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, ties in index order
+
+    Uses argpartition and only sorts the candidates; every index tied with
+    the k-th score is kept as a candidate so the result equals a stable
+    descending sort of all scores.
+    """
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
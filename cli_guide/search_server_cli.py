@@ -0,0 +1,38 @@
+import argparse
+
+from lib.model_registry import get_model_registry
+from lib.search_server import SearchService, create_server
+from lib.search_utils import SEARCH_SERVER_HOST, SEARCH_SERVER_PORT
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Keep the searchers loaded and answer CLI --server requests"
+    )
+    parser.add_argument(
+        "--host", type=str, default=SEARCH_SERVER_HOST, help="Address to listen on"
+    )
+    parser.add_argument(
+        "--port", type=int, default=SEARCH_SERVER_PORT, help="Port to listen on"
+    )
+
+    args = parser.parse_args()
+    service = SearchService()
+    server = create_server(service, args.host, args.port)
+    print(
+        f"Search server listening on http://{args.host}:{args.port} "
+        f"(loaded in {service.startup_seconds:.1f}s)"
+    )
+    for model in get_model_registry().footprint():
+        size = "?" if model["bytes"] is None else f"{model['bytes'] / 2**20:.1f} MiB"
+        print(f"  {model['kind']} {model['model']} on {model['device']}: {size}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,28 @@
 
 import argparse
 
+from lib.search_client import call_server
+from lib.search_utils import (
+    CALIBRATION_BATCH_SIZES,
+    CHUNK_SEARCH_BACKENDS,
+    DEFAULT_BINARY_CANDIDATES,
+    DEFAULT_HNSW_EF_SEARCH,
+    DEFAULT_IVF_NPROBE,
+    DEFAULT_PQ_RESCORE,
+    EMBEDDING_DTYPES,
+)
 from lib.semantic_search import (
+    ann_recall_command,
+    build_hnsw_command,
+    build_ivf_command,
+    build_pq_command,
+    calibrate_command,
     chunk_text,
     embed_chunks_command,
     embed_query_text,
     embed_text,
+    query_cache_command,
+    search_chunked_batch_command,
     search_chunked_command,
     semantic_chunk_text,
     semantic_search,
@@ -15,6 +32,17 @@ from lib.semantic_search import (
 )
 
 
+def print_recall_report(report: dict) -> None:
+    print(f"{report['queries']} queries")
+    print(f"exact: {report['exact_ms_per_query']:.3f} ms/query")
+    for run in report["runs"]:
+        settings = ", ".join(f"{k}={v}" for k, v in run["settings"].items())
+        print(
+            f"{settings}: recall@k {run['recall']:.3f}, "
+            f"{run['ms_per_query']:.3f} ms/query"
+        )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Semantic Search CLI")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
@@ -26,9 +54,21 @@ def main() -> None:
     )
     single_embed_parser.add_argument("text", type=str, help="Text to embed")
 
-    subparsers.add_parser(
+    verify_embeddings_parser = subparsers.add_parser(
         "verify_embeddings", help="Verify embeddings for the movie dataset"
     )
+    verify_embeddings_parser.add_argument(
+        "--dtype",
+        choices=EMBEDDING_DTYPES,
+        default=None,
+        help="Rewrite the cache in this format (default: keep the current one)",
+    )
+    verify_embeddings_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Encode in this many processes, one model each",
+    )
 
     embed_query_parser = subparsers.add_parser(
         "embedquery", help="Generate an embedding for a search query"
@@ -74,9 +114,33 @@ def main() -> None:
         help="Number of sentences to overlap between chunks",
     )
 
-    subparsers.add_parser(
+    embed_chunks_parser = subparsers.add_parser(
         "embed_chunks", help="Generate embeddings for chunked documents"
     )
+    embed_chunks_parser.add_argument(
+        "--dtype",
+        choices=EMBEDDING_DTYPES,
+        default=None,
+        help="Rewrite the cache in this format (default: keep the current one)",
+    )
+    embed_chunks_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Encode in this many processes, one model each",
+    )
+
+    calibrate_parser = subparsers.add_parser(
+        "calibrate",
+        help="Find the fastest encode batch size on this machine",
+    )
+    calibrate_parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=CALIBRATION_BATCH_SIZES,
+        help="Batch sizes to time",
+    )
 
     search_chunked_parser = subparsers.add_parser(
         "search_chunked", help="Search using chunked embeddings"
@@ -85,6 +149,148 @@ def main() -> None:
     search_chunked_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return"
     )
+    search_chunked_parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Send the request to a running search_server_cli.py",
+    )
+    search_chunked_parser.add_argument(
+        "--backend",
+        choices=CHUNK_SEARCH_BACKENDS,
+        default="exact",
+        help="Score every chunk, or search an approximate index",
+    )
+    search_chunked_parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=DEFAULT_IVF_NPROBE,
+        help="IVF lists scanned per query",
+    )
+    search_chunked_parser.add_argument(
+        "--ef-search",
+        type=int,
+        default=DEFAULT_HNSW_EF_SEARCH,
+        help="HNSW search width",
+    )
+    search_chunked_parser.add_argument(
+        "--rescore",
+        type=int,
+        default=DEFAULT_PQ_RESCORE,
+        help="PQ candidates re-scored from the float vectors (0: none)",
+    )
+    search_chunked_parser.add_argument(
+        "--candidates",
+        type=int,
+        default=DEFAULT_BINARY_CANDIDATES,
+        help="Hamming-nearest chunks re-scored by the binary prefilter",
+    )
+
+    search_chunked_batch_parser = subparsers.add_parser(
+        "search_chunked_batch",
+        help="Search several queries at once using chunked embeddings",
+    )
+    search_chunked_batch_parser.add_argument(
+        "queries",
+        type=str,
+        nargs="*",
+        help="Search queries (default: the golden dataset queries)",
+    )
+    search_chunked_batch_parser.add_argument(
+        "--limit", type=int, default=5, help="Number of results per query"
+    )
+
+    query_cache_parser = subparsers.add_parser(
+        "query_cache", help="Show the size of the query embedding cache"
+    )
+    query_cache_parser.add_argument(
+        "--clear", action="store_true", help="Remove every cached query embedding"
+    )
+
+    build_ivf_parser = subparsers.add_parser(
+        "build_ivf", help="Build the IVF index of the chunk embeddings"
+    )
+    build_ivf_parser.add_argument(
+        "--lists",
+        type=int,
+        default=None,
+        help="Number of k-means lists (default: 4 * sqrt(chunks))",
+    )
+
+    ivf_recall_parser = subparsers.add_parser(
+        "ivf_recall", help="Compare IVF search against exact chunked search"
+    )
+    ivf_recall_parser.add_argument(
+        "--nprobe",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16, 32],
+        help="nprobe values to evaluate",
+    )
+    ivf_recall_parser.add_argument("--limit", type=int, default=5, help="k of recall@k")
+
+    build_hnsw_parser = subparsers.add_parser(
+        "build_hnsw", help="Build or extend the HNSW graph of the chunk embeddings"
+    )
+    build_hnsw_parser.add_argument(
+        "--m", type=int, default=None, help="Links per node (default: 16)"
+    )
+    build_hnsw_parser.add_argument(
+        "--ef-construction",
+        type=int,
+        default=None,
+        help="Search width while inserting (default: 200)",
+    )
+
+    hnsw_recall_parser = subparsers.add_parser(
+        "hnsw_recall", help="Compare HNSW search against exact chunked search"
+    )
+    hnsw_recall_parser.add_argument(
+        "--ef-search",
+        type=int,
+        nargs="+",
+        default=[8, 16, 32, 64, 128],
+        help="ef_search values to evaluate",
+    )
+    hnsw_recall_parser.add_argument(
+        "--limit", type=int, default=5, help="k of recall@k"
+    )
+
+    build_pq_parser = subparsers.add_parser(
+        "build_pq", help="Build the product-quantized chunk embeddings"
+    )
+    build_pq_parser.add_argument(
+        "--subspaces",
+        type=int,
+        default=None,
+        help="Slices per vector; must divide the dimension (default: 48)",
+    )
+
+    pq_recall_parser = subparsers.add_parser(
+        "pq_recall", help="Compare PQ search against exact chunked search"
+    )
+    pq_recall_parser.add_argument(
+        "--rescore",
+        type=int,
+        nargs="+",
+        default=[0, 50, 200, 1000],
+        help="Re-scored candidate counts to evaluate",
+    )
+    pq_recall_parser.add_argument("--limit", type=int, default=5, help="k of recall@k")
+
+    binary_recall_parser = subparsers.add_parser(
+        "binary_recall",
+        help="Compare the sign-bit prefilter against exact chunked search",
+    )
+    binary_recall_parser.add_argument(
+        "--candidates",
+        type=int,
+        nargs="+",
+        default=[25, 50, 100, 200, 500],
+        help="Re-scored candidate counts to evaluate",
+    )
+    binary_recall_parser.add_argument(
+        "--limit", type=int, default=5, help="k of recall@k"
+    )
 
     args = parser.parse_args()
 
@@ -94,7 +300,7 @@ def main() -> None:
         case "embed_text":
             embed_text(args.text)
         case "verify_embeddings":
-            verify_embeddings()
+            verify_embeddings(args.dtype, args.workers)
         case "embedquery":
             embed_query_text(args.query)
         case "search":
@@ -104,15 +310,97 @@ def main() -> None:
         case "semantic_chunk":
             semantic_chunk_text(args.text, args.max_chunk_size, args.overlap)
         case "embed_chunks":
-            embeddings = embed_chunks_command()
-            print(f"Generated {len(embeddings)} chunked embeddings")
+            build = embed_chunks_command(args.dtype, args.workers)
+            embeddings = build["embeddings"]
+            print(
+                f"Generated {len(embeddings)} chunked embeddings "
+                f"({embeddings.dtype}, {embeddings.nbytes / 1024:.1f} KiB)"
+            )
+            if build["encoded"]:
+                print(
+                    f"Encoded {build['encoded']} chunks at "
+                    f"{build['chunks_per_second']:.1f} chunks/s "
+                    f"(batch size {build['batch_size']})"
+                )
+        case "calibrate":
+            result = calibrate_command(args.batch_sizes)
+            for batch_size, rate in result["texts_per_second"].items():
+                print(f"batch size {batch_size}: {rate:.1f} chunks/s")
+            print(
+                f"Using batch size {result['batch_size']} on {result['cpu_count']} CPUs"
+            )
         case "search_chunked":
-            result = search_chunked_command(args.query, args.limit)
+            index_settings = {
+                "ivf": {"nprobe": args.nprobe},
+                "hnsw": {"ef_search": args.ef_search},
+                "pq": {"rescore": args.rescore},
+                "binary": {"candidates": args.candidates},
+            }.get(args.backend, {})
+            params = {"query": args.query, "limit": args.limit, "backend": args.backend}
+            if args.server:
+                result = call_server("search_chunked", params | index_settings)
+            else:
+                result = search_chunked_command(**params, **index_settings)
             print(f"Query: {result['query']}")
             print("Results:")
             for i, res in enumerate(result["results"], 1):
                 print(f"\n{i}. {res['title']} (score: {res['score']:.4f})")
                 print(f"   {res['document']}...")
+        case "search_chunked_batch":
+            batch = search_chunked_batch_command(args.queries, args.limit)
+            for query, results in zip(batch["queries"], batch["results"]):
+                print(f"\nQuery: {query}")
+                for i, res in enumerate(results, 1):
+                    print(f"{i}. {res['title']} (score: {res['score']:.4f})")
+            print(
+                f"\nSearched {len(batch['queries'])} queries in "
+                f"{batch['seconds'] * 1000:.1f}ms "
+                f"({batch['queries_per_second']:.1f} queries/s)"
+            )
+            cache = batch["query_cache"]
+            print(
+                f"Query cache: {cache['memory_hits']} memory hits, "
+                f"{cache['disk_hits']} disk hits, {cache['misses']} misses"
+            )
+        case "query_cache":
+            stats = query_cache_command(args.clear)
+            print(
+                f"Query cache: {stats['memory_entries']} in memory, "
+                f"{stats['disk_entries']} on disk"
+            )
+        case "build_ivf":
+            index = build_ivf_command(args.lists)
+            sizes = index.list_indptr[1:] - index.list_indptr[:-1]
+            print(
+                f"IVF index: {len(index.list_rows)} chunks in {index.n_lists} lists "
+                f"(sizes {sizes.min()}-{sizes.max()})"
+            )
+        case "ivf_recall":
+            settings = [{"nprobe": nprobe} for nprobe in args.nprobe]
+            print_recall_report(ann_recall_command("ivf", settings, args.limit))
+        case "build_hnsw":
+            index = build_hnsw_command(args.m, args.ef_construction)
+            print(
+                f"HNSW graph: {index.size} chunks, {index.max_level + 1} layers, "
+                f"m={index.m}, ef_construction={index.ef_construction}"
+            )
+        case "hnsw_recall":
+            settings = [{"ef_search": ef} for ef in args.ef_search]
+            print_recall_report(ann_recall_command("hnsw", settings, args.limit))
+        case "build_pq":
+            stats = build_pq_command(args.subspaces)
+            print(
+                f"PQ codes: {stats['chunks']} chunks x {stats['subspaces']} bytes, "
+                f"{stats['pq_bytes'] / 1024:.1f} KiB with codebooks vs "
+                f"{stats['embedding_bytes'] / 1024:.1f} KiB embeddings "
+                f"({stats['embedding_bytes'] / stats['pq_bytes']:.1f}x smaller)"
+            )
+        case "pq_recall":
+            settings = [{"rescore": rescore} for rescore in args.rescore]
+            print_recall_report(ann_recall_command("pq", settings, args.limit))
+        case "binary_recall":
+            settings = [{"candidates": count} for count in args.candidates]
+            print_recall_report(ann_recall_command("binary", settings, args.limit))
         case _:
             parser.print_help()
 
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+from lib import keyword_search
+
+WORDS = [
+    "bear",
+    "forest",
+    "river",
+    "space",
+    "robot",
+    "love",
+    "war",
+    "ship",
+    "island",
+    "detective",
+    "murder",
+    "city",
+    "dragon",
+    "castle",
+    "knight",
+    "school",
+    "family",
+    "storm",
+    "mountain",
+    "pirate",
+]
+
+
+def make_movies(count: int, seed: int = 0) -> list[dict]:
+    # every fifth movie repeats the previous description, so some scores tie
+    rng = random.Random(seed)
+    movies = []
+    for i in range(count):
+        if i % 5 == 4:
+            description = movies[-1]["description"]
+        else:
+            words = rng.choices(WORDS, k=rng.randint(4, 30))
+            description = " ".join(words).capitalize() + "."
+        movies.append(
+            {"id": i + 1, "title": f"Movie {i + 1}", "description": description}
+        )
+    return movies
+
+
+@pytest.fixture
+def movies() -> list[dict]:
+    return make_movies(60)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch, movies: list[dict]) -> list[dict]:
+    """The movies that load_movies returns, indexed under tmp_path
+
+    Changes to the returned list are seen by the next build or update.
+    """
+    monkeypatch.setattr(keyword_search, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(keyword_search, "load_movies", lambda: list(movies))
+    return movies
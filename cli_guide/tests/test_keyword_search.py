@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+from lib.keyword_search import (
+    InvertedIndex,
+    bm25search_command,
+    build_command,
+    merge_command,
+    tokenize_text,
+    update_command,
+)
+
+QUERIES = [
+    "bear",
+    "bear forest river",
+    "robot robot space",
+    "pirate dragon castle knight storm",
+    "zeppelin bear",
+    "zeppelin",
+]
+BM25_PARAMS = [(1.5, 0.75), (2.0, 0.5), (0.5, 1.0)]
+
+
+def edit_corpus(corpus: list[dict]) -> None:
+    # two updates: tombstones end up in the first two of three segments
+    del corpus[2]
+    corpus[9] = {**corpus[9], "description": "A pirate ship in a storm."}
+    corpus.append({"id": 1001, "title": "Bear", "description": "Bear bear bear."})
+    corpus.append({"id": 1002, "title": "Robots", "description": "Space robots."})
+    update_command()
+    del corpus[-1]
+    del corpus[20]
+    corpus.append({"id": 1003, "title": "Zeppelin", "description": "A zeppelin."})
+    update_command()
+
+
+def scores_by_id(idx: InvertedIndex, query: str, k1: float, b: float) -> dict:
+    scores = idx.bm25_scores(tokenize_text(query), k1, b)
+    rows = idx.index_file.live_rows()
+    return dict(zip(idx.doc_ids[rows].tolist(), scores[rows].tolist()))
+
+
+@pytest.mark.parametrize("k1, b", BM25_PARAMS)
+@pytest.mark.parametrize("k", [1, 3, 10, 100])
+def test_top_k_matches_full_scoring(corpus, k, k1, b):
+    idx = InvertedIndex()
+    idx.build()
+    for query in QUERIES:
+        tokens = tokenize_text(query)
+        scores = idx.bm25_scores(tokens, k1, b)
+        # best first, equal scores in row order, no zero scores
+        expected = np.lexsort((np.arange(len(scores)), -scores))[:k]
+        expected = expected[scores[expected] > 0]
+
+        rows, top_scores = idx.bm25_top_k(tokens, k, k1, b)
+        np.testing.assert_array_equal(rows, expected)
+        np.testing.assert_allclose(top_scores, scores[expected], rtol=1e-12)
+
+
+@pytest.mark.parametrize("workers", [2, 3, 7])
+def test_parallel_build_matches_single_process(corpus, workers):
+    single = InvertedIndex()
+    single.build()
+    parallel = InvertedIndex()
+    parallel.build(workers)
+    [single_segment], [parallel_segment] = single.segments, parallel.segments
+    assert bytes(parallel_segment.index_file.buffer) == bytes(
+        single_segment.index_file.buffer
+    )
+
+
+def test_search_for_term_of_deleted_movie(corpus):
+    corpus.append({"id": 1000, "title": "Airship", "description": "A zeppelin."})
+    build_command()
+    corpus.pop()
+    update_command()
+
+    idx = InvertedIndex()
+    idx.load()
+    assert idx.get_documents("zeppelin") == []
+    for k1, b in BM25_PARAMS:
+        results = bm25search_command("zeppelin", 5, k1, b)
+        assert [result["score"] for result in results] == [0.0] * 5
+
+
+def test_merge_matches_fresh_build(corpus):
+    build_command()
+    edit_corpus(corpus)
+    merge_command()
+
+    merged = InvertedIndex()
+    merged.load()
+    [segment] = merged.segments
+    # merged rows keep their order, updated movies after the others
+    corpus[:] = [segment.index_file.document(row) for row in range(len(corpus))]
+    fresh = InvertedIndex()
+    fresh.build()
+    assert bytes(segment.index_file.buffer) == bytes(
+        fresh.segments[0].index_file.buffer
+    )
+
+
+@pytest.mark.parametrize("k1, b", BM25_PARAMS)
+def test_updated_index_matches_rebuild(corpus, k1, b):
+    build_command()
+    edit_corpus(corpus)
+    updated = InvertedIndex()
+    updated.load()
+    assert len(updated.segments) == 3
+    rebuilt = InvertedIndex()
+    rebuilt.build()
+
+    for query in QUERIES + ["pirate ship"]:
+        expected = scores_by_id(rebuilt, query, k1, b)
+        assert scores_by_id(updated, query, k1, b) == pytest.approx(expected)
+        results = bm25search_command(query, 10, k1, b, idx=updated)
+        expected_results = bm25search_command(query, 10, k1, b, idx=rebuilt)
+        assert [result["score"] for result in results] == pytest.approx(
+            [result["score"] for result in expected_results]
+        )
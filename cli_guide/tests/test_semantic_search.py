@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from lib import semantic_search
+from lib.query_cache import QueryEmbeddingCache
+from lib.search_utils import DEFAULT_HNSW_EF_SEARCH
+from lib.semantic_search import ChunkedSemanticSearch, ann_recall
+from lib.vectors import normalize_rows
+
+CHUNK_COUNT = 600
+QUERY_COUNT = 50
+DIMENSIONS = 32
+LIMIT = 5
+
+
+def clustered_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    # unit rows around 16 fixed centers, so nearest neighbors are meaningful
+    centers = np.random.default_rng(1).standard_normal((16, DIMENSIONS))
+    noise = rng.standard_normal((count, DIMENSIONS))
+    rows = centers[rng.integers(len(centers), size=count)] + 0.5 * noise
+    return normalize_rows(rows.astype(np.float32))
+
+
+@pytest.fixture
+def searcher(tmp_path, monkeypatch) -> tuple[ChunkedSemanticSearch, list[str]]:
+    """A searcher over random chunk embeddings, and queries it can embed
+
+    Every movie is one chunk. The query embeddings are put in the query
+    cache up front, so no model is ever loaded.
+    """
+    rng = np.random.default_rng(0)
+    embeddings = clustered_vectors(rng, CHUNK_COUNT)
+    monkeypatch.setattr(semantic_search, "load_embeddings", lambda *_: embeddings)
+    for name in [
+        "CHUNK_EMBEDDINGS_MANIFEST_PATH",
+        "CHUNK_IVF_PATH",
+        "CHUNK_HNSW_PATH",
+        "CHUNK_PQ_PATH",
+    ]:
+        monkeypatch.setattr(semantic_search, name, str(tmp_path / name.lower()))
+
+    movies = [
+        {"id": i, "title": f"Movie {i}", "description": f"Plot {i}."}
+        for i in range(CHUNK_COUNT)
+    ]
+    queries = [f"query {i}" for i in range(QUERY_COUNT)]
+    query_embeddings = clustered_vectors(rng, QUERY_COUNT)
+    query_cache = QueryEmbeddingCache(path=None)
+    query_cache.embed("all-MiniLM-L6-v2", queries, lambda missing: query_embeddings)
+    searcher = ChunkedSemanticSearch(query_cache=query_cache)
+    searcher.load_chunk_embeddings(movies)
+    assert len(searcher.chunk_starts) == CHUNK_COUNT
+    return searcher, queries
+
+
+def recalls(
+    searcher: ChunkedSemanticSearch,
+    backend: str,
+    queries: list[str],
+    settings: list[dict],
+) -> list[float]:
+    report = ann_recall(searcher, backend, queries, LIMIT, settings)
+    return [run["recall"] for run in report["runs"]]
+
+
+def test_ivf_recall(searcher):
+    searcher, queries = searcher
+    index = searcher.load_or_create_ivf_index()
+    settings = [{"nprobe": 1}, {"nprobe": 4}, {"nprobe": index.n_lists}]
+    ivf_recalls = recalls(searcher, "ivf", queries, settings)
+    # more lists scan a superset of the chunks; all of them is exact search
+    assert ivf_recalls == sorted(ivf_recalls)
+    assert ivf_recalls[1] >= 0.9
+    assert ivf_recalls[-1] == 1.0
+
+
+def test_hnsw_recall(searcher):
+    searcher, queries = searcher
+    searcher.load_or_create_hnsw_index()
+    settings = [{"ef_search": DEFAULT_HNSW_EF_SEARCH}, {"ef_search": CHUNK_COUNT}]
+    hnsw_recalls = recalls(searcher, "hnsw", queries, settings)
+    assert hnsw_recalls[0] >= 0.95
+    assert hnsw_recalls[-1] == 1.0
+
+
+def test_hnsw_concurrent_searches(searcher):
+    searcher, queries = searcher
+    index = searcher.load_or_create_hnsw_index()
+    embeddings = searcher.generate_embeddings(queries)
+    serial = [index.search(embedding, LIMIT) for embedding in embeddings]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        concurrent = list(
+            pool.map(lambda embedding: index.search(embedding, LIMIT), embeddings)
+        )
+    for (rows, scores), (expected_rows, expected_scores) in zip(concurrent, serial):
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(scores, expected_scores)
+
+
+def test_pq_recall(searcher):
+    searcher, queries = searcher
+    # 8 subspaces of 4 dimensions; the default needs wider vectors
+    searcher.load_or_create_pq_index(n_subspaces=8)
+    settings = [{"rescore": 0}, {"rescore": 50}, {"rescore": CHUNK_COUNT}]
+    pq_recalls = recalls(searcher, "pq", queries, settings)
+    # re-scoring more of the best estimates only adds exact candidates
+    assert pq_recalls == sorted(pq_recalls)
+    assert pq_recalls[1] >= 0.9
+    assert pq_recalls[-1] == 1.0
+
+
+def test_binary_recall(searcher):
+    searcher, queries = searcher
+    searcher.create_binary_index()
+    settings = [{"candidates": 10}, {"candidates": 100}, {"candidates": CHUNK_COUNT}]
+    binary_recalls = recalls(searcher, "binary", queries, settings)
+    # more Hamming-nearest candidates only add exact scores
+    assert binary_recalls == sorted(binary_recalls)
+    assert binary_recalls[1] >= 0.9
+    assert binary_recalls[-1] == 1.0